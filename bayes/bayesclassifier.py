@@ -4,10 +4,13 @@ import string
 import pickle
 from collections import defaultdict
 
+import numpy
+
 from lex.entryiterator import EntryIterator
 from .senseparser.senseparser import SenseParser
 from .bayesresult import BayesResult, BayesSense
 from .pickleloader import PickleLoader
+from .featurestore import FeatureStore
 from .classifiers_io import (write_classifiers, write_priors_file,
                              load_classifiers, options_list,)
 
@@ -20,15 +23,31 @@ branch_size_max = 100000
 keyword_threshold = 20
 citation_threshold = 30
 
+# SenseData attribute used for each feature-name prefix
+feature_prefixes = (
+    ('definition_keywords', 'D_'),
+    ('quotation_keywords', 'Q_'),
+    ('citations', 'C_'),
+    ('title_words', 'T_'),
+    ('subjects', 'S_'),
+    ('usage_labels', 'U_'),
+    ('date', 'Y_'),
+    ('wordclass', 'W_'),
+)
+
 
 class BayesClassifier(object):
 
     def __init__(self, **kwargs):
+        # Directory of OED source files (if None, EntryIterator's
+        #  default is used)
+        self.source_dir = None
         for k, v in kwargs.items():
             self.__dict__[k] = v
         self.parent_dir = os.path.join(self.resources_dir, 'bayes')
         self.subject_map_file = os.path.join(self.resources_dir, 'subject_ontology.xml')
         self.senses_dir = os.path.join(self.parent_dir, 'senses')
+        self.features_dir = os.path.join(self.parent_dir, 'features')
         self.classifiers_dir = os.path.join(self.parent_dir, 'classifiers')
         self.rank_dir = os.path.join(self.parent_dir, 'rankfiles')
         self.output_dir = os.path.join(self.parent_dir, 'results')
@@ -61,12 +80,16 @@ class BayesClassifier(object):
         as part of this process.
         """
         sense_parser = SenseParser(self.parent_dir, self.subject_map_file)
+        options = {}
+        if self.source_dir is not None:
+            options['path'] = self.source_dir
         for letter in string.ascii_uppercase:
             file_filter = 'oed_%s.xml' % letter
             ei = EntryIterator(dictType='oed',
                                fixLigatures=True,
                                verbosity='low',
-                               fileFilter=file_filter)
+                               fileFilter=file_filter,
+                               **options)
 
             outfile = os.path.join(self.senses_dir, letter)
             with open(outfile, 'wb') as filehandle:
@@ -79,6 +102,16 @@ class BayesClassifier(object):
                             etyma,
                             entry.id)
                         pickle.dump(sense_data_object, filehandle)
+        sense_parser.save_memo()
+
+    def build_feature_store(self):
+        """
+        Repack the features stored by store_features_by_sense() into
+        the columnar feature store (see featurestore.py), so that
+        later stages can work on whole arrays rather than unpickling
+        each sense in turn.
+        """
+        FeatureStore(self.features_dir).compile(self.senses_dir)
 
     def build_rank_files(self):
         """
@@ -178,6 +211,16 @@ class BayesClassifier(object):
         # Add in binomial
         features['E_binomial'] = defaultdict(int)
 
+        # If the columnar feature store has been built (from the current
+        #  pickled senses), we can do all the counting on whole arrays
+        store = FeatureStore(self.features_dir)
+        if store.is_current(self.senses_dir):
+            number_of_senses, total_senses = self._count_features(
+                store.load(), thesaurus_ids, features)
+            write_classifiers(self.classifiers_dir, thesaurus_ids, features,
+                number_of_senses, total_senses)
+            return
+
         # Number of senses for each thesaurus ID (used later to calculate
         #  prior probabilities)
         number_of_senses = {id: 0 for id in thesaurus_ids}
@@ -217,6 +260,40 @@ class BayesClassifier(object):
         write_classifiers(self.classifiers_dir, thesaurus_ids, features,
             number_of_senses, total_senses)
 
+    def _count_features(self, store, thesaurus_ids, features):
+        """
+        Equivalent of the sense-by-sense counting loop in make_classifiers(),
+        but computed over the arrays of the columnar feature store.
+
+        Updates the counts in the features dictionary in place, and returns
+        the number of senses for each thesaurus ID, and the total number
+        of training senses.
+        """
+        total_senses = int(store.training_mask().sum())
+        class_counts = store.class_counts(thesaurus_ids)
+        number_of_senses = {id: int(count) for id, count in
+                            zip(thesaurus_ids, class_counts)}
+
+        for feature_type, prefix in feature_prefixes:
+            # Only count the tokens that are in use as features
+            tokens = [(token_id, prefix + token) for token_id, token in
+                      enumerate(store.vocabulary(feature_type))
+                      if prefix + token in features]
+            matrix = store.cooccurrence_counts(
+                feature_type, thesaurus_ids,
+                token_ids=[token_id for token_id, _ in tokens])
+            for (_, feature), row in zip(tokens, matrix):
+                for j in row.nonzero()[0]:
+                    features[feature][thesaurus_ids[j]] += int(row[j])
+
+        binomial_counts = store.class_counts(
+            thesaurus_ids, mask=store.arrays['has_binomials'])
+        for id, count in zip(thesaurus_ids, binomial_counts):
+            if count:
+                features['E_binomial'][id] += int(count)
+
+        return number_of_senses, total_senses
+
     def list_priors(self):
         write_priors_file(self.classifiers_dir, self.priors_file)
 
@@ -224,15 +301,30 @@ class BayesClassifier(object):
         self.prior_probabilities, self.classifiers =\
             load_classifiers(self.classifiers_dir)
 
+        # If the columnar feature store has been built (from the current
+        #  pickled senses), the features of each sense are read from its
+        #  arrays rather than by unpickling each sense in turn
+        store = FeatureStore(self.features_dir)
+        if store.is_current(self.senses_dir):
+            store.load()
+            lookups = self._feature_lookups(store)
+        else:
+            store = None
+
         for letter in string.ascii_uppercase:
             print('Bayes-classifying in %s...' % letter)
             output = []
             output_readable = []
 
-            pl = PickleLoader(self.senses_dir, letters=letter)
-            for sense in [s for s in pl.iterate() if not s.branches]:
+            if store is not None:
+                senses = self._stored_senses(store, lookups, letter)
+            else:
+                pl = PickleLoader(self.senses_dir, letters=letter)
+                senses = ((s, self._sense_features(s)) for s in pl.iterate()
+                          if not s.branches)
+            for sense, probabilities in senses:
                 # Compute the top 20 results
-                raw_results = self._classifyengine(sense)[0:20]
+                raw_results = self._rank(probabilities)[0:20]
                 # Package this into result-set object
                 result_set = BayesSense(sense=sense, results=raw_results,)
                 output.append(result_set)
@@ -290,8 +382,59 @@ class BayesClassifier(object):
             except KeyError:
                 return None
 
+    def _feature_lookups(self, store):
+        """
+        For each feature type, map the store's feature IDs to the
+        corresponding classifier feature name (or None if the feature
+        is not used by the classifiers).
+
+        Returns a list of (feature_type, lookup) pairs, in the same
+        order as feature_prefixes.
+        """
+        lookups = []
+        for feature_type, prefix in feature_prefixes:
+            lookup = [prefix + token if prefix + token in self.classifiers
+                      else None for token in store.vocabulary(feature_type)]
+            lookups.append((feature_type, lookup))
+        return lookups
+
+    def _stored_senses(self, store, lookups, letter):
+        """
+        Equivalent of iterating through the new (unclassified) senses in
+        a letter's pickle file, but reading the rows of the columnar
+        feature store instead.
+
+        Yields a (key, probabilities) pair for each sense, where key is
+        the (refentry, refid, lemma) named tuple for the row, and
+        probabilities is the list that _sense_features() would have
+        returned for the original sense.
+        """
+        all_features = self.classifiers
+        rows = store.letter_rows(letter)
+        branch_indptr = numpy.asarray(
+            store.arrays['branches.indptr'][rows.start:rows.stop+1])
+        is_new = numpy.diff(branch_indptr) == 0
+        binomials = store.arrays['has_binomials']
+        for i in numpy.flatnonzero(is_new) + rows.start:
+            probabilities = []
+            for feature_type, lookup in lookups:
+                for j in store.feature_ids(feature_type, i):
+                    feature = lookup[j]
+                    if feature is not None:
+                        probabilities.append((feature, all_features[feature]))
+            if binomials[i]:
+                probabilities.append(('[binomials]',
+                                      all_features['E_binomials']))
+            yield store.key(i), probabilities
+
     def _classifyengine(self, sense):
-        prior_probabilities = self.prior_probabilities
+        return self._rank(self._sense_features(sense))
+
+    def _sense_features(self, sense):
+        """
+        Return the (feature, probabilities) pairs for each of the
+        classifier features that pertain to this sense
+        """
         all_features = self.classifiers
 
         # Get the subset of all features that pertain to this sense
@@ -311,6 +454,10 @@ class BayesClassifier(object):
                     probabilities.append((feature, all_features[feature]))
         if sense.has_binomials:
             probabilities.append(('[binomials]', all_features['E_binomials']))
+        return probabilities
+
+    def _rank(self, probabilities):
+        prior_probabilities = self.prior_probabilities
 
         # Calculate the posterior probabilities for each candidate
         #  thesaurus ID (i.e. thesaurus branch) in turn
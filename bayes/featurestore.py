@@ -0,0 +1,362 @@
+"""
+FeatureStore -- Columnar on-disk store of the Bayes features for each sense.
+
+The SenseData tuples pickled into bayes/senses/ are repacked into flat
+NumPy arrays, so that the training and scoring stages can work on whole
+arrays (loaded with mmap_mode='r') rather than unpickling millions of
+small objects every time.
+
+Layout of the store directory:
+ * keys.refentry.npy, keys.refid.npy: entry ID and node ID of each sense
+ * keys.lemma_offsets.npy, keys.lemma_bytes.npy: UTF-8 lemmas, CSR-style
+ * branches.indptr.npy, branches.indices.npy: thesaurus branch IDs
+    for each sense (empty for unclassified senses)
+ * <feature_type>.indptr.npy, <feature_type>.indices.npy: integer feature
+    IDs for each sense, CSR-style
+ * <feature_type>.vocab.txt: token for each feature ID (ID = line number)
+ * has_binomials.npy: boolean flag for each sense
+ * manifest.json: row count, feature types, the range of rows taken
+    from each letter's pickle file, and a fingerprint of the senses
+    directory the store was compiled from (see is_current())
+
+Row i of every array refers to the same sense.
+"""
+
+import os
+import json
+import string
+from array import array
+from collections import namedtuple
+
+import numpy
+
+from .pickleloader import PickleLoader
+from utils.manifest import digest_values
+
+FEATURE_TYPES = ('definition_keywords', 'quotation_keywords', 'citations',
+                 'title_words', 'lemma_words', 'subjects', 'usage_labels',
+                 'date', 'wordclass')
+MANIFEST = 'manifest.json'
+# Bumped whenever the layout changes, so that older stores are recompiled
+FORMAT = 2
+
+SenseKey = namedtuple('SenseKey', ['refentry', 'refid', 'lemma'])
+
+
+class FeatureStore(object):
+
+    def __init__(self, directory):
+        self.dir = directory
+        self.arrays = {}
+        self.vocabularies = {}
+        self.letters = {}
+        self.size = 0
+
+    def exists(self):
+        return os.path.isfile(os.path.join(self.dir, MANIFEST))
+
+    def is_current(self, senses_dir):
+        """
+        Return True if the store exists and was compiled from senses_dir
+        as it stands now (i.e. none of the pickle files has been
+        rewritten since)
+        """
+        if not self.exists():
+            return False
+        with open(os.path.join(self.dir, MANIFEST)) as filehandle:
+            manifest = json.load(filehandle)
+        return (manifest.get('format') == FORMAT and
+                manifest.get('source') == senses_fingerprint(senses_dir))
+
+    #=======================================================
+    # Compilation (from the pickled SenseData tuples)
+    #=======================================================
+
+    def compile(self, senses_dir):
+        """
+        Repack all the SenseData tuples in senses_dir into the
+        columnar store.
+        """
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+        # Taken before reading, so that a pickle file rewritten while the
+        #  store is being compiled makes the store out of date
+        source = senses_fingerprint(senses_dir)
+
+        refentries = array('q')
+        refids = array('q')
+        lemma_offsets = array('q', [0, ])
+        lemma_bytes = bytearray()
+        binomials = array('b')
+        branch_indptr = array('q', [0, ])
+        branch_indices = array('q')
+        vocab = {f: {} for f in FEATURE_TYPES}
+        indptr = {f: array('q', [0, ]) for f in FEATURE_TYPES}
+        indices = {f: array('i') for f in FEATURE_TYPES}
+        letters = {}
+
+        pl = PickleLoader(senses_dir)
+        for letter in string.ascii_uppercase:
+            start = len(refentries)
+            for sense in pl.iterate(letters=letter):
+                refentries.append(sense.refentry)
+                refids.append(sense.refid)
+                lemma_bytes.extend(sense.lemma.encode('utf8'))
+                lemma_offsets.append(len(lemma_bytes))
+                binomials.append(1 if sense.has_binomials else 0)
+                branch_indices.extend(sorted(sense.branches))
+                branch_indptr.append(len(branch_indices))
+                for feature_type in FEATURE_TYPES:
+                    token_ids = vocab[feature_type]
+                    column = indices[feature_type]
+                    # Duplicates are retained, so that counts over the
+                    #  store are the same as counts over the original tuples
+                    for token in getattr(sense, feature_type):
+                        try:
+                            column.append(token_ids[token])
+                        except KeyError:
+                            token_ids[token] = len(token_ids)
+                            column.append(token_ids[token])
+                    indptr[feature_type].append(len(column))
+            letters[letter] = [start, len(refentries)]
+
+        self._save('keys.refentry', refentries, numpy.int64)
+        self._save('keys.refid', refids, numpy.int64)
+        self._save('keys.lemma_offsets', lemma_offsets, numpy.int64)
+        self._save('keys.lemma_bytes', lemma_bytes, numpy.uint8)
+        self._save('has_binomials', binomials, numpy.bool_)
+        self._save('branches.indptr', branch_indptr, numpy.int64)
+        self._save('branches.indices', branch_indices, numpy.int64)
+        for feature_type in FEATURE_TYPES:
+            self._save(feature_type + '.indptr', indptr[feature_type],
+                       numpy.int64)
+            self._save(feature_type + '.indices', indices[feature_type],
+                       numpy.int32)
+            tokens = sorted(vocab[feature_type].items(), key=lambda t: t[1])
+            filepath = os.path.join(self.dir, feature_type + '.vocab.txt')
+            with open(filepath, 'w') as filehandle:
+                for token, token_id in tokens:
+                    filehandle.write(str(token) + '\n')
+
+        with open(os.path.join(self.dir, MANIFEST), 'w') as filehandle:
+            json.dump({'format': FORMAT,
+                       'rows': len(refentries),
+                       'feature_types': FEATURE_TYPES,
+                       'letters': letters,
+                       'source': source}, filehandle)
+
+    def _save(self, name, values, dtype):
+        if isinstance(values, bytearray):
+            data = numpy.frombuffer(bytes(values), dtype=dtype)
+        else:
+            data = numpy.array(values, dtype=dtype)
+        numpy.save(os.path.join(self.dir, name + '.npy'), data)
+
+    #=======================================================
+    # Loading and access
+    #=======================================================
+
+    def load(self):
+        """
+        Memory-map all the arrays in the store. Vocabularies are loaded
+        lazily, when first asked for.
+        """
+        with open(os.path.join(self.dir, MANIFEST)) as filehandle:
+            manifest = json.load(filehandle)
+        self.size = manifest['rows']
+        self.letters = manifest['letters']
+        names = ['keys.refentry', 'keys.refid', 'keys.lemma_offsets',
+                 'keys.lemma_bytes', 'has_binomials', 'branches.indptr',
+                 'branches.indices']
+        for feature_type in FEATURE_TYPES:
+            names.extend((feature_type + '.indptr', feature_type + '.indices'))
+        for name in names:
+            filepath = os.path.join(self.dir, name + '.npy')
+            self.arrays[name] = numpy.load(filepath, mmap_mode='r')
+        return self
+
+    def __len__(self):
+        return self.size
+
+    def vocabulary(self, feature_type):
+        try:
+            return self.vocabularies[feature_type]
+        except KeyError:
+            filepath = os.path.join(self.dir, feature_type + '.vocab.txt')
+            with open(filepath) as filehandle:
+                self.vocabularies[feature_type] = [line.rstrip('\n')
+                                                   for line in filehandle]
+            return self.vocabularies[feature_type]
+
+    def letter_rows(self, letter):
+        """
+        Return the range of rows compiled from the given letter's
+        pickle file
+        """
+        start, stop = self.letters[letter]
+        return range(start, stop)
+
+    def key(self, i):
+        """
+        Return the (refentry, refid, lemma) named tuple for row i
+        """
+        offsets = self.arrays['keys.lemma_offsets']
+        lemma = bytes(self.arrays['keys.lemma_bytes'][offsets[i]:offsets[i+1]])
+        return SenseKey(int(self.arrays['keys.refentry'][i]),
+                        int(self.arrays['keys.refid'][i]),
+                        lemma.decode('utf8'))
+
+    def feature_ids(self, feature_type, i):
+        indptr = self.arrays[feature_type + '.indptr']
+        return self.arrays[feature_type + '.indices'][indptr[i]:indptr[i+1]]
+
+    def tokens(self, feature_type, i):
+        vocab = self.vocabulary(feature_type)
+        return [vocab[j] for j in self.feature_ids(feature_type, i)]
+
+    def branches(self, i):
+        indptr = self.arrays['branches.indptr']
+        return self.arrays['branches.indices'][indptr[i]:indptr[i+1]]
+
+    def training_mask(self):
+        """
+        Boolean array marking the rows which already have thesaurus
+        branches (i.e. the training senses).
+        """
+        return numpy.diff(self.arrays['branches.indptr']) > 0
+
+    #=======================================================
+    # Whole-array operations for training
+    #=======================================================
+
+    def class_counts(self, class_ids, mask=None):
+        """
+        Return an array giving the number of training senses on each
+        of the thesaurus classes in class_ids (in the same order).
+
+        If mask (a boolean array with one value per row) is given, only
+        the rows where mask is True are counted.
+        """
+        class_ids = numpy.asarray(class_ids, dtype=numpy.int64)
+        branch_ids = numpy.asarray(self.arrays['branches.indices'])
+        positions = _class_positions(branch_ids, class_ids)
+        if mask is not None:
+            rows = _row_numbers(self.arrays['branches.indptr'])
+            positions = positions[numpy.asarray(mask)[rows]]
+        positions = positions[positions >= 0]
+        return numpy.bincount(positions, minlength=len(class_ids))
+
+    def cooccurrence_counts(self, feature_type, class_ids, token_ids=None,
+                            block_size=50000):
+        """
+        Count how many training senses each feature in feature_type
+        co-occurs with for each of the thesaurus classes in class_ids.
+
+        Only the features in token_ids (a list of feature IDs) are
+        counted, if given; otherwise the whole vocabulary is.
+
+        Returns a 2-d array of shape (len(token_ids) or vocabulary size,
+        len(class_ids)), with rows in the same order as token_ids.
+        Senses are processed in blocks of rows, to keep the cross product
+        of features and branches to a manageable size.
+        """
+        class_ids = numpy.asarray(class_ids, dtype=numpy.int64)
+        vocab_size = len(self.vocabulary(feature_type))
+        if token_ids is None:
+            token_ids = numpy.arange(vocab_size)
+        token_ids = numpy.asarray(token_ids, dtype=numpy.int64)
+        # Row of the result for each feature ID (-1 if not counted)
+        rows_by_id = numpy.full(vocab_size, -1, dtype=numpy.int64)
+        rows_by_id[token_ids] = numpy.arange(len(token_ids))
+        num_classes = len(class_ids)
+        counts = numpy.zeros(len(token_ids) * num_classes, dtype=numpy.int64)
+
+        f_indptr = self.arrays[feature_type + '.indptr']
+        f_indices = self.arrays[feature_type + '.indices']
+        b_indptr = self.arrays['branches.indptr']
+        b_indices = self.arrays['branches.indices']
+
+        for start in range(0, self.size, block_size):
+            stop = min(start + block_size, self.size)
+            # Features in this block (as rows of the result), with the
+            #  (block-relative) row of each, dropping uncounted features
+            f_ids = rows_by_id[numpy.asarray(
+                f_indices[f_indptr[start]:f_indptr[stop]])]
+            f_rows = _row_numbers(f_indptr[start:stop+1])
+            keep = f_ids >= 0
+            f_ids = f_ids[keep]
+            f_rows = f_rows[keep]
+            # Branches in this block, reduced to positions in class_ids
+            b_pos = _class_positions(
+                numpy.asarray(b_indices[b_indptr[start]:b_indptr[stop]]),
+                class_ids)
+            b_rows = _row_numbers(b_indptr[start:stop+1])
+            keep = b_pos >= 0
+            b_pos = b_pos[keep]
+            b_rows = b_rows[keep]
+            if not len(f_ids) or not len(b_pos):
+                continue
+
+            # Per-row start and size of the (filtered) branch lists
+            num_rows = stop - start
+            b_sizes = numpy.bincount(b_rows, minlength=num_rows)
+            b_starts = numpy.concatenate(([0, ], numpy.cumsum(b_sizes)[:-1]))
+
+            # Cross product of features and branches within each row:
+            #  each feature is repeated once for every branch on its row
+            repeats = b_sizes[f_rows]
+            total = repeats.sum()
+            if not total:
+                continue
+            f_expanded = numpy.repeat(f_ids, repeats)
+            run_starts = numpy.repeat(numpy.cumsum(repeats) - repeats, repeats)
+            offsets = (numpy.repeat(b_starts[f_rows], repeats) +
+                       numpy.arange(total) - run_starts)
+            b_expanded = b_pos[offsets]
+
+            pairs = f_expanded * num_classes + b_expanded
+            # Only the (feature, class) pairs that occur in the block are
+            #  touched, rather than the whole array
+            pairs, pair_counts = numpy.unique(pairs, return_counts=True)
+            counts[pairs] += pair_counts
+
+        return counts.reshape((len(token_ids), num_classes))
+
+
+def senses_fingerprint(senses_dir):
+    """
+    Digest of the pickle files in a senses directory (path, size and
+    modification time of each)
+    """
+    states = []
+    for letter in string.ascii_uppercase:
+        filepath = os.path.join(senses_dir, letter)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            states.append((letter, None))
+        else:
+            states.append((letter, stat.st_size, stat.st_mtime_ns))
+    return digest_values(os.path.abspath(senses_dir), states)
+
+
+def _row_numbers(indptr):
+    """
+    For a CSR indptr slice, return the (slice-relative) row number of
+    each value covered by the slice.
+    """
+    indptr = numpy.asarray(indptr)
+    sizes = numpy.diff(indptr)
+    return numpy.repeat(numpy.arange(len(sizes)), sizes)
+
+
+def _class_positions(branch_ids, class_ids):
+    """
+    Map each branch ID to its position in class_ids (-1 if it's not there)
+    """
+    order = numpy.argsort(class_ids)
+    sorted_ids = class_ids[order]
+    positions = numpy.searchsorted(sorted_ids, branch_ids)
+    positions = numpy.minimum(positions, len(sorted_ids) - 1)
+    found = sorted_ids[positions] == branch_ids
+    return numpy.where(found, order[positions], -1)
@@ -1,6 +1,6 @@
 import os
 
-from stringtools import porter_stem
+from .memo import stem
 
 
 class KeywordsFilter(object):
@@ -15,7 +15,7 @@ class KeywordsFilter(object):
 
     def filter_keywords(self, keywords, lemma=None):
         if lemma is not None:
-            lemma = porter_stem(lemma)[0:8]
+            lemma = stem(lemma)[0:8]
         # Filter out stopwords
         keywords = self._filter_stopwords(keywords)
         keywords2 = set()
@@ -36,7 +36,7 @@ class KeywordsFilter(object):
 
     def filter_titlewords(self, keywords, lemma=None):
         if lemma is not None:
-            lemma = porter_stem(lemma)[0:8]
+            lemma = stem(lemma)[0:8]
         # Filter out stopwords
         keywords = self._filter_stoptitlewords(keywords)
         keywords2 = set()
@@ -69,7 +69,7 @@ class KeywordsFilter(object):
             for l in lines:
                 l = l.lower().strip().strip(' .')
                 if l:
-                    KeywordsFilter.stopwords.add(porter_stem(l))
+                    KeywordsFilter.stopwords.add(stem(l))
 
     def _load_stopcitations(self):
         f = os.path.join(self.dir, 'stopcitations.txt')
@@ -87,4 +87,4 @@ class KeywordsFilter(object):
             for l in lines:
                 l = l.lower().strip().strip(' .')
                 if l:
-                    KeywordsFilter.stoptitlewords.add(porter_stem(l))
+                    KeywordsFilter.stoptitlewords.add(stem(l))
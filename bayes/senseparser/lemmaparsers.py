@@ -1,6 +1,6 @@
 import re
 
-from stringtools import porter_stem
+from .memo import stem
 from regexcompiler import ReplacementListCompiler
 
 LIGHT_STEMMER = ReplacementListCompiler((
@@ -37,7 +37,7 @@ def lemma_components(sense, etyma):
                   and w.lower() not in ('the', 'and')]
 
     # Porter-stem, so as to align with other definition keywords
-    return [porter_stem(w) for w in components]
+    return [stem(w) for w in components]
 
 
 def compound_components(sense, etyma):
@@ -0,0 +1,118 @@
+"""
+memo -- Bounded memo tables for Porter-stemming and for parsing
+citation titles into title words.
+
+The same lemmas get stemmed for every sense, and the same citation
+titles ('Phil. Trans.', 'Encycl. Brit.', etc.) recur hundreds of
+thousands of times, so both are memoised. The tables can be saved to
+disk at the end of a run and reloaded at the start of the next, so that
+repeated runs start with a warm cache. Saved tables are only reloaded if
+the code that produced them (this project's source, and the stringtools
+module that does the stemming) is unchanged.
+"""
+
+import os
+import pickle
+import hashlib
+
+import stringtools
+from stringtools import porter_stem
+from utils.lrucache import LRUCache
+from utils.manifest import code_version, file_digest, digest_values
+
+STEM_CACHE_SIZE = 200000
+TITLE_CACHE_SIZE = 100000
+WARM_START_FILE = 'memo.pickle'
+
+STEM_CACHE = LRUCache(STEM_CACHE_SIZE, 'stem cache')
+TITLE_CACHE = LRUCache(TITLE_CACHE_SIZE, 'title-words cache')
+
+
+def stem(word):
+    """
+    Memoised version of stringtools.porter_stem()
+    """
+    try:
+        return STEM_CACHE.get(word)
+    except KeyError:
+        stemmed = porter_stem(word)
+        STEM_CACHE.set(word, stemmed)
+        return stemmed
+
+
+def memoised_title_words(title, function):
+    """
+    Return the (frozen) set of title words for the title, calling
+    function(title) to parse it if it's not already in the cache
+    """
+    try:
+        return TITLE_CACHE.get(title)
+    except KeyError:
+        words = frozenset(function(title))
+        TITLE_CACHE.set(title, words)
+        return words
+
+
+def expansions_signature(expansions):
+    """
+    Return a digest of the abbreviation expansions used to parse titles.
+    Stored title words are only reused if this hasn't changed.
+    """
+    digest = hashlib.sha1()
+    for mode in sorted(expansions.keys()):
+        for abbreviation, expansion in sorted(expansions[mode].items()):
+            digest.update(('%s\t%s\t%s\n' % (mode, abbreviation, expansion))
+                          .encode('utf8'))
+    return digest.hexdigest()
+
+
+def code_signature():
+    """
+    Return a digest of the code behind the memoised results: the
+    project's source (including the title parser) and stringtools
+    """
+    return digest_values(code_version(), file_digest(stringtools.__file__))
+
+
+def load_warm_start(dir, signature):
+    """
+    Prime the memo tables from a file saved by an earlier run (if any)
+    """
+    in_file = os.path.join(dir, WARM_START_FILE)
+    if not os.path.isfile(in_file):
+        return
+    try:
+        with open(in_file, 'rb') as filehandle:
+            stored = pickle.load(filehandle)
+    except (pickle.UnpicklingError, EOFError, ValueError):
+        print('\tIgnoring unreadable memo file %s' % in_file)
+        return
+
+    if stored.get('code') != code_signature():
+        print('\tIgnoring memo file %s (the code has changed)' % in_file)
+        return
+    for word, stemmed in stored.get('stems', ()):
+        STEM_CACHE.set(word, stemmed)
+    if stored.get('signature') == signature:
+        for title, words in stored.get('titles', ()):
+            TITLE_CACHE.set(title, words)
+
+
+def save_warm_start(dir, signature):
+    """
+    Save the current contents of the memo tables (least recently used
+    first, so that order is preserved when they're reloaded)
+    """
+    stored = {
+        'stems': list(STEM_CACHE.data.items()),
+        'titles': list(TITLE_CACHE.data.items()),
+        'signature': signature,
+        'code': code_signature(),
+    }
+    out_file = os.path.join(dir, WARM_START_FILE)
+    with open(out_file, 'wb') as filehandle:
+        pickle.dump(stored, filehandle)
+
+
+def report():
+    return [STEM_CACHE.report(), TITLE_CACHE.report()]
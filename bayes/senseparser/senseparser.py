@@ -5,6 +5,7 @@ from collections import defaultdict, namedtuple
 from resources.subjectlabelparser import SubjectLabelParser
 from .keywordsfilter import KeywordsFilter
 from .titlewords import TitleWords
+from . import memo
 from .lemmaparsers import lemma_components, compound_components
 
 # Tokens won't be taken from citations or quotation text in quotations
@@ -27,11 +28,31 @@ class SenseParser(object):
         self.kwf = KeywordsFilter(dir=dir)
         self.title_parser = TitleWords(
             dir=os.path.join(dir, 'citation_expansions'))
+        memo.load_warm_start(dir, self.title_parser.signature())
+        self.quotation_cache = QuotationCache(self.title_parser)
+        self.current_entry = None
+
+    def save_memo(self):
+        """
+        Save the stemming and title-word memo tables, so that the next
+        run starts with them already populated; and report on their usage.
+        """
+        memo.save_warm_start(self.parent_dir, self.title_parser.signature())
+        for line in memo.report():
+            print('\t%s' % line)
 
     def parse_sense(self, sense, etyma, entry_id):
+        # Quotations are shared between the senses of an entry (see
+        #  entry.share_quotations()), so features derived from them are
+        #  cached until we move on to the next entry
+        if entry_id != self.current_entry:
+            self.quotation_cache.clear()
+            self.current_entry = entry_id
+        qcache = self.quotation_cache
+
         branches = branch_nodes(sense.thesaurus_categories())
         lemma_words = compound_components(sense, etyma)
-        citations = self.kwf.filter_citations(get_citations(sense))
+        citations = self.kwf.filter_citations(get_citations(sense, qcache))
         subjects = get_subject_labels(sense, self.label_parser)
         usages = get_usage_labels(sense)
 
@@ -40,10 +61,10 @@ class SenseParser(object):
             def_tokens = def_tokens + sense.parent_definition_manager().tokens()
         dkeywords = self.kwf.filter_keywords(def_tokens, lemma=sense.lemma)
 
-        q_tokens = get_quotation_keywords(sense)
+        q_tokens = get_quotation_keywords(sense, qcache)
         qkeywords = self.kwf.filter_keywords(q_tokens, lemma=sense.lemma)
 
-        title_words = get_title_words(sense, self.title_parser)
+        title_words = get_title_words(sense, self.title_parser, qcache)
         title_words = self.kwf.filter_titlewords(title_words, lemma=sense.lemma)
 
         if (sense.definition_manager().genera() or
@@ -83,6 +104,68 @@ class SenseParser(object):
                          has_binomials, date, wordclass,)
 
 
+class QuotationCache(object):
+
+    """
+    Features derived from individual quotations - ranked collocates,
+    the cleaned-up citation, and title words - kept for the duration of
+    an entry, so that each quotation is processed once per entry rather
+    than once for each sense it appears in.
+
+    Quotations are keyed by identity. The cache holds a reference to
+    each quotation, so an id can't be reused by another object until
+    the cache is cleared.
+    """
+
+    def __init__(self, title_parser):
+        self.title_parser = title_parser
+        self.records = {}
+
+    def clear(self):
+        self.records = {}
+
+    def _record(self, q):
+        try:
+            return self.records[id(q)]
+        except KeyError:
+            record = _QuotationRecord(q)
+            self.records[id(q)] = record
+            return record
+
+    def ranked_collocates(self, q, lemma):
+        record = self._record(q)
+        try:
+            return record.collocates[lemma]
+        except KeyError:
+            record.collocates[lemma] = q.ranked_collocates(lemma)
+            return record.collocates[lemma]
+
+    def citation(self, q):
+        record = self._record(q)
+        if record.citation is _UNSET:
+            record.citation = clean_citation(q)
+        return record.citation
+
+    def title_words(self, q):
+        record = self._record(q)
+        if record.title_words is None:
+            record.title_words = self.title_parser.title_words(q.title())
+        return record.title_words
+
+
+_UNSET = object()
+
+
+class _QuotationRecord(object):
+    __slots__ = ('quotation', 'collocates', 'citation', 'title_words')
+
+    def __init__(self, quotation):
+        self.quotation = quotation
+        self.collocates = {}
+        self.citation = _UNSET
+        self.title_words = None
+
+
 def branch_nodes(thesaurus_paths):
     idset = set()
     for path in thesaurus_paths:
@@ -112,7 +195,7 @@ def get_subject_labels(sense, label_parser):
     return subjects
 
 
-def get_quotation_keywords(sense):
+def get_quotation_keywords(sense, quotation_cache=None):
     # Get the four most recent post-1700 quotations
     quotes = ([q for q in sense.quotations() if q.year() >= QT_MIN_DATE] or
               [q for q in sense.quotations() if q.year() >= CIT_MIN_DATE])
@@ -122,7 +205,11 @@ def get_quotation_keywords(sense):
     # Collect quotation_words from each quotation
     quotation_words = []
     for q in quotes:
-        quotation_words.extend(q.ranked_collocates(sense.lemma))
+        if quotation_cache is not None:
+            quotation_words.extend(
+                quotation_cache.ranked_collocates(q, sense.lemma))
+        else:
+            quotation_words.extend(q.ranked_collocates(sense.lemma))
 
     # Uniq any duplicates
     coll_uniq = defaultdict(list)
@@ -139,27 +226,41 @@ def get_quotation_keywords(sense):
     return quotation_words
 
 
-def get_citations(sense):
+def get_citations(sense, quotation_cache=None):
     # Get all post-1600 quotations
     quotes = [q for q in sense.quotations() if q.year() >= CIT_MIN_DATE and
               not q.is_newspaper()]
     citations = set()
     for q in quotes:
-        cit = q.author() or q.title() or None
+        if quotation_cache is not None:
+            cit = quotation_cache.citation(q)
+        else:
+            cit = clean_citation(q)
         if cit is not None:
-            cit = re.sub(r'[0-9()]', '', cit).replace('\u2013', '')
-            cit = re.sub('  +', ' ', cit)
-            citations.add(cit.strip())
+            citations.add(cit)
     return citations
 
 
-def get_title_words(sense, title_word_parser):
+def clean_citation(q):
+    cit = q.author() or q.title() or None
+    if cit is not None:
+        cit = re.sub(r'[0-9()]', '', cit).replace('\u2013', '')
+        cit = re.sub('  +', ' ', cit)
+        cit = cit.strip()
+    return cit
+
+
+def get_title_words(sense, title_word_parser, quotation_cache=None):
     # Words from the title in citations
     title_words = set()
-    titles = [q.title() for q in sense.quotations() if
+    quotes = [q for q in sense.quotations() if
               q.year() >= TITLEWORDS_MIN_DATE and not q.is_newspaper()]
-    for t in titles:
-        for w in title_word_parser.title_words(t):
+    for q in quotes:
+        if quotation_cache is not None:
+            words = quotation_cache.title_words(q)
+        else:
+            words = title_word_parser.title_words(q.title())
+        for w in words:
             title_words.add(w)
     return title_words
 
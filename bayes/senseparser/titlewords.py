@@ -1,7 +1,7 @@
 import os
 import re
 
-from stringtools import porter_stem
+from .memo import stem, memoised_title_words, expansions_signature
 
 
 class TitleWords(object):
@@ -21,9 +21,15 @@ class TitleWords(object):
                         abbreviation, expansion = parts
                         TitleWords.expansions[mode][parts[0] + '.'] = parts[1]
 
+    def signature(self):
+        return expansions_signature(TitleWords.expansions)
+
     def title_words(self, title):
         if title is None or not title:
             return set()
+        return memoised_title_words(title, self._parse_title)
+
+    def _parse_title(self, title):
 
         title = re.sub('(\u2013|-|\'s )', ' ', title.lower())
         title = re.sub(r"[,:;()']", '', title)
@@ -40,7 +46,7 @@ class TitleWords(object):
                     w = TitleWords.expansions['all'][w]
                 w = finish_expansion(w)
             if re.search(r'^[a-z]+$', w) and len(w) >= 4:
-                wordset.add(porter_stem(w))
+                wordset.add(stem(w))
 
         #print '--------------------------------------------'
         #print repr(title)
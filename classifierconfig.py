@@ -15,7 +15,13 @@ PIPELINE = [
     ('index_compounds', 0),
     ('index_main_senses', 0),
     ('index_superordinates', 0),
+    # Single-pass alternative to the four index_* stages above
+    ('index_classified', 0),
+    # SQLite copy of the thesaurus database (see THESAURUS_DB_FILE below)
+    ('export_thesaurus_db', 0),
     ('reset_db', 0),
+    # Precomputed wordclass equivalents (see EQUIVALENCE_TABLE_FILE below)
+    ('build_equivalence_table', 0),
     ('classify1', 0),
     ('update_db', 0),
     ('classify2', 0),
@@ -25,7 +31,19 @@ PIPELINE = [
     ('test_sense_parser', 0),
     ('test_classifier', 0),
     ('random_sample', 0),
+    ('test_chunker', 0),
+    ('test_rewrite_engines', 0),
+    ('test_synonym_dispatch', 0),
+    ('benchmark_update_db', 0),
 ]
+# Maximum number of pipeline stages run at the same time (each in a
+#  separate process). Stages only run concurrently if they don't depend
+#  on each other (see pipeline.STAGES). The default of 1 runs everything
+#  serially in a single process; set it higher to opt in.
+MAX_CONCURRENT_STAGES = 1
+# Maximum number of results held for each of the thesaurus database
+#  query functions memoised by thesaurus.querycache
+THESAURUS_QUERY_CACHE_SIZE = 20000
 
 OED_ROOT = lexconfig.OED_DIR
 PROJECT_ROOT = os.path.join(OED_ROOT, 'projects/htclassifier')
@@ -36,3 +54,24 @@ ITERATION1_DIR = os.path.join(PROJECT_ROOT, 'iteration1')
 ITERATION2_DIR = os.path.join(PROJECT_ROOT, 'iteration2')
 SAMPLES_DIR = os.path.join(PROJECT_ROOT, 'samples')
 JSON_DIR = os.path.join(PROJECT_ROOT, 'db_json')
+REPORTS_DIR = os.path.join(PROJECT_ROOT, 'reports')
+MANIFEST_DIR = os.path.join(PROJECT_ROOT, 'manifests')
+# OED source files (oed_A.xml ... oed_Z.xml). Every stage passes this
+#  to EntryIterator as its path, and the same files are fingerprinted to
+#  detect which letters need rebuilding (a missing file means the letter
+#  is always rebuilt - see utils/manifest.py)
+OED_SOURCE_DIR = os.path.join(OED_ROOT, 'latest')
+# Read-only SQLite copy of the thesaurus database (see
+#  thesaurus/sqliteexport.py). If USE_THESAURUS_DB_FILE is True, stages
+#  which only read the thesaurus use this file instead of the database
+#  server, and every stage which changes the database re-exports it.
+#  Ranked searches by lemma are answered from the lemma index, which is
+#  rebuilt from the file whenever it's exported.
+THESAURUS_DB_FILE = os.path.join(PROJECT_ROOT, 'thesaurus.sqlite')
+LEMMA_INDEX_DIR = os.path.join(PROJECT_ROOT, 'lemma_index')
+USE_THESAURUS_DB_FILE = False
+# Precomputed results of tdb.equivalent_class() for every thesaurus class
+#  (see thesaurus/equivalencetable.py); used by the classifier if present
+#  and built from the current structure of the taxonomy. It's built after
+#  reset_db in PIPELINE, so that it reflects the database classify1 uses
+EQUIVALENCE_TABLE_FILE = os.path.join(RESOURCES_DIR, 'equivalent_classes.npz')
@@ -1,5 +1,5 @@
 
-import lex.oed.thesaurus.thesaurusdb as tdb
+from thesaurus.treeintervals import get_intervals
 from utils.tracer import trace_sense
 
 
@@ -53,10 +53,11 @@ def _apply_wide_sieve(sense, candidate_classifications, compound_branches):
     #  the total probability > 1 (to err on the safe side).
     filter = sense.bayes.branches(total_probability=1.2) +\
         compound_branches + sense.subject_classes()
-    filter = tdb.remove_redundant_classes(filter)
+    intervals = get_intervals()
+    filter = intervals.remove_redundant_classes(filter)
 
-    favoured = [c for c in candidate_classifications
-                if any([c.is_descendant_of(b) for b in filter])]
+    favoured = intervals.filter_descendants(candidate_classifications, filter,
+                                            strict=True)
     return favoured
 
 def _apply_promotion(sense, candidate_classifications, compound_branches):
@@ -78,12 +79,15 @@ def _apply_promotion(sense, candidate_classifications, compound_branches):
     filter = sense.bayes.branches(total_probability=.99) +\
         sense.subject_classes()
 
-    filter = tdb.remove_redundant_classes(filter)
+    intervals = get_intervals()
+    filter = intervals.remove_redundant_classes(filter)
 
+    passed = intervals.descends_from_any(candidate_classifications, filter,
+                                         strict=True)
     favoured = []
     deprecated = []
-    for c in candidate_classifications:
-        if any([c.is_descendant_of(b) for b in filter]):
+    for c, is_favoured in zip(candidate_classifications, passed):
+        if is_favoured:
             favoured.append(c)
         else:
             deprecated.append(c)
@@ -2,10 +2,14 @@ import shutil
 import os
 import re
 import string
+import copy
+import time
 from collections import defaultdict
 import pickle
 
 import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
+from thesaurus import sqlitebackend
 
 from pickler.sensemanager import PickleLoader
 from resources.binomials import Binomials
@@ -20,14 +24,17 @@ from .topicalclassifier import topical_classification
 from .rankedsensesummary import ranked_sense_summary
 from .bayesfilter import apply_bayes_filter
 from . import synonymchecker
+from utils.lazy import LazyObject
+from utils.metrics import METRICS
 
 
 #from utils.tracer import trace_sense, trace_instance, trace_class
 
-binomial_checker = Binomials()
-superordinate_manager = Superordinates()
-main_sense_finder = MainSense()
-deriv_tester = DerivationTester()
+binomial_checker = LazyObject(Binomials, name='classifier.binomial_checker')
+superordinate_manager = LazyObject(Superordinates,
+                                   name='classifier.superordinate_manager')
+main_sense_finder = LazyObject(MainSense, name='classifier.main_sense_finder')
+deriv_tester = LazyObject(DerivationTester, name='classifier.deriv_tester')
 triage = ('classified', 'unclassified', 'intractable')
 
 letters = string.ascii_uppercase
@@ -70,7 +77,8 @@ class Classifier(object):
     def classify(self):
         running_totals = {t: 0 for t in triage}
         for letter in letters:
-            print('\tClassifying %s (Iteration #%d)...' % (letter, self.iteration))
+            shard = METRICS.start_shard(letter, 'Classifying %s (Iteration #%d)...'
+                                        % (letter, self.iteration))
 
             # Load Bayes evaluations for all the senses in this letter
             for name, manager in self.bayes.items():
@@ -91,8 +99,15 @@ class Classifier(object):
             self.main_sense_of_entry = None
             self.previous_entry_id = 0
             loader = PickleLoader(self.input_dir, letters=letter)
-
-            for sense in loader.iterate():
+            senses = loader.iterate()
+            if sqlitebackend.is_installed():
+                # (Every sense ends up in self.buffer anyway, so holding
+                #  the letter's senses up front costs no extra memory)
+                senses = list(senses)
+                self._prefetch(senses)
+
+            for sense in senses:
+                shard.records_in += 1
                 # Determine whether this sense is considered tractable
                 if sense.is_intractable():
                     intractable = True
@@ -151,11 +166,15 @@ class Classifier(object):
                 self.previous_entry_id = sense.entry_id
 
             print('\t\t%s' % self._running_score(running_totals))
+            for line in qtdb.QUERY_CACHE.report():
+                print('\t\t%s' % line)
+            shard.records_out = sum([len(self.buffer[t]) for t in triage])
             if self.mode != 'test':
                 self.flush_buffer(letter)
 
             if self.mode == 'test':
                 self.compound_tracer.close()
+            shard.finish()
 
     def flush_buffer(self, letter):
         """
@@ -351,6 +370,28 @@ class Classifier(object):
         self.compound_tracer.write(sense.compound_analysis.trace())
         self.compound_tracer.write('\n\n\n')
 
+    def _prefetch(self, senses):
+        """
+        Load the thesaurus instances and classes for every lemma that the
+        senses might look up, in a few bulk queries (see
+        sqlitebackend.prefetch()). Only possible with the SQLite backend:
+        the live database has no multi-key query.
+        """
+        start = time.time()
+        lemmas = set()
+        for sense in senses:
+            lemmas.add(sense.lemma)
+            lemmas.add(sense.entry_lemma)
+            lemmas.add(getattr(sense, 'superordinate', None))
+            lemmas.add(sense.last_element())
+            lemmas.update(sense.synonyms or ())
+            lemmas.update([etymon[0] for etymon in sense.etyma or ()])
+            lemmas.update([xr.lemma for xr in sense.cross_references])
+        lemmas.discard(None)
+        count = sqlitebackend.prefetch(lemmas)
+        print('\t\tPrefetched %d instances for %d lemmas in %0.1fs' %
+              (count, len(lemmas), time.time() - start))
+
     def _update_main_sense(self, current_sense):
         """
         Updates self.main_sense_of_entry to the main sense for the entry
@@ -421,7 +462,7 @@ def find_runners_up(sense, candidate_classifications):
 
 def equals_cross_reference(sense):
     xr = sense.equals_crossreference()
-    target_senses, sense_count = tdb.cross_reference_target(lemma=xr.lemma,
+    target_senses, sense_count = qtdb.cross_reference_target(lemma=xr.lemma,
         refentry=xr.refentry, refid=xr.refid, wordclass=sense.wordclass)
 
     if target_senses:
@@ -430,8 +471,8 @@ def equals_cross_reference(sense):
         hiscores.sort(key=lambda i: i.node_size(), reverse=True)
         if hiscores[0].thesclass is not None:
             match = hiscores[0].thesclass
-            match.reason_text = 'Equivalent to %s' % hiscores[0].lemma
-            match.reason_code = 'eqxr'
+            match = _annotate(match, 'eqxr',
+                              'Equivalent to %s' % hiscores[0].lemma)
             return match
     return None
 
@@ -453,7 +494,7 @@ def cf_cross_reference(sense):
     xr = sense.cf_crossreference()
     # Nb don't specify a wordclass here, since the target wordclass may well
     #  be different from the current sense's wordclass
-    target_senses, sense_count = tdb.cross_reference_target(lemma=xr.lemma,
+    target_senses, sense_count = qtdb.cross_reference_target(lemma=xr.lemma,
         refentry=xr.refentry, refid=xr.refid)
 
     # Don't attempt if the target is too ambiguous (too many possible senses)
@@ -469,10 +510,10 @@ def cf_cross_reference(sense):
             elif target.wordclass == sense.wordclass:
                 match = target.wordclass_parent()
             else:
-                match = tdb.equivalent_class(target.thesclass, sense.wordclass)
+                match = qtdb.equivalent_class(target.thesclass, sense.wordclass)
             if match is not None:
-                match.reason_text = 'Analogy with target of cf-type xref ("%s")' % target.lemma
-                match.reason_code = 'cfxr'
+                match = _annotate(match, 'cfxr',
+                                  'Analogy with target of cf-type xref ("%s")' % target.lemma)
             return match
 
     return None
@@ -486,8 +527,8 @@ def formal_analysis(sense):
     else:
         match = None
     if match is not None:
-        match.reason_text = 'Inferred from compound lemma form'
-        match.reason_code = 'comp'
+        match = _annotate(match, 'comp',
+                          'Inferred from compound lemma form')
         return match
     else:
         return None
@@ -512,7 +553,7 @@ def lemma_as_superordinate(sense):
         #  in its entry (or entry block), and then confirm that it's the only
         #  sense recorded in the database
         elif sense.senses_in_entry == 1:
-            instances = tdb.search(lemma=sense.lemma)
+            instances = qtdb.search(lemma=sense.lemma)
             if len(instances) == 1 and instances[0].refid == sense.node_id:
                 riskable = True
 
@@ -535,8 +576,8 @@ def lemma_as_superordinate(sense):
                 match = record.branches[0].thesclass
 
     if match is not None:
-        match.reason_text = 'Lemma appears elsewhere as a superordinate'
-        match.reason_code = 'lass'
+        match = _annotate(match, 'lass',
+                          'Lemma appears elsewhere as a superordinate')
         return match
     else:
         return None
@@ -548,13 +589,13 @@ def infer_derivative(sense, main_sense_of_entry):
         not main_sense_of_entry.is_affix() and
         main_sense_of_entry.thesclass is not None):
         # Take precedent from the main sense of the parent entry
-        equiv = tdb.equivalent_class(main_sense_of_entry.thesclass, sense.wordclass)
+        equiv = qtdb.equivalent_class(main_sense_of_entry.thesclass, sense.wordclass)
         if equiv is not None:
-            equiv.reason_text = 'Parallel to "%s"' % main_sense_of_entry.lemma
-            equiv.reason_code = 'driv'
+            equiv = _annotate(equiv, 'driv',
+                              'Parallel to "%s"' % main_sense_of_entry.lemma)
     if equiv is None:
         # Take precedent from other sibling derivatives
-        candidates = tdb.ranked_search(refentry=sense.entry_id,
+        candidates = qtdb.ranked_search(refentry=sense.entry_id,
             thes_linked=True, currentOnly=True)
         candidates = [c for c in candidates if c.is_derivative() and
                       not ' ' in c.lemma and
@@ -571,9 +612,9 @@ def infer_derivative(sense, main_sense_of_entry):
             if equiv is None:
                 equiv = parents[0]
             if equiv is not None:
-                equiv.reason_text = 'Parallel to %s' % ', '.join(
-                    ['"%s"' % (c.lemma,) for c in candidates if c.lemma])
-                equiv.reason_code = 'driv'
+                equiv = _annotate(equiv, 'driv',
+                                  'Parallel to %s' % ', '.join(
+                                  ['"%s"' % (c.lemma,) for c in candidates if c.lemma]))
     return equiv
 
 
@@ -588,14 +629,14 @@ def attributive_of_noun(sense, main_sense_of_entry):
     xrefs = [xr for xr in sense.cross_references if
         xr.refentry == sense.entry_id and xr.lemma is None]
     if xrefs:
-        target_sense = tdb.highest_ranked(lemma=sense.lemma,
-                                          wordclass='NN',
-                                          refentry=xrefs[0].refentry,
-                                          refid=xrefs[0].refid)
+        target_sense = qtdb.highest_ranked(lemma=sense.lemma,
+                                           wordclass='NN',
+                                           refentry=xrefs[0].refentry,
+                                           refid=xrefs[0].refid)
         if target_sense is not None and target_sense.thesclass is not None:
-            equiv = tdb.equivalent_class(target_sense.thesclass, 'JJ')
-            equiv.reason_text = 'Adjective equivalent of cross-referenced noun sense'
-            equiv.reason_code = 'attb'
+            equiv = qtdb.equivalent_class(target_sense.thesclass, 'JJ')
+            equiv = _annotate(equiv, 'attb',
+                              'Adjective equivalent of cross-referenced noun sense')
             return equiv
         elif target_sense is not None:
             return None
@@ -603,9 +644,9 @@ def attributive_of_noun(sense, main_sense_of_entry):
     # ... otherwise, default to the main sense of the entry
     if (main_sense_of_entry is not None and
         main_sense_of_entry.thesclass is not None):
-        equiv = tdb.equivalent_class(main_sense_of_entry.thesclass, 'JJ')
-        equiv.reason_text = 'Adjective equivalent of main noun sense'
-        equiv.reason_code = 'attb'
+        equiv = qtdb.equivalent_class(main_sense_of_entry.thesclass, 'JJ')
+        equiv = _annotate(equiv, 'attb',
+                          'Adjective equivalent of main noun sense')
         return equiv
     else:
         return None
@@ -619,16 +660,16 @@ def affix_subentry(sense):
         if len(ending) < 4:
             target_sense = None
         elif sense.subjects:
-            target_sense = tdb.highest_ranked(lemma=ending,
-                                              wordclass=sense.wordclass,
-                                              subjects=sense.subjects)
+            target_sense = qtdb.highest_ranked(lemma=ending,
+                                               wordclass=sense.wordclass,
+                                               subjects=sense.subjects)
         else:
             target_sense = main_sense_finder.main_sense(lemma=ending,
                                                         wordclass=sense.wordclass)
         if target_sense is not None and target_sense.thesclass is not None:
             match = target_sense.thesclass
-            match.reason_text = 'Inferred from last element ("%s")' % ending
-            match.reason_code = 'driv'
+            match = _annotate(match, 'driv',
+                              'Inferred from last element ("%s")' % ending)
             return match
     return None
 
@@ -647,9 +688,9 @@ def compare_binomials(sense):
             if class_id is not None:
                 match = tdb.get_thesclass(class_id)
     if match is not None:
-        match.reason_text = 'Taxonomic name: %s' % ', '.join(
-            sense.binomials.union(sense.genera))
-        match.reason_code = 'txny'
+        match = _annotate(match, 'txny',
+                          'Taxonomic name: %s' % ', '.join(
+                          sense.binomials.union(sense.genera)))
         return match
     else:
         return None
@@ -658,9 +699,9 @@ def compare_binomials(sense):
 def triangulate_synonyms(sense):
     match = synonymchecker.triangulate_synonyms(sense)
     if match is not None:
-        match.reason_text = 'Analogy with synonym: %s' % ', '.join(
-            ['"%s"' % (s,) for s in sense.synonyms])
-        match.reason_code = 'syns'
+        match = _annotate(match, 'syns',
+                          'Analogy with synonym: %s' % ', '.join(
+                          ['"%s"' % (s,) for s in sense.synonyms]))
         return match
     else:
         return None
@@ -669,8 +710,8 @@ def triangulate_synonyms(sense):
 def match_single_synonym(sense):
     match, synonym_used = synonymchecker.match_single_synonym(sense)
     if match is not None:
-        match.reason_text = 'Analogy with synonym: %s' % synonym_used
-        match.reason_code = 'syns'
+        match = _annotate(match, 'syns',
+                          'Analogy with synonym: %s' % synonym_used)
         return match
     else:
         return None
@@ -679,8 +720,8 @@ def match_single_synonym(sense):
 def synonym_main_sense(sense):
     match, synonym_used = synonymchecker.synonym_main_sense(sense)
     if match is not None:
-        match.reason_text = 'Analogy with synonym: %s' % synonym_used
-        match.reason_code = 'syns'
+        match = _annotate(match, 'syns',
+                          'Analogy with synonym: %s' % synonym_used)
         return match
     else:
         return None
@@ -701,19 +742,19 @@ def infer_from_etyma(sense, subjectFilter=False):
     if etymon is not None:
         # First try to find the exact sense, in case the etymon points to a
         #  specific sense - see e.g. lam n./3
-        target_instance = tdb.highest_ranked(lemma=etymon[0],
-                                             refentry=etymon[1],
-                                             refid=etymon[2],
-                                             exact_sense=True)
+        target_instance = qtdb.highest_ranked(lemma=etymon[0],
+                                              refentry=etymon[1],
+                                              refid=etymon[2],
+                                              exact_sense=True)
         # ...but if the etymon just points to an entry in general, find that
         #  entry's main sense
         if target_instance is None and not subjectFilter:
             target_instance = main_sense_finder.main_sense(lemma=etymon[0],
                                                            refentry=etymon[1])
         elif target_instance is None and subjectFilter:
-            main_sense = tdb.highest_ranked(lemma=etymon[0],
-                                            refentry=etymon[1],
-                                            subjects=sense.subjects)
+            main_sense = qtdb.highest_ranked(lemma=etymon[0],
+                                             refentry=etymon[1],
+                                             subjects=sense.subjects)
             if main_sense is not None and main_sense.entry_size < 100:
                 target_instance = main_sense
 
@@ -724,10 +765,10 @@ def infer_from_etyma(sense, subjectFilter=False):
             for xr in sense.cross_references:
                 if (xr.lemma == target_instance.lemma and
                     xr.refentry == target_instance.refentry):
-                    specific_target = tdb.highest_ranked(lemma=xr.lemma,
-                                                         refentry=xr.refentry,
-                                                         refid=xr.refid,
-                                                         exact_sense=True)
+                    specific_target = qtdb.highest_ranked(lemma=xr.lemma,
+                                                          refentry=xr.refentry,
+                                                          refid=xr.refid,
+                                                          exact_sense=True)
                     if specific_target is not None:
                         target_instance = specific_target
                     break
@@ -736,10 +777,10 @@ def infer_from_etyma(sense, subjectFilter=False):
         if target_instance.wordclass == sense.wordclass:
             match = target_instance.thesclass.wordclass_parent()
         else:
-            match = tdb.equivalent_class(target_instance.thesclass, sense.wordclass)
+            match = qtdb.equivalent_class(target_instance.thesclass, sense.wordclass)
         if match is not None:
-            match.reason_code = 'etym'
-            match.reason_text = 'Analogy with "%s" in etymology' % etymon[0]
+            match = _annotate(match, 'etym',
+                              'Analogy with "%s" in etymology' % etymon[0])
         return match
     else:
         return None
@@ -754,15 +795,15 @@ def infer_from_neighbouring_wordclass(sense):
     else:
         opposite_class = None
     if opposite_class is not None:
-        opposite = tdb.highest_ranked(lemma=sense.lemma,
-                                      refentry=sense.entry_id,
-                                      wordclass=opposite_class)
+        opposite = qtdb.highest_ranked(lemma=sense.lemma,
+                                       refentry=sense.entry_id,
+                                       wordclass=opposite_class)
         if opposite is not None and opposite.thesclass is not None:
-            match = tdb.equivalent_class(opposite.thesclass, sense.wordclass)
+            match = qtdb.equivalent_class(opposite.thesclass, sense.wordclass)
 
     if match is not None:
-        match.reason_code = 'nbor'
-        match.reason_text = 'Inferred from neighbouring %s branch' % opposite_class
+        match = _annotate(match, 'nbor',
+                          'Inferred from neighbouring %s branch' % opposite_class)
     return match
 
 
@@ -770,12 +811,12 @@ def infer_from_superordinate(sense):
     match = superordinate_manager.find_branch_from_superordinate(sense)
     if match is not None:
         if sense.wordclass == 'JJ':
-            match.reason_code = 'adeq'
-            match.reason_text = 'Adjective equivalent of "%s"' % sense.superordinate
+            match = _annotate(match, 'adeq',
+                              'Adjective equivalent of "%s"' % sense.superordinate)
         else:
-            match.reason_code = 'supe'
-            match.reason_text = 'Classification of superordinate "%s" ("%s")'\
-                % (sense.superordinate, sense.superordinate_full)
+            match = _annotate(match, 'supe',
+                              'Classification of superordinate "%s" ("%s")'
+                              % (sense.superordinate, sense.superordinate_full))
     return match
 
 
@@ -783,13 +824,13 @@ def superordinate_lookup(sense, **kwargs):
     match = superordinate_manager.superordinate_lookup(sense, **kwargs)
     if match is not None and match.wordclass is not None:
         if sense.wordclass == 'JJ':
-            match = tdb.equivalent_class(match, 'JJ')
-            match.reason_code = 'adeq'
-            match.reason_text = 'Adjective equivalent of "%s"' % sense.superordinate
+            match = qtdb.equivalent_class(match, 'JJ')
+            match = _annotate(match, 'adeq',
+                              'Adjective equivalent of "%s"' % sense.superordinate)
         else:
-            match.reason_code = 'supe'
-            match.reason_text = 'Classification of superordinate "%s" ("%s")'\
-                % (sense.superordinate, sense.superordinate_full)
+            match = _annotate(match, 'supe',
+                              'Classification of superordinate "%s" ("%s")'
+                              % (sense.superordinate, sense.superordinate_full))
         #if sense.wordclass == 'VB':
         #    print('\n----------------------------------------')
         #    print(trace_sense(sense))
@@ -802,9 +843,9 @@ def superordinate_lookup(sense, **kwargs):
 def superordinate_adjective_state(sense):
     match = superordinate_manager.superordinate_adjective_state(sense)
     if match is not None and match.wordclass is not None:
-        match.reason_code = 'supe'
-        match.reason_text = 'Classification of superordinate "%s" ("%s")'\
-            % (sense.superordinate, sense.superordinate_full)
+        match = _annotate(match, 'supe',
+                          'Classification of superordinate "%s" ("%s")'
+                          % (sense.superordinate, sense.superordinate_full))
         return match
     else:
         return None
@@ -813,8 +854,8 @@ def superordinate_adjective_state(sense):
 def classify_by_bayes(sense):
     if sense.topical_classification is not None:
         match = sense.topical_classification
-        match.reason_code = 'topc'
-        match.reason_text = 'Estimated topic (based on Bayes classifier)'
+        match = _annotate(match, 'topc',
+                          'Estimated topic (based on Bayes classifier)')
         return match
     else:
         return None
@@ -837,9 +878,8 @@ def refine_by_binomial(candidate_classifications, qbinomials):
                 new_class = binomial_class
                 break
         if new_class is not None:
-            new_class.reason_code = current_class.reason_code
-            new_class.reason_text = current_class.reason_text
-            return new_class
+            return _annotate(new_class, current_class.reason_code,
+                             current_class.reason_text)
         else:
             return current_class
 
@@ -867,9 +907,8 @@ def refine_by_neighbours(sense, current_class, neighbours):
             new_class = n.parent
             break
     if new_class is not None:
-        new_class.reason_code = current_class.reason_code
-        new_class.reason_text = current_class.reason_text
-        return new_class
+        return _annotate(new_class, current_class.reason_code,
+                         current_class.reason_text)
     else:
         return current_class
 
@@ -901,9 +940,8 @@ def refine_by_subject_labels(sense, current_class):
                 break
 
     if new_class is not None:
-        new_class.reason_code = current_class.reason_code
-        new_class.reason_text = current_class.reason_text
-        return new_class
+        return _annotate(new_class, current_class.reason_code,
+                         current_class.reason_text)
     else:
         return current_class
 
@@ -927,14 +965,25 @@ def classifications_cleanup(candidate_classifications):
     candidate_classifications = tmp
 
     # Make sure that every candidate classification has reason text/code
-    for t in candidate_classifications:
+    for i, t in enumerate(candidate_classifications):
         try:
             t.reason_text
-        except AttributeError:
-            t.reason_text = None
-        try:
             t.reason_code
         except AttributeError:
-            t.reason_code = None
+            candidate_classifications[i] = _annotate(
+                t, getattr(t, 'reason_code', None),
+                getattr(t, 'reason_text', None))
 
     return candidate_classifications
+
+
+def _annotate(thesclass, reason_code, reason_text):
+    """
+    Return a copy of the thesaurus class with the reason code and text
+    attached. (The class itself may be shared - e.g. by cached query
+    results - so isn't changed.)
+    """
+    thesclass = copy.copy(thesclass)
+    thesclass.reason_code = reason_code
+    thesclass.reason_text = reason_text
+    return thesclass
@@ -36,7 +36,9 @@ def ranked_sense_summary(**kwargs):
         if main_sense is not None:
             kwargs['promote'] = main_sense.refid
 
-    candidates = tdb.ranked_search(**kwargs)
+    # level is for the summary, not the search
+    search_args = {k: v for k, v in kwargs.items() if k != 'level'}
+    candidates = tdb.ranked_search(**search_args)
     if omit_null:
         candidates = [c for c in candidates if c.thesclass is not None]
 
@@ -1,6 +1,7 @@
 import itertools
 
 import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
 from resources.mainsense.mainsense import MainSense
 from utils.tracer import trace_class, trace_instance, trace_sense
 
@@ -65,10 +66,10 @@ def match_single_synonym(sense):
     # Drop out any highly polysemous synonyms
     synonyms = []
     for syn in sense.synonyms:
-        instances = tdb.search(lemma=syn,
-                               wordclass=sense.wordclass,
-                               current_only=True)
-        if tdb.distinct_senses(instances) < 20:
+        instances = qtdb.search(lemma=syn,
+                                wordclass=sense.wordclass,
+                                current_only=True)
+        if qtdb.distinct_senses(instances) < 20:
             synonyms.append(syn)
 
     if not synonyms:
@@ -82,10 +83,10 @@ def match_single_synonym(sense):
     if not match and synonyms and sense.subjects:
         candidates = []
         for syn in synonyms:
-            candidates.extend(tdb.ranked_search(lemma=syn,
-                                                wordclass=sense.wordclass,
-                                                subjects=sense.subjects,
-                                                current_only=True))
+            candidates.extend(qtdb.ranked_search(lemma=syn,
+                                                 wordclass=sense.wordclass,
+                                                 subjects=sense.subjects,
+                                                 current_only=True))
         if candidates and candidates[0].thesclass is not None:
             match = candidates[0].thesclass
             matching_synonym = candidates[0].lemma
@@ -96,9 +97,9 @@ def match_single_synonym(sense):
     if not match and synonyms and sense.wordclass == 'UH':
         candidates = []
         for syn in synonyms:
-            candidates.extend(tdb.ranked_search(lemma=syn,
-                                                wordclass='UH',
-                                                current_only=True))
+            candidates.extend(qtdb.ranked_search(lemma=syn,
+                                                 wordclass='UH',
+                                                 current_only=True))
         if candidates and candidates[0].thesclass is not None:
             match = candidates[0].thesclass
             matching_synonym = candidates[0].lemma
@@ -108,12 +109,12 @@ def match_single_synonym(sense):
     if not match:
         candidates = []
         for syn in synonyms:
-            syn_senses = tdb.ranked_search(lemma=syn,
-                                           wordclass=sense.wordclass,
-                                           current_only=True)
+            syn_senses = qtdb.ranked_search(lemma=syn,
+                                            wordclass=sense.wordclass,
+                                            current_only=True)
             if (syn_senses and
-                    (tdb.distinct_senses(syn_senses) == 1 or
-                    (tdb.distinct_senses(syn_senses) <= 3 and
+                    (qtdb.distinct_senses(syn_senses) == 1 or
+                    (qtdb.distinct_senses(syn_senses) <= 3 and
                     len(synonyms) == 1))):
                 candidates.append(syn_senses[0])
         for c in candidates:
@@ -127,10 +128,10 @@ def match_single_synonym(sense):
     if not match and synonyms and sense.bayes.is_usable():
         candidates = []
         for syn in synonyms:
-            candidates.extend(tdb.ranked_search(lemma=syn,
-                                                wordclass=sense.wordclass,
-                                                branches=sense.bayes.ids(),
-                                                current_only=True))
+            candidates.extend(qtdb.ranked_search(lemma=syn,
+                                                 wordclass=sense.wordclass,
+                                                 branches=sense.bayes.ids(),
+                                                 current_only=True))
         if candidates and candidates[0].thesclass is not None:
             match = candidates[0].thesclass
             matching_synonym = candidates[0].lemma
@@ -5,6 +5,8 @@ Figures out a high-level topical classification, based either
 on explicit subject labels or on Bayesian classification.
 """
 
+from thesaurus.treeintervals import get_intervals
+
 # To be usable as an end result, a Bayes classification must be at
 #  or below this level...
 bayes_min_level = 4
@@ -18,14 +20,14 @@ def topical_classification(sense):
     on explicit subject labels or on Bayesian classification.
     """
     labelled_topics = sense.subject_classes()
+    intervals = get_intervals()
 
     # Bayes-based classifications
     bayes_based_classes = set()
     for b in sense.bayes.branches():
         # Look for label-based classifications which might help to refine
         #  a more general Bayes-based classification
-        descendants = [t for t in labelled_topics
-                       if t == b or t.is_descendant_of(b)]
+        descendants = intervals.filter_descendants(labelled_topics, [b,])
         for d in descendants:
             bayes_based_classes.add(d)
         if not descendants:
@@ -67,10 +69,10 @@ def topical_classification(sense):
     if (winner is not None and
             not winner.is_specific_enough(level=bayes_min_level, size=bayes_max_size)):
         desc1 = [t for t in label_based_classes if
-                 t.is_descendant_of(winner) and
+                 intervals.is_descendant(t, winner, strict=True) and
                  t.is_specific_enough(level=bayes_min_level, size=bayes_max_size)]
         desc2 = [t for t in bayes_based_classes if
-                 t.is_descendant_of(winner) and
+                 intervals.is_descendant(t, winner, strict=True) and
                  t.is_specific_enough(level=bayes_min_level, size=bayes_max_size)]
         if sense.bayes.confidence() >= 8:
             descendants = desc2 + desc1
@@ -1,5 +1,5 @@
 
-import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
 
 derivation_forms = (
     ('ism', ('NN',), ''),
@@ -52,10 +52,10 @@ def compound_derivative(sense):
 
             # Test if the hypothetical base form exists, and if so
             #  find out how it is classified
-            base_classifications = tdb.ranked_search(lemma=hypothetical_base,
-                                                     current_only=True)
+            base_classifications = qtdb.ranked_search(lemma=hypothetical_base,
+                                                      current_only=True)
 
-            if (tdb.distinct_senses(base_classifications) == 1 and
+            if (qtdb.distinct_senses(base_classifications) == 1 and
                     base_classifications[0].thesclass is not None):
                 thesclass = base_classifications[0].thesclass
                 break
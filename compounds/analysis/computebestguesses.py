@@ -1,7 +1,7 @@
 
 from collections import namedtuple
 
-import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
 
 from .compoundderivative import compound_derivative
 
@@ -150,7 +150,7 @@ def _append_derivational_classification(best_guesses, sense):
     """
     base_compound_class, insert_position = compound_derivative(sense)
     if base_compound_class is not None:
-        equiv = tdb.equivalent_class(base_compound_class, sense.wordclass)
+        equiv = qtdb.equivalent_class(base_compound_class, sense.wordclass)
         if (equiv is not None and
                 equiv.wordclass is not None and
                 not any([b.target.is_descendant_of(equiv) for b in best_guesses])):
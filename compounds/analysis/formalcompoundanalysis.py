@@ -11,12 +11,14 @@ Used especially for undefined compounds
 import re
 
 import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
 
 from resources.mainsense.mainsense import MainSense
 from ..indexer.compoundindexretriever import retrieve_from_compound_index
 from ..bayes.computebayesconsensus import compute_bayes_consensus
 from .computebestguesses import compute_best_guesses
 from classifyengine.rankedsensesummary import ranked_sense_summary
+from utils.lazy import LazyObject
 
 WORDCLASSES = ('NN', 'JJ', 'RB', 'first')
 MAIN_SENSE_FINDER = MainSense()
@@ -25,10 +27,12 @@ MAIN_SENSE_FINDER = MainSense()
 #  classes since very vague and miscellaneous
 DANGER_BRANCHES = {8835, 82596, 111290}
 
-PARASYN_ENDINGS = {word: tdb.get_thesclass(class_id)
-                   for word, class_id in (('shaped', 98385),
-                                          ('colour', 81487),
-                                          ('coloured', 81487))}
+PARASYN_ENDINGS = LazyObject(
+    lambda: {word: tdb.get_thesclass(class_id)
+             for word, class_id in (('shaped', 98385),
+                                    ('colour', 81487),
+                                    ('coloured', 81487))},
+    name='formalcompoundanalysis.PARASYN_ENDINGS')
 
 SIMILATIVE = {'like', 'wise', 'based', 'containing', 'form', 'formed', 'free'}
 
@@ -112,8 +116,8 @@ def formal_compound_analysis(sense, entry_main_sense):
             sense.wordclass == 'NN')):
         if (word1_main_sense is not None and
                 word1_main_sense.thesclass is not None):
-            t = tdb.equivalent_class(word1_main_sense.thesclass,
-                                     sense.wordclass)
+            t = qtdb.equivalent_class(word1_main_sense.thesclass,
+                                      sense.wordclass)
             if t is not None:
                 output.forced_result = t.wordclass_parent() or t
             output.forced_result = t
@@ -125,8 +129,8 @@ def formal_compound_analysis(sense, entry_main_sense):
             sense.wordclass in ('JJ', 'NN')):
         if (word2_main_sense is not None and
                 word2_main_sense.thesclass is not None):
-            t = tdb.equivalent_class(word2_main_sense.thesclass,
-                                     sense.wordclass)
+            t = qtdb.equivalent_class(word2_main_sense.thesclass,
+                                      sense.wordclass)
             if t is not None:
                 output.forced_result = t.wordclass_parent() or t
         return output
@@ -1,3 +1,4 @@
+from thesaurus.treeintervals import get_intervals
 
 
 def compute_bayes_consensus(sense, bayes_modes):
@@ -29,10 +30,14 @@ def compute_bayes_consensus(sense, bayes_modes):
     level2 = [r for r in consensus if r.thesclass().level == 2]
     level34 = [r for r in consensus if r.thesclass().level == 3 or
                r.thesclass().level == 4]
+    # (r.id is the ID of the result's thesaurus class)
+    descends = get_intervals().descendant_matrix([r.id for r in level34],
+                                                 [r.id for r in level2],
+                                                 strict=True)
     delete_set = set()
-    for r2 in level2:
-        for r34 in level34:
-            if (r34.thesclass().is_descendant_of(r2.thesclass()) and
+    for j, r2 in enumerate(level2):
+        for i, r34 in enumerate(level34):
+            if (descends[i, j] and
                     (r34.consensus_score > r2.consensus_score or
                     r34.consensus_score / r2.consensus_score > 0.8)):
                 delete_set.add(r2.id)
@@ -8,6 +8,7 @@ import string
 from collections import defaultdict
 
 from pickler.sensemanager import PickleLoader
+from utils.metrics import METRICS
 from . import compoundindexerconfig
 
 OUTPUT_DIR = compoundindexerconfig.DIRECTORY
@@ -19,36 +20,59 @@ def make_raw_index(input_dir):
     """
     Compile the raw compound index
     """
-    store = {wordclass: defaultdict(list) for wordclass in WORDCLASSES}
+    index = RawCompoundIndex()
     for letter in string.ascii_uppercase:
-        print('\tIndexing compound elements in %s...' % letter)
+        shard = METRICS.start_shard(
+            letter, 'Indexing compound elements in %s...' % letter)
         loader = PickleLoader(input_dir, letters=letter)
         for s in loader.iterate():
-            if (s.wordclass in WORDCLASSES and
-                    s.first_word() is not None and
-                    s.last_word() is not None):
-                first = s.first_word()
-                last = s.last_word()
-                if first in ('non', 'anti', 'to'):
-                    pass
-                else:
-                    if len(last) >= 3:
-                        last = LIGHT_STEMMER.edit(last.lower())
-                        for leaf in s.thesaurus_nodes:
-                            store[s.wordclass][last].append(leaf)
-                    if len(first) >= 3:
-                        first = LIGHT_STEMMER.edit(first.lower())
-                        for leaf in s.thesaurus_nodes:
-                            store['first'][first].append(leaf)
-
-    for wordclass in compoundindexerconfig.WORDCLASSES:
-        filepath = os.path.join(OUTPUT_DIR, wordclass + '_raw.csv')
-        with open(filepath, 'w') as filehandle:
-            csvwriter = csv.writer(filehandle)
-            for lemma, vals in sorted(store[wordclass].items()):
-                if wordclass == 'first' and len(vals) == 1:
-                    pass
-                else:
-                    row = [lemma, ]
-                    row.extend(vals)
-                    csvwriter.writerow(row)
+            shard.records_in += 1
+            index.index_sense(s)
+        shard.finish()
+    index.write_raw_index()
+
+
+class RawCompoundIndex(object):
+
+    """
+    Accumulates the raw compound index, one sense at a time (so that it
+    can be compiled alongside other indexes in a single pass over the
+    classified senses - see processes/indexclassified.py)
+    """
+
+    def __init__(self):
+        self.start_raw_index()
+
+    def start_raw_index(self):
+        self.store = {wordclass: defaultdict(list) for wordclass in WORDCLASSES}
+
+    def index_sense(self, s):
+        if (s.wordclass in WORDCLASSES and
+                s.first_word() is not None and
+                s.last_word() is not None):
+            first = s.first_word()
+            last = s.last_word()
+            if first in ('non', 'anti', 'to'):
+                pass
+            else:
+                if len(last) >= 3:
+                    last = LIGHT_STEMMER.edit(last.lower())
+                    for leaf in s.thesaurus_nodes:
+                        self.store[s.wordclass][last].append(leaf)
+                if len(first) >= 3:
+                    first = LIGHT_STEMMER.edit(first.lower())
+                    for leaf in s.thesaurus_nodes:
+                        self.store['first'][first].append(leaf)
+
+    def write_raw_index(self):
+        for wordclass in compoundindexerconfig.WORDCLASSES:
+            filepath = os.path.join(OUTPUT_DIR, wordclass + '_raw.csv')
+            with open(filepath, 'w') as filehandle:
+                csvwriter = csv.writer(filehandle)
+                for lemma, vals in sorted(self.store[wordclass].items()):
+                    if wordclass == 'first' and len(vals) == 1:
+                        pass
+                    else:
+                        row = [lemma, ]
+                        row.extend(vals)
+                        csvwriter.writerow(row)
@@ -8,6 +8,7 @@ import lex.oed.thesaurus.thesaurusdb as tdb
 
 from . import compoundindexerconfig
 from .containers import WordSet
+from utils.metrics import METRICS
 
 DIRECTORY = compoundindexerconfig.DIRECTORY
 WORDCLASSES = compoundindexerconfig.WORDCLASSES
@@ -15,7 +16,8 @@ WORDCLASSES = compoundindexerconfig.WORDCLASSES
 
 def refine_index():
     for wordclass in WORDCLASSES:
-        print('\tRefining compound index %s...' % wordclass)
+        shard = METRICS.start_shard(
+            wordclass, 'Refining compound index %s...' % wordclass)
         in_file = os.path.join(DIRECTORY, wordclass + '_raw.csv')
         out_file = os.path.join(DIRECTORY, wordclass)
 
@@ -26,6 +28,7 @@ def refine_index():
                 word = row.pop(0)
                 ids = [int(id) for id in row]
                 compound_words.append((word, ids))
+        shard.records_in = len(compound_words)
 
         output = []
         for word, ids in compound_words:
@@ -37,6 +40,7 @@ def refine_index():
         with open(out_file, 'wb') as filehandle:
             for o in output:
                 pickle.dump(o, filehandle)
+        shard.finish(records_out=len(output))
 
 
 def winnow(class_ids, wordclass):
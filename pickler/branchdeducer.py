@@ -1,21 +1,41 @@
 import lex.oed.thesaurus.thesaurusdb as tdb
 
+from utils.lrucache import LRUCache
+from thesaurus.treeintervals import get_intervals
+
 # abstract properties, relative properties, colour
 USELESS_BRANCHES = (111290, 82596, 67134)
+# Maximum number of cross-reference targets held in the cache
+CACHE_SIZE = 100000
 
 
 class BranchDeducer(object):
 
-    def __init__(self):
-        pass
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache = LRUCache(maxsize=cache_size, name='xref targets')
 
     def branches_from_xrefs(self, sense):
         branches = set()
         for xr in sense.cross_references:
-            instances = tdb.ranked_search(refentry=xr.refentry, refid=xr.refid)
-            local_branches = _parse_instances(instances)
-            branches = branches | local_branches
-        return [b.id for b in branches]
+            branches |= self.resolve(xr.refentry, xr.refid)
+        return list(branches)
+
+    def resolve(self, refentry, refid):
+        """
+        Return the (frozen) set of level-3 branch IDs deduced from the
+        target of a cross-reference.
+
+        Results are memoised, since popular targets get cross-referenced
+        over and over again.
+        """
+        key = (refentry, refid)
+        try:
+            return self.cache.get(key)
+        except KeyError:
+            instances = tdb.ranked_search(refentry=refentry, refid=refid)
+            branch_ids = frozenset([b.id for b in _parse_instances(instances)])
+            self.cache.set(key, branch_ids)
+            return branch_ids
 
 
 def _parse_instances(instances):
@@ -45,8 +65,9 @@ def _parse_instances(instances):
 
 
 def _is_useless(thesclass):
+    intervals = get_intervals()
     for id in USELESS_BRANCHES:
-        if thesclass.id == id or thesclass.is_descendant_of(id):
+        if intervals.is_descendant(thesclass, id):
             return True
     if thesclass.wordclass is not None:
         return True
@@ -1,10 +1,10 @@
 
 import re
 
-from regexcompiler import ReplacementListCompiler
+from .rewriteengine import RewriteEngine
 
 
-primarystripper = ReplacementListCompiler((
+primarystripper = RewriteEngine((
     (r'<.[^<>]*/>', ' '), # remove empty tags
     (r'<([a-zA-Z]+) [^<>]*>', r'<\1>'), # remove tag attributes
     (r'(<def>|</def>|<header>|</header>)', ''),
@@ -18,7 +18,7 @@ primarystripper = ReplacementListCompiler((
     (r', esp [a-z]+ly, ', r' '),
     (r'([ >(][A-Z])\. ', r'\1 ')
 ))
-headstripper = ReplacementListCompiler((
+headstripper = RewriteEngine((
     (r'[Ww]ith (pl|sing|plural|singular) [^.]+\. ([A-Z][a-z]|A )', r'\2'),
     (r'[Ww]ith <gr>[^<>]+</gr>(| (and|or) <gr>[^<>]+</gr>) concord([.:]|$)', ''),
     (r'Also (with|as) [^.]+\. ([A-Z][a-z]|A )', '\2'),
@@ -32,7 +32,7 @@ headstripper = ReplacementListCompiler((
     (r'^<la>[^<>]+</la> \([^()]+\)\. ', ''),
     (r'^<gr>[^<>]+</gr> \([^()]+\)\. ', ''),
 ))
-tailstripper = ReplacementListCompiler((
+tailstripper = RewriteEngine((
     (r'(([ -][a-z]{3,}| [A-Z][a-z]{4,})\.\)?) \(?([A-Z][a-z]|<la>).*$', r'\1'),
     (r'(\)\.) [A-Z][a-z].*$', r'\1'),
     (r'( [a-z]+ [a-z]{3,}\.) <la>(Obs|rare)*$', r'\1'),
@@ -43,7 +43,7 @@ tailstripper = ReplacementListCompiler((
     (r': (see|e\.g\.) .*$', ''),
     (r', (used |now |)(esp|especially) [^(),].*$', '')
 ))
-glosscleaner = ReplacementListCompiler((
+glosscleaner = RewriteEngine((
     (r' *(also |now |)(chiefly|formerly|orig|usu|freq|spec|with|in|hence|esp|now only)(| in) <(la|lm|lemUnit|gr)>', r' <\4>'),
     (r'(also|usually |)(more fully|in full|in form) <(lm|lemUnit|vf)>', r' <\3>'),
     #(r' *(cf\.|see|see also|=) *<(xr|cf)', r' <\2'),
@@ -98,7 +98,7 @@ phrasals = '(a|an|the|by|with|from|at|in|into|on|onto|upon|out|through|away|to|o
 causal = '(give rise to|bring about|engender|produce|induce|cause|compel)'
 transform = '(become|(turn|grow|pass|change|develop|evolve) into)'
 
-glossnormal = ReplacementListCompiler ((
+glossnormal = RewriteEngine((
     (r'\(.*?\)', ''),  # remove bracketed content
     (r' ' + adverbs + ' ', ' '),
     (r' ' + adverbly + ' ', ' '),
@@ -128,11 +128,11 @@ glossnormal = ReplacementListCompiler ((
     #(r' ([a-z-]+) or [a-z-]{4,} ', r' \1 '),
     (r'  +', ' '),
 ))
-verbbracketscleaner = ReplacementListCompiler ((
+verbbracketscleaner = RewriteEngine((
     (r'\(([^()]+?)(,| or) [^()]+\)', r'\1'), # retain only the first item in brackets
     (r'[()]', ''), # remove brackets
 ))
-verbcleaner = ReplacementListCompiler ((
+verbcleaner = RewriteEngine((
     (r', to .*$', ' '),
     (r',? (so as to|in order to|as by|as if|by means of|so that) .*$', ' '),
     (r'^(to [a-z ]+), ([a-z-]+|[a-z-]+, [a-z-]+|[a-z-]+, [a-z-]+, [a-z-]+) *$', r'\1 '),
@@ -1,11 +1,13 @@
 
 import re
+from collections import Counter
 
-from regexcompiler import ReplacementListCompiler
+from .rewriteengine import RewriteEngine
+from .regexanalysis import parse, requirements, prefixes, suffixes
 import lex.oed.thesaurus.thesaurusdb as tdb
 from utils.tracer import trace_sense
 
-definition_preparer = ReplacementListCompiler((
+definition_preparer = RewriteEngine((
     (r'\([^()]+\)', ''),  # Remove anything in parentheses
     (r'^(trans|intr)\. and (trans|intr)\. *', ''),
     (r'^(intr|trans|refl)\. *', ''),
@@ -71,38 +73,97 @@ for wordclass, tuplist in synfinders.items():
     synfinders[wordclass] = tuplist
 
 
-def locate_synonyms(sense):
-    definition = sense.definition
-    gloss = re.sub(r'(very|somewhat|rather|particularly|extremely) ', r'\1', sense.gloss)
-    wordclass = sense.wordclass
+class SynonymDispatcher(object):
+
+    """
+    Tries a list of synfinder patterns in turn against a definition and
+    gloss, and returns the first match - but skips any pattern which can
+    be ruled out by cheap tests on the text: how it starts and ends, and
+    which literal strings (and how many of each) it contains.
+    """
+
+    def __init__(self, finders):
+        self.finders = [(regex, groups, texttype, _Prefilter(regex))
+                        for regex, groups, texttype in finders]
+        self.attempts = 0
+        self.skipped = 0
+
+    def search(self, definition, gloss):
+        """
+        Return the first match (and the list of groups to take from it),
+        or (None, None) if no pattern matches
+        """
+        # Counts of literal strings in each text, shared between patterns
+        counts = {'definition': {}, 'gloss': {}}
+        for regex, groups, texttype, prefilter in self.finders:
+            if texttype == 'definition':
+                text = definition
+            else:
+                text = gloss
+            if not prefilter.is_possible(text, counts[texttype]):
+                self.skipped += 1
+                continue
+            self.attempts += 1
+            m = regex.search(text)
+            if m is not None:
+                return m, groups
+        return None, None
+
+
+class _Prefilter(object):
+
+    def __init__(self, regex):
+        parsed = parse(regex.pattern, regex.flags)
+        self.prefixes = prefixes(parsed)
+        if self.prefixes is not None:
+            self.prefixes = tuple(self.prefixes)
+        self.suffixes = suffixes(parsed)
+        if self.suffixes is not None:
+            # '$' can also match before a final newline
+            self.suffixes = tuple(self.suffixes) +\
+                tuple([s + '\n' for s in self.suffixes])
+        required = requirements(parsed)
+        self.counts = Counter([r[0] for r in required if len(r) == 1])
+        self.counts = sorted(self.counts.items(), key=lambda c: len(c[0]),
+                             reverse=True)
+        self.alternatives = [r for r in required if len(r) > 1]
+
+    def is_possible(self, text, counts):
+        if self.prefixes is not None and not text.startswith(self.prefixes):
+            return False
+        if self.suffixes is not None and not text.endswith(self.suffixes):
+            return False
+        for literal, minimum in self.counts:
+            try:
+                count = counts[literal]
+            except KeyError:
+                count = counts[literal] = text.count(literal)
+            if count < minimum:
+                return False
+        for alternatives in self.alternatives:
+            if not any([literal in text for literal in alternatives]):
+                return False
+        return True
 
-    if definition is None:
-        definition = ''
-    if gloss is None:
-        gloss = ''
-    gloss = _decapitalize(gloss)
 
-    d = definition_preparer.edit(definition).strip()
-    d = _decapitalize(d)
-    # Add semi-colon + space at the beginning, so that regexes don't need to
-    #  handle the start of the string in any special way
-    d = '; ' + d
+SYNONYM_DISPATCHERS = {
+    'NN': SynonymDispatcher(synfinders['NN']),
+    'JJ': SynonymDispatcher(synfinders['JJ']),
+    'RB': SynonymDispatcher(synfinders['JJ'] + synfinders['RB']),
+    'VB': SynonymDispatcher(synfinders['VB']),
+}
+
+
+def locate_synonyms(sense):
+    definition, d, gloss = prepare_texts(sense)
+    wordclass = sense.wordclass
 
     synonyms = []
     if wordclass in ('NN', 'JJ', 'VB', 'RB'):
-        if wordclass == 'RB':
-            regexes = synfinders['JJ'] + synfinders['RB']
-        else:
-            regexes = synfinders[wordclass]
-        for regex, groups, texttype in regexes:
-            if texttype == 'definition':
-                m = regex.search(d)
-            elif texttype == 'gloss':
-                m = regex.search(gloss)
-            if m is not None:
-                for g in groups:
-                    synonyms.append(m.group(g))
-                break
+        m, groups = SYNONYM_DISPATCHERS[wordclass].search(d, gloss)
+        if m is not None:
+            for g in groups:
+                synonyms.append(m.group(g))
     elif wordclass == 'UH':
         m = re.findall('\u2018(.*?)\u2019', definition)
         if m is not None:
@@ -128,6 +189,28 @@ def locate_synonyms(sense):
     return synonyms2
 
 
+def prepare_texts(sense):
+    """
+    Return the sense's definition, plus the versions of the definition
+    and gloss that the synfinder patterns are matched against
+    """
+    definition = sense.definition
+    gloss = re.sub(r'(very|somewhat|rather|particularly|extremely) ', r'\1', sense.gloss)
+
+    if definition is None:
+        definition = ''
+    if gloss is None:
+        gloss = ''
+    gloss = _decapitalize(gloss)
+
+    d = definition_preparer.edit(definition).strip()
+    d = _decapitalize(d)
+    # Add semi-colon + space at the beginning, so that regexes don't need to
+    #  handle the start of the string in any special way
+    d = '; ' + d
+    return definition, d, gloss
+
+
 def is_valid_bigram(bigram, wordclass):
     # Verb bigrams will only be phrasal verbs, so need to have 'to' prepended
     if wordclass == 'VB':
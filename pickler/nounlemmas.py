@@ -0,0 +1,61 @@
+"""
+NounLemmas -- Preloaded set of the current noun lemmas in the thesaurus.
+
+Used by nounphraser.np_cleaner(), to test whether an ngram is a known
+noun without a database look-up for every candidate ngram.
+
+The set is compiled from the thesaurus database and cached in a text
+file (one lemma per line) in the resources directory; the file is
+recompiled by the populate_thesaurus_database stage.
+"""
+
+import os
+
+import lex.oed.thesaurus.thesaurusdb as tdb
+
+FILENAME = 'noun_lemmas.txt'
+
+
+class NounLemmas(object):
+    lemmas = None
+
+    def __init__(self, dir=None):
+        if NounLemmas.lemmas is None and dir is not None:
+            self._load(dir)
+
+    def is_loaded(self):
+        return NounLemmas.lemmas is not None
+
+    def is_current_noun(self, lemma):
+        """
+        Return True if lemma is a current noun in the thesaurus.
+
+        Falls back to querying the database if the set has not been loaded.
+        """
+        if NounLemmas.lemmas is not None:
+            # Lemmas are stored case-folded, in line with the database's
+            #  case-insensitive look-up of lemmas
+            return lemma.lower() in NounLemmas.lemmas
+        elif tdb.search_current(lemma=lemma, wordclass='NN'):
+            return True
+        else:
+            return False
+
+    def _load(self, dir):
+        filepath = os.path.join(dir, FILENAME)
+        if not os.path.isfile(filepath):
+            compile_noun_lemmas(dir)
+        with open(filepath) as filehandle:
+            NounLemmas.lemmas = frozenset([line.rstrip('\n')
+                                           for line in filehandle])
+
+
+def compile_noun_lemmas(dir):
+    """
+    Write the set of current noun lemmas in the thesaurus database to file
+    """
+    lemmas = set([instance.lemma.lower() for instance in
+                  tdb.search(wordclass='NN', current_only=True)])
+    with open(os.path.join(dir, FILENAME), 'w') as filehandle:
+        for lemma in sorted(lemmas):
+            filehandle.write(lemma + '\n')
@@ -2,15 +2,14 @@
 import re
 from collections import namedtuple
 
-import nltk
-
 from lex.inflections.singularizer import Singularizer
-import lex.oed.thesaurus.thesaurusdb as tdb
 from .definitiontogloss import gloss_normalizer
 from .postagger import PosTagger
+from .nounlemmas import NounLemmas
 from utils.tracer import trace_sense
 
 POS_TAGGER = PosTagger()
+NOUN_LEMMAS = NounLemmas()
 SINGLER = Singularizer()
 
 PERSON_WHO_PATTERN = re.compile(r' who ([a-z]{3,}s)( |,|$)')
@@ -18,13 +17,24 @@ PERSON_DOING_PATTERN = re.compile(r' (person|man|woman|someone) ([a-z]{3,})ing(
 PERSON_IS_PATTERN = re.compile(r' (person|man|woman|someone) who is ([a-z]+)( |,|$)')
 PERSON_DID_PATTERN = re.compile(r' (person|man|woman|someone) ([a-z]{3,}ed)( |,|$)')
 
-# Noun-phrase chunker
+# Noun-phrase chunker grammar, in nltk.RegexpParser notation
 GRAMMAR = r"""
     NP: {<DT|PP\$>?<JJ.*>*<NN.*>+<POS><JJ.*>*<NN.*>+}
         {<DT|PP\$>?<CD>*<JJ.*>*<NN.*>+}
         {<DT|PP\$>?<NN>?<JJ>?<NN.*>+}
 """
-CHUNK_PARSER = nltk.RegexpParser(GRAMMAR)
+# The same grammar, as used by chunk_noun_phrases(): each tag is reduced
+#  to a single character code, so that the rules can be run as regular
+#  expressions over the string of codes.
+#   D = DT or PP$; J = JJ; j = other JJ* tags; N = NN; n = other NN* tags;
+#   P = POS; C = CD; x = anything else
+CHUNK_RULES = (
+    re.compile(r'D?[Jj]*[Nn]+P[Jj]*[Nn]+'),
+    re.compile(r'D?C*[Jj]*[Nn]+'),
+    re.compile(r'D?N?J?[Nn]+'),
+)
+TAG_CODES = {'DT': 'D', 'PP$': 'D', 'JJ': 'J', 'NN': 'N', 'POS': 'P',
+             'CD': 'C'}
 TokenPair = namedtuple('TokenPair', ['token', 'pos'])
 NPpair = namedtuple('NPpair', ['full', 'short'])
 
@@ -65,12 +75,17 @@ class NounPhraser(object):
                 self._tagged_tokens = []
             else:
                 # Tokenize and pos-tag the tokens
-                tagged = POS_TAGGER.tag(self.gloss())
-                # Lower-case all the tokens
-                self._tagged_tokens = [(t[0].lower(), t[1])
-                                       for t in tagged]
+                self.set_tagged_tokens(POS_TAGGER.tag(self.gloss()))
             return self._tagged_tokens
 
+    def set_tagged_tokens(self, tagged):
+        """
+        Supply the pos-tagged tokens of the gloss, where these have
+        already been tagged elsewhere (e.g. by PosTagger.tag_many()).
+        """
+        # Lower-case all the tokens
+        self._tagged_tokens = [(t[0].lower(), t[1]) for t in tagged]
+
     def chunks(self):
         try:
             return self._chunks
@@ -170,11 +185,11 @@ def parse_noun_phrases(tagged):
         return []
 
     # Chunk into noun phrases
-    chunks_raw = CHUNK_PARSER.parse(tagged)
+    chunks_raw = chunk_noun_phrases(tagged)
     # Strip down the noun phrase to known lemmas (singularized)
     chunks = []
     for n in chunks_raw:
-        if isinstance(n, nltk.tree.Tree) and n.label() == 'NP':
+        if isinstance(n, list):
             chunks.append(TokenPair(np_cleaner(n), 'NP'))
         else:
             chunks.append(TokenPair(n[0], n[1]))
@@ -231,6 +246,60 @@ def parse_noun_phrases(tagged):
     return chunks2
 
 
+def chunk_noun_phrases(tagged):
+    """
+    Chunk a list of (token, tag) tuples into noun phrases, according
+    to GRAMMAR.
+
+    Returns a list in which each NP is a list of (token, tag) tuples,
+    and each token outside an NP is left as its (token, tag) tuple -
+    i.e. the same as the children of the tree returned by
+    nltk.RegexpParser(GRAMMAR).parse(tagged).
+
+    As in nltk, each rule is applied in turn, and only ever matches
+    within the stretches of tags not already chunked by an earlier rule.
+    """
+    codes = ''.join([_tag_code(t[1]) for t in tagged])
+
+    # Start and end of each stretch of unchunked tags
+    unchunked = [(0, len(codes)), ]
+    chunk_spans = []
+    for rule in CHUNK_RULES:
+        remainder = []
+        for start, end in unchunked:
+            for match in rule.finditer(codes, start, end):
+                chunk_spans.append(match.span())
+                if match.start() > start:
+                    remainder.append((start, match.start()))
+                start = match.end()
+            if start < end:
+                remainder.append((start, end))
+        unchunked = remainder
+
+    chunks = []
+    i = 0
+    for start, end in sorted(chunk_spans):
+        chunks.extend(tagged[i:start])
+        chunks.append(list(tagged[start:end]))
+        i = end
+    chunks.extend(tagged[i:])
+    return chunks
+
+
+def _tag_code(tag):
+    try:
+        return TAG_CODES[tag]
+    except KeyError:
+        if tag.startswith('JJ'):
+            code = 'j'
+        elif tag.startswith('NN'):
+            code = 'n'
+        else:
+            code = 'x'
+        TAG_CODES[tag] = code
+        return code
+
+
 def np_cleaner(ntuple):
     start = 0
     for i, t in enumerate(ntuple):
@@ -247,7 +316,7 @@ def np_cleaner(ntuple):
     ntuple_short = ntuple[:]
     while len(ntuple_short) > 1:
         ngram = ' '.join([t[0] for t in ntuple_short])
-        if tdb.search_current(lemma=ngram, wordclass='NN'):
+        if NOUN_LEMMAS.is_current_noun(ngram):
             break
         if PLACES.search(ngram) or ngram in PLACENAME_BIGRAMS:
             break
@@ -1,18 +1,67 @@
 import os
-import nltk
+import importlib
+
+from utils.lrucache import LRUCache
+from utils.lazy import LazyObject
+
+# nltk is slow to import, so is only loaded when the tagger is first used
+nltk = LazyObject(lambda: importlib.import_module('nltk'), name='nltk')
+
+# Maximum number of texts held in the cache of tagged texts
+CACHE_SIZE = 50000
 
 
 class PosTagger(object):
     default_tagger = None
     tagger = None
+    cache = LRUCache(maxsize=CACHE_SIZE, name='pos-tagger cache')
 
     def __init__(self, dir=None):
         if PosTagger.tagger is None and dir is not None:
             self._load_unigrams(dir)
 
     def tag(self, text):
-        tokens = nltk.word_tokenize(text)
-        return PosTagger.tagger.tag(tokens)
+        """
+        Tokenize and pos-tag the text; returns a list of (token, tag) tuples.
+
+        Results are cached, so the list returned should be treated
+        as read-only.
+        """
+        try:
+            return PosTagger.cache.get(text)
+        except KeyError:
+            tokens = nltk.word_tokenize(text)
+            tagged = PosTagger.tagger.tag(tokens)
+            PosTagger.cache.set(text, tagged)
+            return tagged
+
+    def tag_many(self, texts):
+        """
+        Tokenize and pos-tag a batch of texts; returns a list of
+        tagged-token lists (one for each text).
+
+        Any texts not already cached are tagged together in a single
+        tag_sents() call.
+        """
+        results = {}
+        pending = []
+        for text in texts:
+            if text in results:
+                continue
+            try:
+                results[text] = PosTagger.cache.get(text)
+            except KeyError:
+                results[text] = None
+                pending.append(text)
+
+        if pending:
+            token_lists = [nltk.word_tokenize(text) for text in pending]
+            for text, tagged in zip(pending,
+                                    PosTagger.tagger.tag_sents(token_lists)):
+                results[text] = tagged
+                PosTagger.cache.set(text, tagged)
+
+        return [results[text] for text in texts]
 
     def _load_unigrams(self, dir):
         unigrams = {}
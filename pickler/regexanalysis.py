@@ -0,0 +1,193 @@
+"""
+Regex analysis -- Works out, from a parsed regular expression, what any
+string it matches must look like (literal strings it must contain, how
+it must start or end, etc.), so that regexes can be ruled out cheaply
+before running them.
+"""
+
+try:
+    import re._parser as sre_parse
+    from re._constants import (LITERAL, SUBPATTERN, BRANCH, MAX_REPEAT,
+                               MIN_REPEAT, GROUPREF, GROUPREF_EXISTS, AT,
+                               AT_BEGINNING, AT_BEGINNING_STRING, AT_END,
+                               AT_END_STRING)
+except ImportError:
+    import sre_parse
+    from sre_constants import (LITERAL, SUBPATTERN, BRANCH, MAX_REPEAT,
+                               MIN_REPEAT, GROUPREF, GROUPREF_EXISTS, AT,
+                               AT_BEGINNING, AT_BEGINNING_STRING, AT_END,
+                               AT_END_STRING)
+
+# Give up on prefix/suffix sets which would grow larger than this
+MAX_AFFIXES = 50
+
+
+def parse(pattern, flags=0):
+    return sre_parse.parse(pattern, flags)
+
+
+def requirements(items):
+    """
+    Return a list of requirements for any match of the parsed pattern.
+    Each requirement is a tuple of literal strings, at least one of which
+    must appear in the match. Requirements are listed once for each time
+    they must occur (at separate positions) in the match.
+    """
+    required = []
+    current = []
+    for op, av in items:
+        if op is LITERAL:
+            current.append(chr(av))
+            continue
+        if (op in (MAX_REPEAT, MIN_REPEAT) and av[0] >= 1 and
+                len(av[2]) == 1 and av[2][0][0] is LITERAL):
+            # e.g. ' +': the minimum number of repeats can be appended
+            #  to the current run of literals
+            current.extend([chr(av[2][0][1])] * av[0])
+            if av[0] != av[1]:
+                required.append((''.join(current), ))
+                current = []
+            continue
+        if current:
+            required.append((''.join(current), ))
+            current = []
+        if op is SUBPATTERN:
+            group, add_flags, del_flags, subpattern = av
+            if not add_flags and not del_flags:
+                required.extend(requirements(subpattern))
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            minimum, maximum, subpattern = av
+            if minimum >= 1:
+                required.extend(requirements(subpattern))
+        elif op is BRANCH:
+            # Each alternative must supply at least one literal; we take
+            #  the longest from each
+            alternatives = []
+            for branch in av[1]:
+                literals = [r[0] for r in requirements(branch) if len(r) == 1]
+                if not literals:
+                    break
+                alternatives.append(max(literals, key=len))
+            else:
+                required.append(tuple(set(alternatives)))
+    if current:
+        required.append((''.join(current), ))
+    return required
+
+
+def prefixes(items):
+    """
+    If the parsed pattern is anchored at the start of the string, return
+    the set of literal strings that any matching string must start with
+    (one of); otherwise None.
+    """
+    items = list(items)
+    if not items or items[0] != (AT, AT_BEGINNING) and \
+            items[0] != (AT, AT_BEGINNING_STRING):
+        return None
+    return _affixes(items[1:])
+
+
+def suffixes(items):
+    """
+    If the parsed pattern is anchored at the end of the string, return
+    the set of literal strings that any matching string must end with
+    (one of); otherwise None.
+
+    Note that '$' also matches before a newline at the very end of
+    the string.
+    """
+    items = list(items)
+    if not items or items[-1] != (AT, AT_END) and \
+            items[-1] != (AT, AT_END_STRING):
+        return None
+    reversed_affixes = _affixes(_reverse(items[:-1]))
+    if reversed_affixes is None:
+        return None
+    return set([affix[::-1] for affix in reversed_affixes])
+
+
+def _affixes(items):
+    # Set of all the possible literal strings that the sequence of items
+    #  can begin with, up to the first non-literal item
+    affixes = set(['', ])
+    for op, av in items:
+        if op is LITERAL:
+            affixes = set([a + chr(av) for a in affixes])
+        else:
+            branches = _literal_branches(op, av)
+            if branches is None:
+                break
+            affixes = set([a + b for a in affixes for b in branches])
+            if len(affixes) > MAX_AFFIXES:
+                return None
+    if affixes == set(['', ]):
+        return None
+    return affixes
+
+
+def _literal_branches(op, av):
+    # If the item is a (group of) alternation(s) of purely literal strings,
+    #  return the set of strings; otherwise None
+    if op is SUBPATTERN:
+        group, add_flags, del_flags, subpattern = av
+        if add_flags or del_flags:
+            return None
+        strings = set(['', ])
+        for sub_op, sub_av in subpattern:
+            if sub_op is LITERAL:
+                strings = set([s + chr(sub_av) for s in strings])
+            else:
+                branches = _literal_branches(sub_op, sub_av)
+                if branches is None:
+                    return None
+                strings = set([s + b for s in strings for b in branches])
+        return strings
+    elif op is BRANCH:
+        strings = set()
+        for branch in av[1]:
+            branch_strings = set(['', ])
+            for sub_op, sub_av in branch:
+                if sub_op is LITERAL:
+                    branch_strings = set([s + chr(sub_av)
+                                          for s in branch_strings])
+                else:
+                    branches = _literal_branches(sub_op, sub_av)
+                    if branches is None:
+                        return None
+                    branch_strings = set([s + b for s in branch_strings
+                                          for b in branches])
+            strings |= branch_strings
+        return strings
+    return None
+
+
+def _reverse(items):
+    # Reverse the sequence of items (recursively), so that suffixes can
+    #  be found in the same way as prefixes
+    reversed_items = []
+    for op, av in reversed(list(items)):
+        if op is SUBPATTERN:
+            group, add_flags, del_flags, subpattern = av
+            av = (group, add_flags, del_flags, _reverse(subpattern))
+        elif op is BRANCH:
+            av = (av[0], [_reverse(branch) for branch in av[1]])
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            av = (av[0], av[1], _reverse(av[2]))
+        reversed_items.append((op, av))
+    return reversed_items
+
+
+def uses_group_references(items):
+    for op, av in items:
+        if op in (GROUPREF, GROUPREF_EXISTS):
+            return True
+        elif op is SUBPATTERN and uses_group_references(av[-1]):
+            return True
+        elif op in (MAX_REPEAT, MIN_REPEAT) and uses_group_references(av[2]):
+            return True
+        elif op is BRANCH:
+            for branch in av[1]:
+                if uses_group_references(branch):
+                    return True
+    return False
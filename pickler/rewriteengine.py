@@ -0,0 +1,157 @@
+"""
+RewriteEngine -- Applies an ordered list of (pattern, replacement) rules
+to a string.
+
+The result is always exactly the same as applying each rule in turn with
+re.sub() (as ReplacementListCompiler does), but most of the passes over
+the string are avoided:
+
+ * Each rule gets a list of requirements, worked out from the parsed
+   pattern: literal strings (or sets of alternative literal strings) which
+   any match of the pattern must contain. If a requirement is not met by
+   the string, the rule can't match, so it is skipped without running
+   the regex at all.
+
+ * Runs of consecutive rules with no selective requirements (i.e. nothing
+   longer than a single character) are merged into groups, and each group
+   gets a single 'probe' pattern: an alternation of all the rules'
+   patterns. If the probe finds no match anywhere in the string, then none
+   of the rules in the group can match, so the whole group is dismissed in
+   a single pass. Otherwise the group's rules are applied in turn, as
+   usual. Rules which use backreferences, named groups or inline flags are
+   kept out of probes, since their meaning could change inside an
+   alternation. A probe which turns out to match most of the strings it
+   is tried on is just an extra pass, so it gets switched off.
+"""
+
+import re
+
+from .regexanalysis import parse, requirements, uses_group_references
+
+GROUP_SIZE = 8
+# A probe is switched off if, after PROBE_TRIAL uses, it has matched
+#  more than PROBE_MAX_HIT_RATE of the strings it's been tried on
+PROBE_TRIAL = 1000
+PROBE_MAX_HIT_RATE = 0.5
+# Characters which match an ASCII letter in a case-insensitive regex,
+#  but which don't turn into that letter with str.lower()
+CASE_FOLDS = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's'})
+
+
+class RewriteEngine(object):
+
+    def __init__(self, rules, caseInsensitive=False):
+        self.rules = tuple(rules)
+        self.case_insensitive = caseInsensitive
+        if caseInsensitive:
+            self.flags = re.I
+        else:
+            self.flags = 0
+
+        self.groups = []
+        pending = []
+        for pattern, replacement in self.rules:
+            rule = _Rule(pattern, replacement, self.flags)
+            if rule.is_probeable and not rule.is_selective():
+                pending.append(rule)
+                if len(pending) == GROUP_SIZE:
+                    self.groups.append(_Group(pending, self.flags))
+                    pending = []
+            else:
+                if pending:
+                    self.groups.append(_Group(pending, self.flags))
+                    pending = []
+                self.groups.append(_Group([rule, ], self.flags))
+        if pending:
+            self.groups.append(_Group(pending, self.flags))
+
+    def edit(self, text):
+        # Case-folded copy of the text, for checking requirements when the
+        #  engine is case-insensitive (recomputed whenever the text changes)
+        folded = None
+        for group in self.groups:
+            if group.probe is not None and not group.try_probe(text):
+                continue
+            for rule in group.rules:
+                if rule.requirements:
+                    if self.case_insensitive:
+                        if folded is None:
+                            folded = text.translate(CASE_FOLDS).lower()
+                        haystack = folded
+                    else:
+                        haystack = text
+                    if not rule.is_possible(haystack):
+                        continue
+                edited, count = rule.regex.subn(rule.replacement, text)
+                if count:
+                    text = edited
+                    folded = None
+        return text
+
+
+class _Group(object):
+
+    def __init__(self, rules, flags):
+        self.rules = rules
+        self.uses = 0
+        self.hits = 0
+        if len(rules) > 1:
+            self.probe = re.compile('|'.join(['(?:%s)' % rule.pattern
+                                              for rule in rules]), flags)
+        else:
+            self.probe = None
+
+    def try_probe(self, text):
+        """
+        Return False if none of the group's rules can match the text
+        """
+        self.uses += 1
+        if self.probe.search(text) is None:
+            return False
+        self.hits += 1
+        if (self.uses >= PROBE_TRIAL and
+                self.hits > self.uses * PROBE_MAX_HIT_RATE):
+            self.probe = None
+        return True
+
+
+class _Rule(object):
+
+    def __init__(self, pattern, replacement, flags):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.regex = re.compile(pattern, flags)
+
+        parsed = parse(pattern, flags)
+        required = requirements(parsed)
+        if flags & re.I:
+            # Non-ASCII literals can't be checked reliably against
+            #  case-folded text
+            required = [tuple([l.lower() for l in r]) for r in required
+                        if all([_is_ascii(l) for l in r])]
+        # Check the most selective requirements first
+        required.sort(key=lambda r: min([len(l) for l in r]), reverse=True)
+        self.requirements = required
+        self.is_probeable = (not uses_group_references(parsed) and
+                             not self.regex.groupindex and
+                             self.regex.flags == re.compile('', flags).flags)
+
+    def is_selective(self):
+        return any([min([len(l) for l in r]) > 1 for r in self.requirements])
+
+    def is_possible(self, text):
+        """
+        Return False if the text is missing anything that any match
+        of the rule's pattern would have to contain
+        """
+        for alternatives in self.requirements:
+            for literal in alternatives:
+                if literal in text:
+                    break
+            else:
+                return False
+        return True
+
+
+def _is_ascii(text):
+    return all([ord(c) < 128 for c in text])
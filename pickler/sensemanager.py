@@ -5,10 +5,13 @@ import pickle
 
 from lex.entryiterator import EntryIterator
 
-from .senseobject import SenseObject
+from .senseobject import SenseObject, BRANCH_DEDUCER
 from .postagger import PosTagger
+from .nounphraser import NounPhraser, POS_TAGGER
+from .nounlemmas import NounLemmas
 from resources.subjectlabelparser import SubjectLabelParser
 from utils.tracer import trace_sense
+from utils.metrics import METRICS
 
 letters = string.ascii_uppercase
 
@@ -16,12 +19,20 @@ letters = string.ascii_uppercase
 class SensePickler(object):
 
     def __init__(self, **kwargs):
+        # If a StageManifest is supplied, letters whose inputs haven't
+        #  changed since they were last pickled are skipped (unless
+        #  force=True)
+        self.manifest = None
+        self.force = False
+        self.source_dir = None
         for k, v in kwargs.items():
             self.__dict__[k] = v
 
     def pickle_senses(self):
         # prime the pos-tagger
         PosTagger(dir=os.path.join(self.resources_dir, 'postagger'))
+        # prime the set of noun lemmas (used for trimming noun phrases)
+        NounLemmas(dir=self.resources_dir)
         # prime the subject-label parser
         self.label_parser = SubjectLabelParser(
             file=os.path.join(self.resources_dir, 'subject_ontology.xml'))
@@ -31,20 +42,60 @@ class SensePickler(object):
             if self.output_dir is not None:
                 # Regular mode - with an output filehandle
                 outfile = os.path.join(self.output_dir, letter)
+                fingerprint = None
+                if self.manifest is not None:
+                    current, fingerprint = self.manifest.shard_is_current(
+                        letter, self._input_files(letter), outputs=[outfile])
+                    if current and not self.force:
+                        print('\tSkipping %s (unchanged)' % letter)
+                        continue
+                # Records in = entries, records out = sense objects
+                self.shard = METRICS.start_shard(letter)
                 with open(outfile, 'wb') as self.filehandle:
                     self._process_entries(filter)
+                if self.manifest is not None:
+                    self.manifest.record_shard(letter, fingerprint)
             else:
+                self.shard = METRICS.start_shard(letter)
                 # Test mode - no output filehandle
                 self.filehandle = None
                 self._process_entries(filter)
+            self.shard.finish()
+
+        # Report on the caches of cross-reference targets and pos-tagged
+        #  glosses, for sizing
+        print('\t%s' % BRANCH_DEDUCER.cache.report())
+        print('\t%s' % PosTagger.cache.report())
+
+    def _input_files(self, letter):
+        """
+        Files that the senses pickled for a given letter depend on
+        """
+        files = [
+            os.path.join(self.resources_dir, 'noun_lemmas.txt'),
+            os.path.join(self.resources_dir, 'subject_ontology.xml'),
+            os.path.join(self.resources_dir, 'postagger', 'unigrams.txt'),
+            os.path.join(self.resources_dir, 'postagger', 'extras.txt'),
+        ]
+        if self.source_dir is not None:
+            files.append(os.path.join(self.source_dir, 'oed_%s.xml' % letter))
+        return files
 
     def _process_entries(self, file_filter):
+        # Read the source files from the same directory that
+        #  _input_files() fingerprints
+        options = {}
+        if self.source_dir is not None:
+            options['path'] = self.source_dir
         iterator = EntryIterator(dictType='oed',
                                  fixLigatures=True,
                                  verbosity='low',
-                                 fileFilter=file_filter)
+                                 fileFilter=file_filter,
+                                 **options)
         for entry in iterator.iterate():
+            self.shard.records_in += 1
             self.current_entry = entry
+            self.entry_buffer = []
             for s1 in entry.s1blocks():
                 s1.share_quotations()
                 for i, s in enumerate(s1.senses()):
@@ -53,6 +104,7 @@ class SensePickler(object):
                 self._process_sense(s, 5, 10)
             for s in entry.revsect_senses():
                 self._process_sense(s, 5, 10)
+            self._flush_entry()
 
     def _process_sense(self, sense, position, num_senses):
         if sense.is_xref_sense():
@@ -64,6 +116,13 @@ class SensePickler(object):
         elif ((self.mode == 'unclassified' and not sense.thesaurus_categories()) or
                 (self.mode == 'classified' and sense.thesaurus_categories()) or
                 self.mode == 'both'):
+            # We always store the full sense (as clone_num=0),
+            #  irrespective of whether it has also been split into
+            #  separate subdefinitions. This is built first, so that
+            #  any clones can share its definition-independent attributes
+            #  (but it's still dumped after them).
+            full_sense_obj = self._build_sense(sense, position, num_senses, 0)
+
             # If an unclassified sense has multiple definitions, we split
             #   these out to form a series of separate senseObjects
             # These get marked with clone_num 1, 2, 3, etc., unlike the
@@ -76,17 +135,37 @@ class SensePickler(object):
                     # Splice in the subdef in place of the original
                     #  full definition
                     sense_copy.reset_definition(subdef)
-                    self._dump_sense(sense_copy, position, num_senses, i+1)
-            # We always store the full sense (as clone_num=0),
-            #  irrespective of whether it has also been split into
-            #  separate subdefinitions.
-            self._dump_sense(sense, position, num_senses, 0)
-
-    def _dump_sense(self, sense, position, num_senses, clone_num):
-        sense_obj = SenseObject(self.current_entry, sense, position,
-                                num_senses, clone_num, self.label_parser)
-        if self.filehandle is not None:
-            pickle.dump(sense_obj, self.filehandle)
+                    self.entry_buffer.append(self._build_sense(
+                        sense_copy, position, num_senses, i+1,
+                        parent=full_sense_obj))
+            self.entry_buffer.append(full_sense_obj)
+
+    def _build_sense(self, sense, position, num_senses, clone_num,
+                     parent=None):
+        # Noun-phrase parsing is deferred until the end of the entry (see
+        #  _flush_entry()), so that glosses can be pos-tagged in batches
+        return SenseObject(self.current_entry, sense, position,
+                           num_senses, clone_num, self.label_parser,
+                           defer_phrases=True, parent=parent)
+
+    def _flush_entry(self):
+        """
+        Pos-tag the glosses of all the senses from the current entry in
+        a single batch, then finish off the sense objects and pickle them
+        (in their original order).
+        """
+        phrasers = [NounPhraser(sense_obj) for sense_obj in self.entry_buffer]
+        batch = [np for np in phrasers if np.gloss().strip()]
+        tagged_glosses = POS_TAGGER.tag_many([np.gloss() for np in batch])
+        for np, tagged in zip(batch, tagged_glosses):
+            np.set_tagged_tokens(tagged)
+
+        for sense_obj, np in zip(self.entry_buffer, phrasers):
+            sense_obj.parse_phrases(np=np)
+            if self.filehandle is not None:
+                pickle.dump(sense_obj, self.filehandle)
+        self.shard.records_out += len(self.entry_buffer)
+        self.entry_buffer = []
 
 
 class PickleLoader(object):
@@ -4,6 +4,7 @@ import re
 from lex.oed.thesaurus.dbbackend.subjectmapper import SubjectMapper
 
 from utils.tracer import trace_sense, trace_instance, trace_class
+from utils.lazy import LazyObject
 from .definitiontogloss import definition_to_gloss
 from .nounphraser import NounPhraser
 from .branchdeducer import BranchDeducer
@@ -11,38 +12,95 @@ from .locatesynonyms import locate_synonyms
 from .viabilitytester import is_viable
 
 BRANCH_DEDUCER = BranchDeducer()
-SUBJECT_MAPPER = SubjectMapper()
+SUBJECT_MAPPER = LazyObject(SubjectMapper, name='senseobject.SUBJECT_MAPPER')
 LEMMA_TOKENIZER = (re.compile(r"^([a-z-]+) (of| of the) ([a-z-]+)$", re.I),
                    re.compile(r"^([^' ]+)('s |'s-|' |-| )([a-z-]+)$", re.I),)
 IRREGULAR_PPLES = {'built', 'held', 'born', 'worn', 'torn'}
 
+# Attributes which are persisted when a SenseObject is pickled. The order
+#  defines the layout of the serialized form: if it ever changes, add a new
+#  layout to SERIAL_LAYOUTS and bump SERIAL_VERSION, so that pickles
+#  written with earlier layouts can still be loaded.
+CORE_ATTRIBUTES = (
+    'lemma', 'thesaurus', 'entry_id', 'node_id', 'entry_lemma', 'wordclass',
+    'is_subentry', 'subentry_type', 'num_lemmas', 'definition', 'headers',
+    'position_in_entry', 'senses_in_entry', 'gloss', 'definition_supplement',
+    'clone_num', 'genera', 'binomials', 'quotations_binomials', 'subjects',
+    'cross_references', 'etyma', 'synonyms', 'superordinate_full',
+    'superordinate', 'superordinate_tail', 'noun_phrases_full',
+    'noun_phrases', 'xref_branches', 'thesaurus_nodes',
+)
+# Results added by the classifier, and persisted in its output
+RESULT_ATTRIBUTES = ('bayes_classification', 'bayes_confidence', 'class_id',
+                     'reason_text', 'reason_code', 'runners_up',)
+PERSISTED_ATTRIBUTES = CORE_ATTRIBUTES + RESULT_ATTRIBUTES
+SERIAL_LAYOUTS = {1: PERSISTED_ATTRIBUTES}
+SERIAL_VERSION = 1
+_PERSISTED = frozenset(PERSISTED_ATTRIBUTES)
+# Attributes which don't depend on the definition, and so are copied
+#  from the full sense to any clones made from its subdefinitions
+SHARED_ATTRIBUTES = (
+    'lemma', 'thesaurus', 'entry_id', 'node_id', 'entry_lemma', 'wordclass',
+    'is_subentry', 'subentry_type', 'num_lemmas', 'headers',
+    'position_in_entry', 'senses_in_entry', 'quotations_binomials',
+    'subjects', 'etyma', 'thesaurus_nodes',
+)
+# Salient subject node (or None) for each subject label, as found by
+#  salient_subject()
+SUBJECT_NODES = {}
+
 
 class SenseObject(object):
 
+    """
+    Compact representation of a sense, as pickled by SensePickler.
+
+    The persisted attributes are held in slots. Any other attribute set
+    on the sense (e.g. the temporary state added by the classifier) is
+    held on a separate TransientState object, which is never pickled
+    and can be discarded by strip_attributes().
+    """
+
+    __slots__ = PERSISTED_ATTRIBUTES + ('_transient',)
+
     def __init__(self, entry, sense, position_in_entry, total_senses,
-                 clone_num, label_parser):
-        self.lemma = sense.lemma
-        self.thesaurus = sense.thesaurus_categories()
-        self.entry_id = int(entry.id)
-        self.node_id = int(sense.node_id())
-        self.entry_lemma = entry.lemma
-        self.wordclass = sense.primary_wordclass().penn
-        self.is_subentry = sense.is_subentry()
-        self.subentry_type = sense.subentry_type() or 'main sense'
-        self.num_lemmas = len(sense.internal_lemmas())
+                 clone_num, label_parser, defer_phrases=False, parent=None):
+        """
+        If the sense is a clone of another sense (i.e. with one of the
+        latter's subdefinitions spliced in place of its full definition),
+        the SenseObject already built for the full sense can be passed as
+        parent. Anything which doesn't depend on the definition is then
+        copied from the parent rather than being worked out again.
+        """
+        if parent is None:
+            self._set_shared_attributes(entry, sense, position_in_entry,
+                                        total_senses, label_parser)
+        else:
+            for name in SHARED_ATTRIBUTES:
+                try:
+                    setattr(self, name, getattr(parent, name))
+                except AttributeError:
+                    pass
+
+        # Version number for this copy of the sense. Will usually be 0;
+        #  clone_nums #1, #2, etc., will only occur where the dictionary
+        #  sense has multiple subdefs that have been cloned to produce
+        #  separate sense objects.
+        self.clone_num = clone_num
+
         self.definition = sense.definition(length=200) or None
-        self.headers = sense.header_strings()
-        self.position_in_entry = position_in_entry
-        self.senses_in_entry = total_senses
 
+        # The gloss uses the sense's own wordclass (before any
+        #  adjustment to 'PHRASE')
+        wordclass = sense.primary_wordclass().penn
         self.gloss = definition_to_gloss(
             sense.definition_manager().serialized(),
-            self.wordclass
+            wordclass
         )
         if not self.gloss and sense.parent_definition_manager() is not None:
             self.gloss = definition_to_gloss(
                 sense.parent_definition_manager().serialized(),
-                self.wordclass
+                wordclass
             )
 
         # Supplement the definition with the text of the first quotation,
@@ -54,71 +112,140 @@ class SenseObject(object):
             if sense.last_quotation() and sense.last_quotation().text():
                 self.definition_supplement = sense.last_quotation().text()[0:150]
 
-        # Version number for this copy of the sense. Will usually be 0;
-        #  clone_nums #1, #2, etc., will only occur where the dictionary
-        #  sense has multiple subdefs that have been cloned to produce
-        #  separate sense objects.
-        self.clone_num = clone_num
-
         # Taxonomic stuff
         self.genera = (sense.definition_manager().genera() or
                        sense.definition_manager().families())
         self.binomials = sense.definition_manager().binomials()
-        self.quotations_binomials = sense.quotations_binomials()
-
-        # List of subject labels for this sense, omitting any that are
-        #  not salient for thesaurus classification
-        self.subjects = set()
-        for label in sense.labels():
-            for node in label_parser.map_label_to_nodes(label):
-                if SUBJECT_MAPPER.is_thesaurus_mapped(node):
-                    self.subjects.add(node)
-                    break
 
         # List of thesaurus branches corresponding to any cross-references
         #  in the sense
-        self.cross_references = [Xref(xr) for xr in
+        self.cross_references = tuple([Xref(xr) for xr in
                                  sense.definition_manager().cross_references()
                                  if xr.target_type() != 'quotation' and
                                  xr.refentry() is not None and
-                                 xr.refid() is not None]
+                                 xr.refid() is not None])
+
+        # Synonyms
+        self.synonyms = tuple(locate_synonyms(self))
+
+        # Superordinate and noun phrases. These can be deferred, so that
+        #  the caller can pos-tag the glosses of several senses in a
+        #  single batch before calling parse_phrases().
+        if not defer_phrases:
+            self.parse_phrases()
+
+        # Likely thesaurus branches, based on evaluating any unambiguous
+        #   cross-references
+        self.xref_branches = tuple(BRANCH_DEDUCER.branches_from_xrefs(self))
+
+    def _set_shared_attributes(self, entry, sense, position_in_entry,
+                               total_senses, label_parser):
+        """
+        Set the attributes which don't depend on the sense's definition
+        (and so can be shared with any clones of the sense)
+        """
+        self.lemma = sense.lemma
+        self.thesaurus = sense.thesaurus_categories()
+        self.entry_id = int(entry.id)
+        self.node_id = int(sense.node_id())
+        self.entry_lemma = entry.lemma
+        self.wordclass = sense.primary_wordclass().penn
+        self.is_subentry = sense.is_subentry()
+        self.subentry_type = sense.subentry_type() or 'main sense'
+        self.num_lemmas = len(sense.internal_lemmas())
+        self.headers = tuple(sense.header_strings())
+        self.position_in_entry = position_in_entry
+        self.senses_in_entry = total_senses
+        self.quotations_binomials = sense.quotations_binomials()
+
+        # List of subject labels for this sense, omitting any that are
+        #  not salient for thesaurus classification
+        self.subjects = set()
+        for label in sense.labels():
+            node = salient_subject(label, label_parser)
+            if node is not None:
+                self.subjects.add(node)
 
         # Etyma
         if sense.is_subentry() or sense.is_subentry_like():
-            self.etyma = []
+            self.etyma = ()
         else:
             etyma = [et for et in entry.etymology().etyma() if
                      et.type() == 'cross-reference']
-            self.etyma = [(et.lemma, et.refentry(), et.refid()) for et in etyma]
+            self.etyma = tuple([(et.lemma, et.refentry(), et.refid())
+                                for et in etyma])
 
         if (self.wordclass is None and
                 (self.subentry_type == 'phrase' or
                 sense.primary_wordclass().source == 'phrase')):
             self.wordclass = 'PHRASE'
 
-        # Synonyms
-        self.synonyms = locate_synonyms(self)
-
-        np = NounPhraser(self)
-        self.superordinate_full, self.superordinate, self.superordinate_tail = np.superordinate()
-        self.noun_phrases_full = [n.full for n in np.noun_phrases()]
-        self.noun_phrases = [n.short for n in np.noun_phrases()]
-
-        # Likely thesaurus branches, based on evaluating any unambiguous
-        #   cross-references
-        self.xref_branches = BRANCH_DEDUCER.branches_from_xrefs(self)
-
         # The following will only be invoked when processing senses which
         #   have already been classified; otherwise, self.thesaurus_nodes
         #   will be left undefined.
         if sense.thesaurus_categories():
-            self.thesaurus_nodes = [int(n) for n in sense.thesaurus_nodes()]
+            self.thesaurus_nodes = tuple([int(n) for n in
+                                          sense.thesaurus_nodes()])
+
+    #================================================
+    # Attribute handling and serialization
+    #================================================
+
+    def __getattr__(self, name):
+        # Only called when regular look-up fails, i.e. for a slot that
+        #  has not been set, or for a transient attribute
+        if name in _PERSISTED or name == '_transient':
+            raise AttributeError(name)
+        try:
+            return getattr(self._transient, name)
+        except AttributeError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name in _PERSISTED:
+            object.__setattr__(self, name, value)
+        else:
+            try:
+                transient = self._transient
+            except AttributeError:
+                transient = TransientState()
+                object.__setattr__(self, '_transient', transient)
+            setattr(transient, name, value)
+
+    def __reduce__(self):
+        # Serialized form is a bitmask recording which of the persisted
+        #  attributes are set, plus a tuple of their values
+        mask = 0
+        values = []
+        for i, name in enumerate(PERSISTED_ATTRIBUTES):
+            try:
+                value = getattr(self, name)
+            except AttributeError:
+                pass
+            else:
+                mask |= 1 << i
+                values.append(value)
+        return (_restore_sense, (SERIAL_VERSION, mask, tuple(values)))
+
+    def __setstate__(self, state):
+        # Only used for pickles written before SenseObject used slots,
+        #  which store a plain __dict__ (including the old inventory)
+        for name, value in state.items():
+            if name != 'inventory':
+                setattr(self, name, value)
+
+    def parse_phrases(self, np=None):
+        """
+        Find the superordinate and noun phrases in the gloss.
 
-        # Keep an inventory of all the attributes that the object has when
-        #  it's initialized - so that we can later strip off any extraneous
-        #  attributes.
-        # Make sure the inventory itself is included!
-        self.inventory = tuple(list(self.__dict__.keys()) + ['inventory', ])
+        An existing NounPhraser for the sense (e.g. one which has already
+        been supplied with pos-tagged tokens) can be passed as np.
+        """
+        if np is None:
+            np = NounPhraser(self)
+        self.superordinate_full, self.superordinate, self.superordinate_tail = np.superordinate()
+        self.noun_phrases_full = tuple([n.full for n in np.noun_phrases()])
+        self.noun_phrases = tuple([n.short for n in np.noun_phrases()])
 
     def equals_crossreference(self):
         xrefs = [xr for xr in self.cross_references if xr.type == 'equals']
@@ -136,13 +263,12 @@ class SenseObject(object):
 
     def strip_attributes(self):
         """
-        Remove extraneous attributes from the sense's __dict__
+        Remove any transient attributes (e.g. those added by the classifier)
         """
-        original_attributes = set(self.inventory)
-        keys = list(self.__dict__.keys())
-        for att in keys:
-            if att not in original_attributes:
-                del(self.__dict__[att])
+        try:
+            object.__delattr__(self, '_transient')
+        except AttributeError:
+            pass
 
     #================================================
     # First and last elements of a compound lemma
@@ -310,6 +436,47 @@ class SenseObject(object):
             return self._subject_classes
 
 
+def salient_subject(label, label_parser):
+    """
+    Return the first subject node for the label which is mapped to the
+    thesaurus, or None. Memoised, since the same labels recur constantly.
+    """
+    try:
+        return SUBJECT_NODES[label]
+    except KeyError:
+        SUBJECT_NODES[label] = None
+        for node in label_parser.map_label_to_nodes(label):
+            if SUBJECT_MAPPER.is_thesaurus_mapped(node):
+                SUBJECT_NODES[label] = node
+                break
+        return SUBJECT_NODES[label]
+
+
+class TransientState(object):
+
+    """
+    Holder for the temporary attributes of a SenseObject
+    """
+    pass
+
+
+def _restore_sense(version, mask, values):
+    """
+    Rebuild a SenseObject from the serialized form returned by
+    SenseObject.__reduce__()
+    """
+    try:
+        layout = SERIAL_LAYOUTS[version]
+    except KeyError:
+        raise ValueError('Unknown SenseObject serial version: %r' % version)
+    sense_obj = SenseObject.__new__(SenseObject)
+    values = iter(values)
+    for i, name in enumerate(layout):
+        if mask & (1 << i):
+            setattr(sense_obj, name, next(values))
+    return sense_obj
+
+
 class BayesManager(object):
 
     """
@@ -409,6 +576,8 @@ class BayesManager(object):
 
 class Xref(object):
 
+    __slots__ = ('lemma', 'refentry', 'refid', 'target_type', 'type')
+
     def __init__(self, xr):
         self.lemma = xr.lemma()
         self.refentry = xr.refentry()
@@ -416,6 +585,15 @@ class Xref(object):
         self.target_type = xr.target_type()
         self.type = xr.type
 
+    def __reduce__(self):
+        return (_restore_xref, (self.lemma, self.refentry, self.refid,
+                                self.target_type, self.type))
+
+    def __setstate__(self, state):
+        # Only used for pickles written before Xref used slots
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __repr__(self):
         if self.lemma is not None and self.type is not None:
             return '<Xref %s %d#eid%d (%s)>' % (self.lemma, self.refentry,
@@ -428,3 +606,13 @@ class Xref(object):
                                              self.type)
         else:
             return '<Xref %d#eid%d>' % (self.refentry, self.refid)
+
+
+def _restore_xref(lemma, refentry, refid, target_type, type):
+    xref = Xref.__new__(Xref)
+    xref.lemma = lemma
+    xref.refentry = refentry
+    xref.refid = refid
+    xref.target_type = target_type
+    xref.type = type
+    return xref
@@ -3,30 +3,215 @@ Pipeline - Runs processes for building Classifier data
 """
 
 import os
+import string
+import argparse
+import functools
 
 import classifierconfig as config
-
-
-def dispatch():
-    for function_name, status in config.PIPELINE:
-        if status:
+from utils.metrics import METRICS
+from utils.scheduler import StageScheduler, StageSpec
+from utils.manifest import StageManifest, config_values
+
+# Settings which don't affect what a stage produces, so are left out of
+#  stage fingerprints
+UNFINGERPRINTED_SETTINGS = ('PIPELINE', 'MAX_CONCURRENT_STAGES')
+# Set by run_stage(): whether up-to-date stages and shards should be
+#  rebuilt anyway, and the manifest for the stage currently running
+FORCE = False
+CURRENT_MANIFEST = None
+# Stages producing any of these need the live thesaurus database, even
+#  when config.USE_THESAURUS_DB_FILE is set
+LIVE_DB_OUTPUTS = ('thesaurus_db', 'superordinates_db', 'thesaurus_db_file')
+
+# Resources read and written by each stage, used to work out which stages
+#  can run concurrently (see utils/scheduler.py). 'thesaurus_db' is the
+#  thesaurus database (taxonomy, content and classifications);
+#  'superordinates_db' is the separate superordinates table; 'oed_source'
+#  is the OED source files, which are fingerprinted directly;
+#  'thesaurus_db_file' is the SQLite copy of the thesaurus database (and
+#  the lemma index built from it): every stage which refreshes it lists
+#  it as an output, and every stage which may read the thesaurus through
+#  it (see run_stage()) lists it as an input; 'equivalence_table' is the
+#  precomputed table of wordclass equivalents.
+#  Stages which write to the database without fingerprintable inputs are
+#  always run (mode='always'), as are diagnostic stages with no outputs.
+CLASSIFIER_INPUTS = ('thesaurus_db', 'thesaurus_db_file', 'superordinates_db',
+                     'bayes_results', 'bayes_compound_results',
+                     'binomials_index', 'compound_index', 'main_sense_index',
+                     'superordinate_index', 'equivalence_table')
+STAGES = {
+    'populate_thesaurus_database': StageSpec(
+        inputs=(),
+        outputs=('thesaurus_db', 'noun_lemmas', 'thesaurus_db_file'),
+        mode='always'),
+    'store_classified': StageSpec(
+        inputs=('oed_source', 'thesaurus_db', 'thesaurus_db_file',
+                'noun_lemmas'),
+        outputs=('classified_senses',), mode='sharded'),
+    'store_unclassified': StageSpec(
+        inputs=('oed_source', 'thesaurus_db', 'thesaurus_db_file',
+                'noun_lemmas'),
+        outputs=('unclassified_senses',), mode='sharded'),
+    'bayes_classifier': StageSpec(
+        inputs=('oed_source', 'thesaurus_db', 'thesaurus_db_file'),
+        outputs=('bayes_senses', 'bayes_results')),
+    'bayes_compounds': StageSpec(
+        inputs=('bayes_senses', 'thesaurus_db', 'thesaurus_db_file'),
+        outputs=('bayes_compound_results',)),
+    'index_binomials': StageSpec(
+        inputs=('classified_senses', 'thesaurus_db', 'thesaurus_db_file'),
+        outputs=('binomials_index',)),
+    'index_compounds': StageSpec(
+        inputs=('classified_senses', 'thesaurus_db', 'thesaurus_db_file'),
+        outputs=('compound_index',)),
+    'index_main_senses': StageSpec(
+        inputs=('classified_senses', 'thesaurus_db', 'thesaurus_db_file'),
+        outputs=('main_sense_index',)),
+    'index_superordinates': StageSpec(
+        inputs=('classified_senses', 'thesaurus_db'),
+        outputs=('superordinate_index', 'superordinates_db',
+                 'thesaurus_db_file')),
+    'index_classified': StageSpec(
+        inputs=('classified_senses', 'thesaurus_db'),
+        outputs=('binomials_index', 'compound_index', 'main_sense_index',
+                 'superordinate_index', 'superordinates_db',
+                 'thesaurus_db_file')),
+    'export_thesaurus_db': StageSpec(
+        inputs=('thesaurus_db', 'superordinates_db'),
+        outputs=('thesaurus_db_file',)),
+    'build_equivalence_table': StageSpec(
+        inputs=('thesaurus_db', 'thesaurus_db_file'),
+        outputs=('equivalence_table',)),
+    'reset_db': StageSpec(
+        inputs=(), outputs=('thesaurus_db', 'thesaurus_db_file'),
+        mode='always'),
+    'classify1': StageSpec(
+        inputs=('unclassified_senses',) + CLASSIFIER_INPUTS,
+        outputs=('iteration1',)),
+    'update_db': StageSpec(
+        inputs=('iteration1',), outputs=('thesaurus_db', 'thesaurus_db_file'),
+        mode='always'),
+    'classify2': StageSpec(
+        inputs=('iteration1',) + CLASSIFIER_INPUTS,
+        outputs=('iteration2',)),
+    'populate_json': StageSpec(
+        inputs=('iteration1', 'iteration2', 'thesaurus_db',
+                'thesaurus_db_file'),
+        outputs=('json',)),
+    'statistics': StageSpec(
+        inputs=('iteration1', 'iteration2', 'thesaurus_db',
+                'thesaurus_db_file'),
+        outputs=()),
+    'test_sense_parser': StageSpec(
+        inputs=('thesaurus_db', 'thesaurus_db_file', 'noun_lemmas'),
+        outputs=()),
+    'test_classifier': StageSpec(
+        inputs=('unclassified_senses',) + CLASSIFIER_INPUTS,
+        outputs=('compound_trace',)),
+    'random_sample': StageSpec(
+        inputs=('iteration1', 'iteration2', 'thesaurus_db',
+                'thesaurus_db_file'),
+        outputs=('samples',)),
+    'test_chunker': StageSpec(
+        inputs=('unclassified_senses', 'noun_lemmas'), outputs=()),
+    'test_rewrite_engines': StageSpec(
+        inputs=('unclassified_senses',), outputs=()),
+    'test_synonym_dispatch': StageSpec(
+        inputs=('unclassified_senses', 'thesaurus_db', 'thesaurus_db_file'),
+        outputs=()),
+    'benchmark_update_db': StageSpec(
+        inputs=('iteration1', 'thesaurus_db_file'), outputs=()),
+}
+
+
+def dispatch(force=False):
+    METRICS.start_run(config.REPORTS_DIR)
+    stages = [function_name for function_name, status in config.PIPELINE
+              if status]
+    if config.MAX_CONCURRENT_STAGES > 1 and len(stages) > 1:
+        scheduler = StageScheduler(
+            stages,
+            STAGES,
+            functools.partial(run_stage, force=force),
+            max_concurrent=config.MAX_CONCURRENT_STAGES,
+            log_dir=os.path.join(config.REPORTS_DIR, 'logs', METRICS.run_id),
+        )
+        failed = scheduler.run()
+        if failed:
+            raise SystemExit('Stages not completed: %s' % ', '.join(failed))
+    else:
+        for function_name in stages:
             print('=' * 30)
             print('Running "%s"...' % function_name)
             print('=' * 30)
-            func = globals()[function_name]
+            run_stage(function_name, force=force)
+
+
+def run_stage(function_name, force=False):
+    """
+    Run a stage - unless its inputs, the code and the configuration are
+    all unchanged since it was last completed (see utils/manifest.py)
+    """
+    global FORCE, CURRENT_MANIFEST
+    FORCE = force
+    func = globals()[function_name]
+    spec = STAGES.get(function_name)
+    if spec is None:
+        with METRICS.stage(function_name):
             func()
+        return
+
+    CURRENT_MANIFEST = StageManifest(config.MANIFEST_DIR, function_name)
+    # Sharded stages fingerprint each letter's source file separately
+    files = []
+    if 'oed_source' in spec.inputs and spec.mode != 'sharded':
+        files = oed_source_files()
+    CURRENT_MANIFEST.begin(
+        [r for r in spec.inputs if r != 'oed_source'],
+        config_values(config, exclude=UNFINGERPRINTED_SETTINGS),
+        files=files,
+    )
+    if (spec.mode == 'incremental' and spec.outputs and not force and
+            CURRENT_MANIFEST.is_current()):
+        print('\tSkipping "%s": nothing has changed since it last ran'
+              % function_name)
+        return
+    use_db_file = (config.USE_THESAURUS_DB_FILE and
+                   'thesaurus_db_file' in spec.inputs and
+                   not set(spec.outputs) & set(LIVE_DB_OUTPUTS))
+    if use_db_file:
+        import thesaurus.sqlitebackend as sqlitebackend
+        sqlitebackend.install(config.THESAURUS_DB_FILE,
+                              lemma_index_dir=config.LEMMA_INDEX_DIR)
+    try:
+        with METRICS.stage(function_name):
+            func()
+    finally:
+        if use_db_file:
+            sqlitebackend.uninstall()
+    CURRENT_MANIFEST.complete(spec.outputs, unique=spec.mode == 'always')
+
+
+def oed_source_files(letters=string.ascii_uppercase):
+    return [os.path.join(config.OED_SOURCE_DIR, 'oed_%s.xml' % letter)
+            for letter in letters]
 
 
 def populate_thesaurus_database():
     from lex.oed.thesaurus.thesaurusdb import store_taxonomy, store_content
+    from pickler.nounlemmas import compile_noun_lemmas
     store_taxonomy()
     store_content()
+    compile_noun_lemmas(config.RESOURCES_DIR)
+    refresh_thesaurus_db_file()
 
 
 def bayes_classifier():
     from bayes.bayesclassifier import BayesClassifier
-    bc = BayesClassifier(resources_dir=config.RESOURCES_DIR)
+    bc = BayesClassifier(resources_dir=config.RESOURCES_DIR,
+                         source_dir=config.OED_SOURCE_DIR)
     bc.store_features_by_sense()
+    bc.build_feature_store()
     bc.build_rank_files()
     bc.make_classifiers()
     bc.classify_new_senses()
@@ -76,13 +261,62 @@ def index_superordinates():
     si.compile_index()
     si.refine_index()
     store_superordinates(os.path.join(config.RESOURCES_DIR, 'superordinates'))
+    refresh_thesaurus_db_file()
+
+
+def index_classified():
+    """
+    Equivalent to running index_binomials(), index_compounds(),
+    index_main_senses() and index_superordinates(), but with a single
+    pass over the classified senses to compile all the raw indexes.
+    """
+    from processes.indexclassified import index_classified as compile_raw
+    from compounds.indexer.refiner import refine_index as refine_compounds
+    from resources.mainsense.mainsensecompiler import (refine_index,
+                                                       finalize)
+    from lex.oed.thesaurus.dbbackend.populator import store_superordinates
+    bnm, si = compile_raw(config.CLASSIFIED_DIR, config.RESOURCES_DIR)
+    # Refine in the same order as the separate stages
+    bnm.refine_genera_index()
+    bnm.refine_binomial_index()
+    refine_compounds()
+    refine_index()
+    finalize()
+    si.refine_index()
+    store_superordinates(os.path.join(config.RESOURCES_DIR, 'superordinates'))
+    refresh_thesaurus_db_file()
+
+
+def export_thesaurus_db():
+    from thesaurus.sqliteexport import export_thesaurus_db as export
+    from thesaurus.lemmaindex import build_lemma_index
+    export(config.THESAURUS_DB_FILE,
+           os.path.join(config.RESOURCES_DIR, 'superordinates'))
+    build_lemma_index(config.THESAURUS_DB_FILE, config.LEMMA_INDEX_DIR)
+
+
+def build_equivalence_table():
+    from thesaurus.equivalencetable import build_equivalence_table
+    build_equivalence_table(config.EQUIVALENCE_TABLE_FILE)
+
+
+def refresh_thesaurus_db_file():
+    """
+    Re-export the SQLite copy of the thesaurus database, if stages are
+    reading from it (called by every stage that changes the database)
+    """
+    if config.USE_THESAURUS_DB_FILE:
+        export_thesaurus_db()
 
 
 def store_classified():
     from pickler.sensemanager import SensePickler
     sp = SensePickler(mode='classified',
                       output_dir=config.CLASSIFIED_DIR,
-                      resources_dir=config.RESOURCES_DIR)
+                      resources_dir=config.RESOURCES_DIR,
+                      source_dir=config.OED_SOURCE_DIR,
+                      manifest=CURRENT_MANIFEST,
+                      force=FORCE)
     sp.pickle_senses()
 
 
@@ -90,7 +324,10 @@ def store_unclassified():
     from pickler.sensemanager import SensePickler
     sp = SensePickler(mode='unclassified',
                       output_dir=config.UNCLASSIFIED_DIR,
-                      resources_dir=config.RESOURCES_DIR)
+                      resources_dir=config.RESOURCES_DIR,
+                      source_dir=config.OED_SOURCE_DIR,
+                      manifest=CURRENT_MANIFEST,
+                      force=FORCE)
     sp.pickle_senses()
 
 
@@ -103,13 +340,60 @@ def test_sense_parser():
     from pickler.sensemanager import SensePickler
     sp = SensePickler(mode='both',
                       output_dir=None,
-                      resources_dir=config.RESOURCES_DIR,)
+                      resources_dir=config.RESOURCES_DIR,
+                      source_dir=config.OED_SOURCE_DIR)
     sp.pickle_senses()
 
 
+def test_chunker():
+    """
+    Check the noun-phrase chunker against nltk's RegexpParser, and
+    compare throughput.
+    """
+    from processes.benchmarks import benchmark_chunker
+    benchmark_chunker(config.UNCLASSIFIED_DIR, config.RESOURCES_DIR)
+
+
+def test_rewrite_engines():
+    """
+    Check the rewrite engines used to derive glosses against
+    ReplacementListCompiler, and compare throughput.
+    """
+    from processes.benchmarks import benchmark_rewrite_engines
+    benchmark_rewrite_engines(config.UNCLASSIFIED_DIR,
+                              source_dir=config.OED_SOURCE_DIR)
+
+
+def test_synonym_dispatch():
+    """
+    Check the synonym-pattern dispatcher against trying each pattern
+    in turn, and report the number of regex attempts saved.
+    """
+    from processes.benchmarks import benchmark_synonym_dispatch
+    benchmark_synonym_dispatch(config.UNCLASSIFIED_DIR)
+
+
+def benchmark_update_db():
+    """
+    Dry run of update_db() against the SQLite copy of the database:
+    reports how fast iteration-1 classifications can be resolved to
+    instances, without writing anything.
+    """
+    from processes.dbupdater import DbUpdater
+    dbu = DbUpdater(
+        input_dir=os.path.join(config.ITERATION1_DIR, 'classified'),
+        db_file=config.THESAURUS_DB_FILE,
+        dry_run=True,
+    )
+    dbu.update()
+
+
 def reset_db():
     from lex.oed.thesaurus.thesaurusdb import reset
+    import thesaurus.querycache as qtdb
     reset()
+    qtdb.invalidate()
+    refresh_thesaurus_db_file()
 
 
 def test_classifier():
@@ -138,6 +422,7 @@ def update_db():
         input_dir=os.path.join(config.ITERATION1_DIR, 'classified'),
     )
     dbu.update()
+    refresh_thesaurus_db_file()
 
 
 def classify2():
@@ -175,4 +460,23 @@ def random_sample():
 
 
 if __name__ == '__main__':
-    dispatch()
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--profile-imports', action='store_true',
+                        help='report time spent importing modules and '
+                             'initializing lazy resources')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild stages and letters even if their '
+                             'inputs are unchanged')
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        from utils.importprofiler import ImportProfiler
+        profiler = ImportProfiler()
+        profiler.start()
+        try:
+            dispatch(force=args.force)
+        finally:
+            profiler.stop()
+            profiler.report()
+    else:
+        dispatch(force=args.force)
@@ -0,0 +1,245 @@
+"""
+Benchmarks -- Equivalence checks and throughput benchmarks for the
+optimized versions of pipeline components, run against a random sample
+of pickled senses.
+
+Each benchmark runs the original implementation and the optimized one
+over the same inputs, reports any inputs on which their outputs differ,
+and compares throughput.
+"""
+
+import os
+import random
+import time
+
+from pickler.sensemanager import PickleLoader
+
+SAMPLE_SIZE = 20000
+# Number of mismatches to print in full
+MAX_REPORTED = 20
+
+
+def sample_senses(input_dir, size=SAMPLE_SIZE, seed=1):
+    """
+    Return a random sample (reservoir-sampled) of the senses pickled
+    in input_dir
+    """
+    rand = random.Random(seed)
+    sample = []
+    for i, sense in enumerate(PickleLoader(input_dir).iterate()):
+        if i < size:
+            sample.append(sense)
+        else:
+            j = rand.randint(0, i)
+            if j < size:
+                sample[j] = sense
+    return sample
+
+
+def compare(name, inputs, reference_function, new_function):
+    """
+    Run reference_function and new_function over each of the inputs,
+    and report mismatches and timings.
+
+    Returns the list of (input, reference output, new output) tuples
+    for inputs where the outputs differ.
+    """
+    start = time.time()
+    reference_output = [reference_function(i) for i in inputs]
+    reference_time = time.time() - start
+
+    start = time.time()
+    new_output = [new_function(i) for i in inputs]
+    new_time = time.time() - start
+
+    mismatches = [(i, r, n) for i, r, n in
+                  zip(inputs, reference_output, new_output) if r != n]
+
+    print('\t%s: %d inputs, %d mismatches' % (name, len(inputs),
+                                               len(mismatches)))
+    for i, r, n in mismatches[0:MAX_REPORTED]:
+        print('\t\tinput:     %r' % (i,))
+        print('\t\treference: %r' % (r,))
+        print('\t\tnew:       %r' % (n,))
+    print('\t\treference: %0.2fs (%s per second)' % (
+        reference_time, _rate(len(inputs), reference_time)))
+    print('\t\tnew:       %0.2fs (%s per second)' % (
+        new_time, _rate(len(inputs), new_time)))
+    if new_time:
+        print('\t\tspeed-up:  x%0.1f' % (reference_time / new_time))
+    return mismatches
+
+
+def _swap_engines(module, engines):
+    """
+    Replace the named module-level rewrite engines with the ones given;
+    returns the engines that were replaced
+    """
+    originals = {}
+    for name, engine in engines.items():
+        originals[name] = getattr(module, name)
+        setattr(module, name, engine)
+    return originals
+
+
+def _rate(count, seconds):
+    if seconds:
+        return '%d' % (count / seconds)
+    else:
+        return 'n/a'
+
+
+#===============================================================
+# Noun-phrase chunker
+#===============================================================
+
+def benchmark_chunker(input_dir, resources_dir, sample_size=SAMPLE_SIZE):
+    """
+    Compare nounphraser.chunk_noun_phrases() against nltk's RegexpParser,
+    on the pos-tagged glosses of a sample of senses.
+    """
+    import nltk
+    from pickler.postagger import PosTagger
+    from pickler.definitiontogloss import gloss_normalizer
+    from pickler.nounphraser import GRAMMAR, chunk_noun_phrases
+
+    tagger = PosTagger(dir=os.path.join(resources_dir, 'postagger'))
+    tagged_glosses = []
+    for sense in sample_senses(input_dir, size=sample_size):
+        if sense.gloss:
+            gloss = gloss_normalizer(sense.gloss, sense.wordclass)
+            if gloss.strip():
+                tagged_glosses.append([(t[0].lower(), t[1]) for t in
+                                       tagger.tag(gloss)])
+
+    chunk_parser = nltk.RegexpParser(GRAMMAR)
+
+    def nltk_chunker(tagged):
+        return [list(n) if isinstance(n, nltk.tree.Tree) else n
+                for n in chunk_parser.parse(tagged)]
+
+    compare('NP chunker', tagged_glosses, nltk_chunker, chunk_noun_phrases)
+
+
+#===============================================================
+# Rewrite engines (definition-to-gloss, gloss normalizer, etc.)
+#===============================================================
+
+def benchmark_rewrite_engines(input_dir, sample_size=SAMPLE_SIZE,
+                              letter='C', source_dir=None):
+    """
+    Compare the RewriteEngines used in definitiontogloss.py and
+    locatesynonyms.py against ReplacementListCompilers with the same
+    rules:
+     - definition_to_gloss(), on serialized definitions from the OED
+       source file for the given letter;
+     - gloss_normalizer(), on the glosses of a sample of senses;
+     - the definition preparer used by locate_synonyms(), on the
+       definitions of the same sample.
+    """
+    from regexcompiler import ReplacementListCompiler
+    from lex.entryiterator import EntryIterator
+    import pickler.definitiontogloss as dtg
+    import pickler.locatesynonyms as ls
+
+    definitions = []
+    options = {}
+    if source_dir is not None:
+        options['path'] = source_dir
+    iterator = EntryIterator(dictType='oed',
+                             fixLigatures=True,
+                             verbosity='low',
+                             fileFilter='oed_%s.xml' % letter,
+                             **options)
+    for entry in iterator.iterate():
+        for sense in entry.senses():
+            if sense.primary_wordclass() is not None:
+                definitions.append((sense.definition_manager().serialized(),
+                                    sense.primary_wordclass().penn))
+        if len(definitions) >= sample_size:
+            break
+    senses = sample_senses(input_dir, size=sample_size)
+    glosses = [(s.gloss, s.wordclass) for s in senses]
+    short_definitions = [s.definition for s in senses if s.definition]
+
+    for module, names, function, inputs in (
+        (dtg, ('primarystripper', 'headstripper', 'tailstripper',
+               'glosscleaner'),
+         dtg.definition_to_gloss, definitions),
+        (dtg, ('glossnormal', 'verbbracketscleaner', 'verbcleaner'),
+         dtg.gloss_normalizer, glosses),
+    ):
+        engines = {name: getattr(module, name) for name in names}
+        reference_engines = {name: ReplacementListCompiler(
+            engine.rules, caseInsensitive=engine.case_insensitive)
+            for name, engine in engines.items()}
+
+        def run(args, engines_used):
+            originals = _swap_engines(module, engines_used)
+            try:
+                return function(*args)
+            finally:
+                _swap_engines(module, originals)
+
+        compare(function.__name__, inputs,
+                lambda args: run(args, reference_engines),
+                lambda args: run(args, engines))
+
+    engine = ls.definition_preparer
+    reference_engine = ReplacementListCompiler(engine.rules)
+    compare('definition_preparer', short_definitions,
+            reference_engine.edit, engine.edit)
+
+
+#===============================================================
+# Synonym-pattern dispatcher
+#===============================================================
+
+def benchmark_synonym_dispatch(input_dir, sample_size=SAMPLE_SIZE):
+    """
+    Compare locatesynonyms.SynonymDispatcher against trying each of
+    the synfinder patterns in turn, on the definitions and glosses of a
+    sample of senses; and report how many regex attempts are saved.
+    """
+    import pickler.locatesynonyms as ls
+
+    inputs = []
+    for sense in sample_senses(input_dir, size=sample_size):
+        if sense.wordclass in ls.SYNONYM_DISPATCHERS and sense.gloss is not None:
+            definition, d, gloss = ls.prepare_texts(sense)
+            inputs.append((sense.wordclass, d, gloss))
+
+    reference_attempts = [0, ]
+
+    def reference(args):
+        wordclass, d, gloss = args
+        if wordclass == 'RB':
+            regexes = ls.synfinders['JJ'] + ls.synfinders['RB']
+        else:
+            regexes = ls.synfinders[wordclass]
+        for regex, groups, texttype in regexes:
+            reference_attempts[0] += 1
+            if texttype == 'definition':
+                m = regex.search(d)
+            else:
+                m = regex.search(gloss)
+            if m is not None:
+                return [m.group(g) for g in groups]
+        return None
+
+    def dispatched(args):
+        wordclass, d, gloss = args
+        m, groups = ls.SYNONYM_DISPATCHERS[wordclass].search(d, gloss)
+        if m is not None:
+            return [m.group(g) for g in groups]
+        return None
+
+    for dispatcher in ls.SYNONYM_DISPATCHERS.values():
+        dispatcher.attempts = 0
+        dispatcher.skipped = 0
+    compare('synonym patterns', inputs, reference, dispatched)
+
+    attempts = sum([d.attempts for d in ls.SYNONYM_DISPATCHERS.values()])
+    if inputs:
+        print('\t\tregex attempts per sense: %0.2f (reference), %0.2f (new)' % (
+            reference_attempts[0] / len(inputs), attempts / len(inputs)))
@@ -2,12 +2,33 @@
 DBUpdater -- Update the thesaurus database with any new classifications
 found in the first iteration (so that these are available in the
 second iteration)
+
+Classified senses are handled in batches of batch_size: the instances for
+a whole batch are looked up, then the batch's links are written in one
+go. If db_file is given, the instances are looked up in, and the links
+written to, that SQLite copy of the database (see
+thesaurus/sqliteexport.py): the lookups are batched into a few queries
+(sqlitebackend.resolve_instances()), and each batch of links is written
+in a single transaction. The lemma index built from the file (if
+lemma_index_dir is given) is rebuilt afterwards; otherwise it has to be
+rebuilt before it can be used again.
+
+By default, though, the live database is updated. thesaurusdb offers no
+bulk lookup or write, so this is not batched at the database level: each
+sense's instance is still looked up with tdb.search(), and each batch of
+links is written with tdb.add_links(). If dry_run is True, instances are
+looked up but nothing is written; either way, the throughput of each
+phase is reported in rows per second.
 """
 
 import string
+import time
 
 from pickler.sensemanager import PickleLoader
 import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
+from thesaurus import sqlitebackend
+from thesaurus import sqliteexport
 
 letters = string.ascii_uppercase
 
@@ -15,27 +36,120 @@ letters = string.ascii_uppercase
 class DbUpdater(object):
 
     def __init__(self, **kwargs):
+        self.batch_size = 20000
+        self.db_file = None
+        self.lemma_index_dir = None
+        self.dry_run = False
         for k, v in kwargs.items():
             self.__dict__[k] = v
 
     def update(self):
-        for letter in letters:
-            buffer = []
-            pl = PickleLoader(self.input_dir, letters=letter)
-            for sense in pl.iterate():
-                if sense.definition is None:
-                    # don't bother with undefined lemmas
-                    pass
-                else:
-                    instances = tdb.search(refentry=sense.entry_id,
-                                           refid=sense.node_id)
-                    try:
-                        instance = instances[0]
-                    except IndexError:
+        self.stats = {'senses': 0, 'resolved': 0, 'written': 0,
+                      'resolve_time': 0.0, 'write_time': 0.0}
+        installed = False
+        if self.db_file is not None and not sqlitebackend.is_installed():
+            sqlitebackend.install(self.db_file)
+            installed = True
+        try:
+            for letter in letters:
+                buffer = []
+                pl = PickleLoader(self.input_dir, letters=letter)
+                for sense in pl.iterate():
+                    if sense.definition is None:
+                        # don't bother with undefined lemmas
                         pass
                     else:
-                        buffer.append((instance, sense.class_id))
-                        if len(buffer) > 1000:
-                            tdb.add_links(buffer)
+                        buffer.append((sense.entry_id, sense.node_id,
+                                       sense.class_id))
+                        if len(buffer) >= self.batch_size:
+                            self._flush(buffer)
                             buffer = []
-            tdb.add_links(buffer)
+                self._flush(buffer)
+        finally:
+            if installed:
+                sqlitebackend.uninstall()
+        if self.db_file is not None and self.stats['written']:
+            self._rebuild_lemma_index()
+        for line in self.report():
+            print('\t%s' % line)
+
+    def _flush(self, buffer):
+        """
+        Look up the instances for a batch of (refentry, refid, class ID)
+        tuples, and write the links
+        """
+        if not buffer:
+            return
+        start = time.time()
+        instances = self._resolve([(refentry, refid) for refentry, refid, _
+                                   in buffer])
+        links = []
+        for refentry, refid, class_id in buffer:
+            try:
+                instance = instances[(int(refentry), int(refid))]
+            except KeyError:
+                pass
+            else:
+                links.append((instance, class_id))
+        self.stats['resolve_time'] += time.time() - start
+        self.stats['senses'] += len(buffer)
+        self.stats['resolved'] += len(links)
+
+        if self.dry_run or not links:
+            return
+        start = time.time()
+        if self.db_file is not None:
+            sqliteexport.add_links(self.db_file, links)
+        else:
+            tdb.add_links(links)
+        qtdb.invalidate()
+        self.stats['write_time'] += time.time() - start
+        self.stats['written'] += len(links)
+
+    def _resolve(self, keys):
+        """
+        Return a dict mapping (refentry, refid) pairs to instances
+        """
+        if self.db_file is not None:
+            return sqlitebackend.resolve_instances(keys)
+        # The live database can only be searched one query at a time
+        resolved = {}
+        for refentry, refid in keys:
+            key = (int(refentry), int(refid))
+            if key in resolved:
+                continue
+            instances = tdb.search(refentry=refentry, refid=refid)
+            if instances:
+                resolved[key] = instances[0]
+        return resolved
+
+    def _rebuild_lemma_index(self):
+        """
+        Rebuild the lemma index from the updated file (which changed its
+        revision, so an index built before the update would be refused),
+        and make sure the backend, if it's installed, reopens both
+        """
+        from thesaurus.lemmaindex import build_lemma_index
+        if self.lemma_index_dir is not None:
+            build_lemma_index(self.db_file, self.lemma_index_dir)
+        if sqlitebackend.is_installed():
+            sqlitebackend.reopen()
+
+    def report(self):
+        lines = ['Resolved %d/%d senses in %0.1fs (%s)' % (
+            self.stats['resolved'], self.stats['senses'],
+            self.stats['resolve_time'],
+            _rate(self.stats['senses'], self.stats['resolve_time']))]
+        if self.dry_run:
+            lines.append('Dry run: no links written')
+        else:
+            lines.append('Wrote %d links in %0.1fs (%s)' % (
+                self.stats['written'], self.stats['write_time'],
+                _rate(self.stats['written'], self.stats['write_time'])))
+        return lines
+
+
+def _rate(rows, seconds):
+    if seconds:
+        return '%0.0f rows/s' % (rows / seconds)
+    return 'n/a'
@@ -0,0 +1,51 @@
+"""
+index_classified -- Compiles the raw compound, binomial, main-sense and
+superordinate indexes in a single pass over the classified senses, rather
+than unpickling every sense once for each index.
+
+Each index is built by an accumulator with the same three methods:
+start_raw_index(), index_sense(sense) and write_raw_index(). The raw
+index files written are the same as those written by the separate
+make_raw_index() / compile_index() processes.
+"""
+
+import os
+import string
+
+from pickler.sensemanager import PickleLoader
+from resources.binomials import Binomials
+from resources.mainsense.mainsensecompiler import RawMainSenseIndex
+from resources.superordinates.superordinateindexer import SuperordinateIndexer
+from compounds.indexer.rawindexer import RawCompoundIndex
+from utils.metrics import METRICS
+
+
+def index_classified(input_dir, resources_dir):
+    """
+    Compile all four raw indexes; returns the Binomials and
+    SuperordinateIndexer objects, for use in refining their indexes.
+    """
+    binomials = Binomials(input_dir=input_dir,
+                          resources_dir=resources_dir,)
+    superordinates = SuperordinateIndexer(
+        input_dir=input_dir,
+        output_dir=os.path.join(resources_dir, 'superordinates'),
+    )
+    accumulators = [RawCompoundIndex(), binomials, RawMainSenseIndex(),
+                    superordinates]
+    for accumulator in accumulators:
+        accumulator.start_raw_index()
+
+    for letter in string.ascii_uppercase:
+        shard = METRICS.start_shard(
+            letter, 'Indexing classified senses in %s...' % letter)
+        loader = PickleLoader(input_dir, letters=letter)
+        for sense in loader.iterate():
+            shard.records_in += 1
+            for accumulator in accumulators:
+                accumulator.index_sense(sense)
+        shard.finish()
+
+    for accumulator in accumulators:
+        accumulator.write_raw_index()
+    return binomials, superordinates
@@ -8,10 +8,13 @@ from collections import defaultdict, Counter
 
 import lex.oed.thesaurus.thesaurusdb as tdb
 from pickler.sensemanager import PickleLoader
+from utils.lazy import LazyObject
+from thesaurus.treeintervals import get_intervals
 #from utils.tracer import trace_class
 
 living_world_id = 8835
-living_world_node = tdb.get_thesclass(living_world_id)
+living_world_node = LazyObject(lambda: tdb.get_thesclass(living_world_id),
+                               name='binomials.living_world_node')
 life_branches = (22501, 29205, 17709)  # plant, animal, microorganism
 
 
@@ -62,27 +65,37 @@ class Binomials(object):
     #=======================================================
 
     def make_raw_index(self):
-        store = {v: defaultdict(list) for v in ('genera', 'binomials')}
+        self.start_raw_index()
         loader = PickleLoader(self.input_dir)
         for s in loader.iterate():
-            if (s.wordclass == 'NN' and
-                    (s.binomials or s.genera)):
-                for leaf in s.thesaurus_nodes:
-                    thesclass = tdb.get_thesclass(leaf)
-                    if any([thesclass.is_descendant_of(id) for id in
-                            life_branches]):
-                        for g in s.genera:
-                            store['genera'][g].append(leaf)
-                        for b in s.binomials:
-                            store['binomials'][b].append(leaf)
-                            genus = b.split(' ')[0]
-                            if genus not in s.genera:
-                                store['genera'][b.split(' ')[0]].append(leaf)
-
+            self.index_sense(s)
+        self.write_raw_index()
+
+    def start_raw_index(self):
+        self.raw_store = {v: defaultdict(list) for v in ('genera', 'binomials')}
+
+    def index_sense(self, s):
+        store = self.raw_store
+        if (s.wordclass == 'NN' and
+                (s.binomials or s.genera)):
+            leaves = list(s.thesaurus_nodes)
+            is_life = get_intervals().descends_from_any(leaves, life_branches,
+                                                        strict=True)
+            for leaf, in_life_branch in zip(leaves, is_life.tolist()):
+                if in_life_branch:
+                    for g in s.genera:
+                        store['genera'][g].append(leaf)
+                    for b in s.binomials:
+                        store['binomials'][b].append(leaf)
+                        genus = b.split(' ')[0]
+                        if genus not in s.genera:
+                            store['genera'][b.split(' ')[0]].append(leaf)
+
+    def write_raw_index(self):
         for k in ('genera', 'binomials'):
             with open(self.raw_files[k], 'w') as filehandle:
                 csvwriter = csv.writer(filehandle)
-                for t, vals in store[k].items():
+                for t, vals in self.raw_store[k].items():
                    row = [t,]
                    row.extend(vals)
                    csvwriter.writerow(row)
@@ -98,7 +111,7 @@ class Binomials(object):
         genera2 = []
         for genus, vals in genera:
             parent = drilldown(vals)
-            if parent is not living_world_node:
+            if parent is not living_world_node.resolve():
                 genera2.append((genus, parent))
 
         with open(self.clean_files['genera'], 'w') as filehandle:
@@ -152,7 +165,7 @@ def drilldown(vals):
     thesclasses = [tdb.get_thesclass(v) for v in vals]
     thesclasses = [t for t in thesclasses if t.wordclass == 'NN' or
                    t.wordclass == 'noun']
-    branch = living_world_node
+    branch = living_world_node.resolve()
     for lev in (4, 5, 6, 7, 8, 9):
         level_ancestors = [t.ancestor(level=lev) for t in thesclasses]
         level_ancestors = [a for a in level_ancestors if a is not None and
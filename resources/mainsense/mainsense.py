@@ -5,7 +5,7 @@ MainSense -- Utility to return the main sense of a given entry or lemma.
 import os
 import csv
 
-import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
 
 wordclasses = ('NN', 'JJ')
 
@@ -36,8 +36,8 @@ class MainSense(object):
         #  explicitly
         naive_main_sense = None
         if wordclass is None:
-            naive_main_sense = tdb.highest_ranked(lemma=lemma,
-                                                  refentry=entry_id)
+            naive_main_sense = qtdb.highest_ranked(lemma=lemma,
+                                                   refentry=entry_id)
             if naive_main_sense is not None:
                 wordclass = naive_main_sense.wordclass
             else:
@@ -53,10 +53,10 @@ class MainSense(object):
             except KeyError:
                 pass
             else:
-                instance = tdb.highest_ranked(lemma=lemma,
-                                              wordclass=wordclass,
-                                              refentry=refentry,
-                                              refid=refid)
+                instance = qtdb.highest_ranked(lemma=lemma,
+                                               wordclass=wordclass,
+                                               refentry=refentry,
+                                               refid=refid)
                 # Store this instance in the cache
                 MainSense.cache[wordclass][lemma] = instance
 
@@ -73,9 +73,9 @@ class MainSense(object):
                 # Don't bother recalculating if already calculated above
                 instance = naive_main_sense
             elif instance is None:
-                instance = tdb.highest_ranked(lemma=lemma,
-                                              wordclass=wordclass,
-                                              refentry=entry_id)
+                instance = qtdb.highest_ranked(lemma=lemma,
+                                               wordclass=wordclass,
+                                               refentry=entry_id)
 
         return instance
 
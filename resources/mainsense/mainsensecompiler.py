@@ -17,6 +17,7 @@ from collections import defaultdict, Counter
 import lex.oed.thesaurus.thesaurusdb as tdb
 #from utils.tracer import trace_class, trace_instance
 from pickler.sensemanager import PickleLoader
+from utils.metrics import METRICS
 import classifierconfig
 
 DIRECTORY = os.path.join(classifierconfig.RESOURCES_DIR, 'main_senses')
@@ -28,34 +29,57 @@ def make_raw_index(in_dir):
     For every word forming the second element of a compound, map all
     the places in the thesaurus where its compounds occur.
     """
-    store = {wordclass: defaultdict(list) for wordclass in WORDCLASSES}
+    index = RawMainSenseIndex()
     for letter in string.ascii_uppercase:
-        print('\tCompiling main sense data in %s...' % letter)
+        shard = METRICS.start_shard(
+            letter, 'Compiling main sense data in %s...' % letter)
         loader = PickleLoader(in_dir, letters=letter)
         for s in loader.iterate():
-            if (s.wordclass in WORDCLASSES and
-                    s.first_word() and
-                    s.last_word()):
-                if len(s.last_word()) < 3:
-                    pass
-                elif s.wordclass == 'JJ' and s.last_word().endswith('ed'):
-                    pass
-                else:
-                    target_list = store[s.wordclass][s.last_word()]
-                    score = '%0.2f' % (1 / len(s.thesaurus_nodes),)
-                    for leaf in s.thesaurus_nodes:
-                        target_list.append((leaf, score))
+            shard.records_in += 1
+            index.index_sense(s)
+        shard.finish()
+    index.write_raw_index()
 
-    for wordclass in WORDCLASSES:
-        filepath = os.path.join(DIRECTORY, wordclass + '_raw.csv')
-        with open(filepath, 'w') as filehandle:
-            csvwriter = csv.writer(filehandle)
-            for lemma in sorted(list(store[wordclass].keys())):
-                vals = store[wordclass][lemma]
-                row = [lemma,]
-                for id, score in vals:
-                    row.extend((id, score))
-                csvwriter.writerow(row)
+
+class RawMainSenseIndex(object):
+
+    """
+    Accumulates the raw main-sense index, one sense at a time (so that it
+    can be compiled alongside other indexes in a single pass over the
+    classified senses - see processes/indexclassified.py)
+    """
+
+    def __init__(self):
+        self.start_raw_index()
+
+    def start_raw_index(self):
+        self.store = {wordclass: defaultdict(list) for wordclass in WORDCLASSES}
+
+    def index_sense(self, s):
+        if (s.wordclass in WORDCLASSES and
+                s.first_word() and
+                s.last_word()):
+            if len(s.last_word()) < 3:
+                pass
+            elif s.wordclass == 'JJ' and s.last_word().endswith('ed'):
+                pass
+            else:
+                target_list = self.store[s.wordclass][s.last_word()]
+                score = '%0.2f' % (1 / len(s.thesaurus_nodes),)
+                for leaf in s.thesaurus_nodes:
+                    target_list.append((leaf, score))
+
+    def write_raw_index(self):
+        for wordclass in WORDCLASSES:
+            filepath = os.path.join(DIRECTORY, wordclass + '_raw.csv')
+            with open(filepath, 'w') as filehandle:
+                csvwriter = csv.writer(filehandle)
+                for lemma in sorted(list(self.store[wordclass].keys())):
+                    vals = self.store[wordclass][lemma]
+                    row = [lemma,]
+                    for id, score in vals:
+                        row.extend((id, score))
+                    csvwriter.writerow(row)
 
 
 def refine_index():
@@ -1,8 +1,16 @@
-from lxml import etree
+import os
+import pickle
+
+from utils.manifest import file_digest
 
 # Only bother with labels with a frequency above this value
 min_frequency = 50
 
+# The parsed ontology is cached in a pickle alongside the XML file (with
+#  this suffix), so that it doesn't have to be re-parsed in every process
+CACHE_SUFFIX = '.cache.pickle'
+CACHE_VERSION = 1
+
 
 class SubjectLabelParser(object):
     """
@@ -23,9 +31,70 @@ class SubjectLabelParser(object):
 
     def __init__(self, file=None):
         if not SubjectLabelParser.nodes:
-            self._load_nodes(file)
+            if not self._load_cache(file):
+                self._load_nodes(file)
+                self._save_cache(file)
+
+    def _load_cache(self, file):
+        """
+        Load the nodes and node map from the cache file, if it's still
+        valid for the XML file. Returns True if successful.
+
+        The cache is valid if the XML file's modification time and size
+        are unchanged; or, failing that, if its SHA-1 digest is unchanged
+        (e.g. if the file has just been touched or copied). In the latter
+        case the new modification time and size are written back to the
+        cache, so that the XML isn't re-hashed on every later run.
+        """
+        cache_file = file + CACHE_SUFFIX
+        if not os.path.isfile(cache_file):
+            return False
+        try:
+            with open(cache_file, 'rb') as filehandle:
+                cached = pickle.load(filehandle)
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            return False
+        if cached.get('version') != CACHE_VERSION:
+            return False
+
+        stat = os.stat(file)
+        if (cached['mtime'], cached['size']) != (stat.st_mtime, stat.st_size):
+            if cached['sha1'] != file_digest(file):
+                return False
+            cached['mtime'] = stat.st_mtime
+            cached['size'] = stat.st_size
+            self._write_cache(file, cached)
+        SubjectLabelParser.nodes.update(cached['nodes'])
+        SubjectLabelParser.node_map.update(cached['node_map'])
+        return True
+
+    def _save_cache(self, file):
+        stat = os.stat(file)
+        cached = {
+            'version': CACHE_VERSION,
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'sha1': file_digest(file),
+            'nodes': SubjectLabelParser.nodes,
+            'node_map': SubjectLabelParser.node_map,
+        }
+        self._write_cache(file, cached)
+
+    def _write_cache(self, file, cached):
+        # Write to a temporary file and then rename, so that another
+        #  process never sees a partly-written cache
+        cache_file = file + CACHE_SUFFIX
+        temp_file = '%s.%d' % (cache_file, os.getpid())
+        try:
+            with open(temp_file, 'wb') as filehandle:
+                pickle.dump(cached, filehandle, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, cache_file)
+        except OSError:
+            # Not fatal: the XML will just be parsed again next time
+            print('\tUnable to write subject-ontology cache %s' % cache_file)
 
     def _load_nodes(self, file):
+        from lxml import etree
         parser = etree.XMLParser(remove_blank_text=True)
         tree = etree.parse(file, parser)
         for c in tree.findall('.//class'):
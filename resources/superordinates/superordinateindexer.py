@@ -9,6 +9,7 @@ from collections import defaultdict, Counter
 
 import lex.oed.thesaurus.thesaurusdb as tdb
 from pickler.sensemanager import PickleLoader
+from utils.metrics import METRICS
 
 
 # High-frequency superordinates - we'll not bother even attempting these
@@ -28,20 +29,29 @@ class SuperordinateIndexer(object):
             self.__dict__[k] = v
 
     def compile_index(self):
-        self.data = defaultdict(lambda: defaultdict(list))
+        self.start_raw_index()
         letters = string.ascii_uppercase
         for letter in letters:
-            print('\tIndexing superordinates in %s...' % letter)
+            shard = METRICS.start_shard(
+                letter, 'Indexing superordinates in %s...' % letter)
             loader = PickleLoader(self.input_dir, letters=letter)
             for sense in loader.iterate():
-                if (sense.wordclass in ('NN', 'VB') and
-                        sense.superordinate is not None):
-                    self._process_superordinate(sense.superordinate,
-                                                sense.thesaurus_nodes)
-                    if sense.superordinate != sense.superordinate_full:
-                        self._process_superordinate(sense.superordinate_full,
-                                                    sense.thesaurus_nodes)
-        self._write_raw_index()
+                shard.records_in += 1
+                self.index_sense(sense)
+            shard.finish()
+        self.write_raw_index()
+
+    def start_raw_index(self):
+        self.data = defaultdict(lambda: defaultdict(list))
+
+    def index_sense(self, sense):
+        if (sense.wordclass in ('NN', 'VB') and
+                sense.superordinate is not None):
+            self._process_superordinate(sense.superordinate,
+                                        sense.thesaurus_nodes)
+            if sense.superordinate != sense.superordinate_full:
+                self._process_superordinate(sense.superordinate_full,
+                                            sense.thesaurus_nodes)
 
     def _process_superordinate(self, superordinate, nodes):
         superordinate = superordinate.replace('-', '').replace(' ', '')
@@ -51,7 +61,7 @@ class SuperordinateIndexer(object):
             for leaf in nodes:
                 self.data[initial][superordinate].append((leaf, score))
 
-    def _write_raw_index(self):
+    def write_raw_index(self):
         for initial in sorted(self.data.keys()):
             out_file = os.path.join(self.output_dir, initial + '_raw.csv')
             with open(out_file, 'w') as filehandle:
@@ -64,7 +74,8 @@ class SuperordinateIndexer(object):
 
     def refine_index(self):
         for letter in string.ascii_lowercase:
-            print('\tRefining superordinate index %s...' % letter)
+            shard = METRICS.start_shard(
+                letter, 'Refining superordinate index %s...' % letter)
             in_file = os.path.join(self.output_dir, letter + '_raw.csv')
             out_file = os.path.join(self.output_dir, letter + '.csv')
 
@@ -72,6 +83,7 @@ class SuperordinateIndexer(object):
             with open(in_file, 'r') as filehandle:
                 csvreader = csv.reader(filehandle)
                 for row in csvreader:
+                    shard.records_in += 1
                     phrase = row[0]
                     if phrase in SKIPPABLE:
                         pass
@@ -106,6 +118,7 @@ class SuperordinateIndexer(object):
                     row_encoded = [row.pop(0), ]
                     row_encoded.extend(row)
                     csvwriter.writerow(row_encoded)
+            shard.finish(records_out=len(superordinates2))
 
     def list_most_frequent_superordinates(self):
         """
@@ -5,9 +5,11 @@ Superordinates
 import re
 
 import lex.oed.thesaurus.thesaurusdb as tdb
+import thesaurus.querycache as qtdb
 from lex.oed.thesaurus.dbbackend.subjectmapper import SubjectMapper
 from resources.mainsense.mainsense import MainSense
 from utils.tracer import trace_sense, trace_instance, trace_class
+from utils.lazy import LazyObject
 
 # Generic superordinates - can't do anything with these.
 GENERICS = {'person', 'thing', 'man', 'woman', 'action', 'act', 'quality',
@@ -17,7 +19,8 @@ FOLLOWING_WORDS = {'NULL', 'or', 'as', 'who', 'which', 'where', 'that',
                    'given', 'made', 'held', 'worn', 'for', 'at', 'in',
                    'with', 'without'}
 MAIN_SENSE_FINDER = MainSense()
-SUBJECT_MAPPER = SubjectMapper()
+SUBJECT_MAPPER = LazyObject(SubjectMapper,
+                            name='superordinates.SUBJECT_MAPPER')
 
 
 class Superordinates(object):
@@ -54,16 +57,16 @@ class Superordinates(object):
 
         # If the superordinate is (more or less) single-sense, we assume that
         #  sense to be the correct one
-        candidates = tdb.ranked_search(
+        candidates = qtdb.ranked_search(
             lemma=sense.superordinate,
             wordclass='NN',
             current_only=True)
-        if candidates and tdb.distinct_senses(candidates) <= 2:
+        if candidates and qtdb.distinct_senses(candidates) <= 2:
             target_sense = candidates[0]
 
         # Otherwise, narrow by Bayes classification
         if target_sense is None and sense.bayes.confidence() >= 8:
-            target_sense = tdb.highest_ranked(
+            target_sense = qtdb.highest_ranked(
                 lemma=sense.superordinate,
                 wordclass='NN',
                 branches=sense.bayes_based_classifications,
@@ -71,7 +74,7 @@ class Superordinates(object):
 
         # Otherwise, narrow by branches based on subject labels
         if target_sense is None and sense.label_based_classifications:
-            target_sense = tdb.highest_ranked(
+            target_sense = qtdb.highest_ranked(
                 lemma=sense.superordinate,
                 wordclass='NN',
                 branches=sense.label_based_classifications,
@@ -79,7 +82,7 @@ class Superordinates(object):
 
         # Otherwise, narrow by branches based on cross-references
         if target_sense is None and sense.xref_branches:
-            target_sense = tdb.highest_ranked(
+            target_sense = qtdb.highest_ranked(
                 lemma=sense.superordinate,
                 wordclass='NN',
                 branches=sense.xref_branches,
@@ -100,7 +103,7 @@ class Superordinates(object):
 
         # Otherwise, narrow by Bayes classification
         if target_sense is None and sense.bayes.is_usable():
-            target_sense = tdb.highest_ranked(
+            target_sense = qtdb.highest_ranked(
                 lemma=sense.superordinate,
                 wordclass='NN',
                 branches=sense.bayes_based_classifications,
@@ -109,7 +112,7 @@ class Superordinates(object):
         if target_sense is not None and target_sense.thesclass is not None:
             match = target_sense.thesclass
             if sense.wordclass == 'JJ':
-                match = tdb.equivalent_class(match, 'JJ')
+                match = qtdb.equivalent_class(match, 'JJ')
             return match
         else:
             return None
@@ -173,9 +176,9 @@ class Superordinates(object):
                 # (Fairly unlikely, since most of these should already
                 #   have been picked off by the compound classifiers.)
                 if sense.last_element() is not None:
-                    subclass = tdb.highest_ranked(lemma=sense.last_element(),
-                                                  wordclass=sense.wordclass,
-                                                  branches=[winning_branch.id,])
+                    subclass = qtdb.highest_ranked(lemma=sense.last_element(),
+                                                   wordclass=sense.wordclass,
+                                                   branches=[winning_branch.id,])
                     if (subclass is not None and
                         subclass.thesclass is not None):
                         winning_branch = subclass.thesclass
@@ -195,5 +198,5 @@ class Superordinates(object):
                                                             wordclass='JJ')
                 if (target_sense is not None and
                     target_sense.thesclass is not None):
-                    return tdb.equivalent_class(target_sense.thesclass, 'NN')
+                    return qtdb.equivalent_class(target_sense.thesclass, 'NN')
         return None
@@ -0,0 +1,136 @@
+"""
+EquivalenceTable -- Precomputed results of tdb.equivalent_class() (the
+branch parallel to a thesaurus class in another wordclass) for every
+class in the taxonomy and every wordclass, so that the classifier's
+wordclass transpositions can be answered from memory.
+
+The table is built by build_equivalence_table() and saved to
+classifierconfig.EQUIVALENCE_TABLE_FILE (a NumPy .npz file):
+
+ - table: int32 array of shape (max class ID + 1, number of wordclasses);
+   table[id, n] is the ID of the equivalent class in wordclass n, or
+   NONE if there isn't one;
+ - covered: bool array marking the class IDs that were in the taxonomy
+   when the table was built;
+ - wordclasses: the wordclasses, in column order;
+ - taxonomy: the digest of the taxonomy it was built from (see
+   taxonomysnapshot.taxonomy_digest()).
+
+equivalent_class() is a drop-in replacement for tdb.equivalent_class()
+which uses the table if it's been built, and falls back to the database
+for anything the table doesn't cover (classes added since, other
+wordclasses). Since the answers depend on the taxonomy as it stood at
+build time, the table is ignored if its digest doesn't match that of the
+taxonomy snapshot for the current process; rebuild it after anything
+that changes the structure of the taxonomy.
+"""
+
+import os
+import time
+
+import numpy
+
+import lex.oed.thesaurus.thesaurusdb as tdb
+import classifierconfig
+from thesaurus.taxonomysnapshot import (get_snapshot, taxonomy_rows,
+                                       taxonomy_digest)
+
+NONE = -1
+_table = None
+_loaded = False
+
+
+def get_table():
+    """
+    Return the equivalence table for this process, or None if it hasn't
+    been built or was built from a different state of the taxonomy
+    """
+    global _table, _loaded
+    if not _loaded:
+        _loaded = True
+        filename = classifierconfig.EQUIVALENCE_TABLE_FILE
+        if os.path.isfile(filename):
+            table = EquivalenceTable(filename)
+            if table.taxonomy_digest == get_snapshot().digest:
+                _table = table
+            else:
+                print('\tIgnoring %s: built from a different taxonomy'
+                      % filename)
+    return _table
+
+
+def equivalent_class(thesclass, wordclass):
+    table = get_table()
+    if table is not None and thesclass is not None:
+        try:
+            id = table.lookup(getattr(thesclass, 'id', thesclass), wordclass)
+        except KeyError:
+            pass
+        else:
+            return tdb.get_thesclass(id) if id is not None else None
+    return tdb.equivalent_class(thesclass, wordclass)
+
+
+def build_equivalence_table(filename):
+    """
+    Compute tdb.equivalent_class() for every class and wordclass in the
+    taxonomy, and save the results (replacing any existing file
+    atomically)
+    """
+    global _table, _loaded
+    start = time.time()
+    classes = list(tdb.taxonomy())
+    digest = taxonomy_digest(taxonomy_rows(classes))
+    wordclasses = sorted(set([c.wordclass for c in classes
+                              if c.wordclass is not None]))
+    size = max([c.id for c in classes]) + 1
+    table = numpy.full((size, len(wordclasses)), NONE, dtype=numpy.int32)
+    covered = numpy.zeros(size, dtype=bool)
+    for i, thesclass in enumerate(classes):
+        covered[thesclass.id] = True
+        for n, wordclass in enumerate(wordclasses):
+            equivalent = tdb.equivalent_class(thesclass, wordclass)
+            if equivalent is not None:
+                table[thesclass.id, n] = equivalent.id
+        if i and not i % 10000:
+            print('\t\t%d/%d classes' % (i, len(classes)))
+
+    temp_file = '%s.%d.tmp.npz' % (filename, os.getpid())
+    numpy.savez(temp_file, table=table, covered=covered,
+                wordclasses=numpy.array(wordclasses),
+                taxonomy=numpy.array(digest))
+    os.replace(temp_file, filename)
+    print('\tBuilt equivalence table: %d classes x %d wordclasses in %0.1fs'
+          % (len(classes), len(wordclasses), time.time() - start))
+    # Make sure this process picks up the new table
+    _table = None
+    _loaded = False
+
+
+class EquivalenceTable(object):
+
+    def __init__(self, filename):
+        with numpy.load(filename) as data:
+            self.table = data['table']
+            self.covered = data['covered']
+            self.wordclasses = {str(wordclass): n for n, wordclass in
+                                enumerate(data['wordclasses'])}
+            if 'taxonomy' in data.files:
+                self.taxonomy_digest = str(data['taxonomy'])
+            else:
+                self.taxonomy_digest = None
+
+    def lookup(self, id, wordclass):
+        """
+        Return the ID of the class equivalent to class id in the
+        wordclass (or None if there isn't one). Raises KeyError if the
+        table doesn't cover the class or the wordclass.
+        """
+        n = self.wordclasses[wordclass]
+        if id is None or not 0 <= id < len(self.covered) or \
+                not self.covered[id]:
+            raise KeyError(id)
+        equivalent = int(self.table[id, n])
+        if equivalent == NONE:
+            return None
+        return equivalent
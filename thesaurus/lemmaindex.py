@@ -0,0 +1,292 @@
+"""
+LemmaIndex -- Prebuilt index from lemma to the sense instances with that
+lemma, so that ranked searches by lemma (the bulk of the classifier's
+database queries) can be answered locally.
+
+The index is built from the SQLite copy of the thesaurus database (see
+thesaurus/sqliteexport.py) by build_lemma_index(). Each build goes in a
+new version subdirectory of the index directory, and the file CURRENT
+names the version in use; it's replaced atomically once the new version
+is complete, so a process opening the index always gets a whole one.
+A version holds a set of flat files:
+ - rows.npy: one record per instance (see ROW_DTYPE), grouped by lemma
+   key (see lemma_key()) and in rank order within each lemma (rating,
+   then node size, descending);
+ - keys.bin, keys_offsets.npy: the lemma keys in sorted order, as UTF-8,
+   and the offset of each in keys.bin;
+ - key_rows.npy: the first row of each lemma in rows.npy;
+ - lemmas.bin, lemmas_offsets.npy: the lemma of each row (as it appears
+   in the database);
+ - meta.json: the wordclasses coded in rows.npy, and the revision of
+   the SQLite file the index was built from.
+
+All of these are memory-mapped rather than read in, so processes
+running at the same time share a single copy (via the OS page cache),
+and opening the index is instant.
+"""
+
+import os
+import json
+import mmap
+import time
+import shutil
+import sqlite3
+import tempfile
+import bisect
+
+import numpy
+
+from thesaurus.treeintervals import get_intervals
+
+ROW_DTYPE = numpy.dtype([
+    ('id', numpy.int64),
+    ('refentry', numpy.int32),
+    ('refid', numpy.int32),
+    ('class_id', numpy.int32),
+    ('wordclass', numpy.int8),
+    ('current', numpy.bool_),
+    ('rating', numpy.float64),
+    ('node_size', numpy.int32),
+    ('branch_size', numpy.int32),
+    ('superclass_id', numpy.int32),
+    ('is_derivative', numpy.bool_),
+    ('is_affix', numpy.bool_),
+    ('entry_size', numpy.int32),
+])
+NONE = -1
+# File (in the index directory) naming the version in use
+CURRENT = 'CURRENT'
+# Keyword arguments handled by LemmaIndex.search()
+ARGUMENTS = frozenset(('lemma', 'wordclass', 'current_only', 'currentOnly',
+                       'thes_linked', 'branch_ids', 'refentry', 'refid'))
+
+
+def build_lemma_index(db_file, index_dir):
+    """
+    Build the index from the instance table of a SQLite thesaurus file.
+    The new index replaces any existing one as a whole.
+    """
+    from thesaurus.sqliteexport import read_revision
+    connection = sqlite3.connect('file:%s?mode=ro' % db_file, uri=True)
+    try:
+        source_revision = read_revision(connection)
+        records = connection.execute(
+            'SELECT id, lemma, wordclass, refentry, refid, thesclass_id, '
+            'current, rating, node_size, branch_size, superclass_id, '
+            'is_derivative, is_affix, entry_size, lemma_key '
+            'FROM instance').fetchall()
+    finally:
+        connection.close()
+    records.sort(key=lambda r: (r[14],
+                                [-v for v in rank_key(r[7], r[8])], r[0]))
+    wordclasses = sorted(set([r[2] for r in records if r[2] is not None]))
+    wordclass_codes = {wc: i for i, wc in enumerate(wordclasses)}
+
+    rows = numpy.zeros(len(records), dtype=ROW_DTYPE)
+    keys = []
+    key_rows = []
+    lemmas = []
+    for n, r in enumerate(records):
+        (id, lemma, wordclass, refentry, refid, class_id, current, rating,
+         node_size, branch_size, superclass_id, is_derivative,
+         is_affix, entry_size, key) = r
+        rows[n] = (id, refentry or 0, refid or 0, _int(class_id),
+                   wordclass_codes.get(wordclass, NONE), bool(current),
+                   rating or 0, node_size or 0, branch_size or 0,
+                   _int(superclass_id), bool(is_derivative), bool(is_affix),
+                   _int(entry_size))
+        if not keys or keys[-1] != key:
+            keys.append(key)
+            key_rows.append(n)
+        lemmas.append(lemma)
+    key_rows.append(len(records))
+
+    previous = current_version(index_dir)
+    os.makedirs(index_dir, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix=time.strftime('%Y%m%d%H%M%S-'),
+                                   dir=index_dir)
+    version = os.path.basename(version_dir)
+    numpy.save(os.path.join(version_dir, 'rows.npy'), rows)
+    numpy.save(os.path.join(version_dir, 'key_rows.npy'),
+               numpy.array(key_rows, dtype=numpy.int64))
+    _write_strings(os.path.join(version_dir, 'keys'), keys)
+    _write_strings(os.path.join(version_dir, 'lemmas'), lemmas)
+    with open(os.path.join(version_dir, 'meta.json'), 'w') as filehandle:
+        json.dump({'wordclasses': wordclasses,
+                   'source_revision': source_revision}, filehandle)
+
+    # Point to the new version. The previous version is kept, for any
+    #  process which read CURRENT just before it changed; anything older
+    #  is removed (unless it's still in use, on systems which don't allow
+    #  that - it'll go next time).
+    temp_file = '%s.%d.tmp' % (os.path.join(index_dir, CURRENT),
+                               os.getpid())
+    with open(temp_file, 'w') as filehandle:
+        filehandle.write(version)
+    os.replace(temp_file, os.path.join(index_dir, CURRENT))
+    for name in os.listdir(index_dir):
+        if name in (CURRENT, version, previous):
+            continue
+        path = os.path.join(index_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    print('\tIndexed %d instances under %d lemmas' % (len(records),
+                                                      len(keys)))
+
+
+def current_version(index_dir):
+    """
+    Return the name of the version of the index in use (or None if the
+    index hasn't been built)
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT)) as filehandle:
+            return filehandle.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def lemma_key(lemma):
+    """
+    Case-folded form of a lemma, used to look it up. The SQLite file
+    stores the same key (in instance.lemma_key - see sqliteexport.py),
+    so searches are case-insensitive in exactly the same way whether or
+    not they're answered from the index.
+    """
+    return lemma.lower()
+
+
+def rank_key(rating, node_size):
+    """
+    Key for ranking instances, highest first (a missing rating or node
+    size counts as 0). Used both here and by sqlitebackend.ranked_search(),
+    so that the two rank instances in the same order.
+    """
+    return (rating or 0, node_size or 0)
+
+
+def _int(value):
+    return value if value is not None else NONE
+
+
+def _write_strings(stem, strings):
+    encoded = [s.encode('utf8') for s in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(e) for e in encoded])
+    numpy.save(stem + '_offsets.npy', offsets)
+    with open(stem + '.bin', 'wb') as filehandle:
+        filehandle.write(b''.join(encoded))
+
+
+class _Strings(object):
+
+    """
+    Sequence of strings held in a memory-mapped UTF-8 file (so it can
+    be searched with bisect without being read in)
+    """
+
+    def __init__(self, stem):
+        self.offsets = numpy.load(stem + '_offsets.npy', mmap_mode='r')
+        if self.offsets[-1]:
+            with open(stem + '.bin', 'rb') as filehandle:
+                self.data = mmap.mmap(filehandle.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, n):
+        return self.data[self.offsets[n]:self.offsets[n + 1]].decode('utf8')
+
+
+class LemmaIndex(object):
+
+    def __init__(self, index_dir):
+        version = current_version(index_dir)
+        if version is None:
+            raise IOError('No lemma index in %s' % index_dir)
+        index_dir = os.path.join(index_dir, version)
+        self.rows = numpy.load(os.path.join(index_dir, 'rows.npy'),
+                               mmap_mode='r')
+        self.key_rows = numpy.load(os.path.join(index_dir, 'key_rows.npy'),
+                                   mmap_mode='r')
+        self.keys = _Strings(os.path.join(index_dir, 'keys'))
+        self.lemmas = _Strings(os.path.join(index_dir, 'lemmas'))
+        with open(os.path.join(index_dir, 'meta.json')) as filehandle:
+            meta = json.load(filehandle)
+        self.wordclasses = meta['wordclasses']
+        # Revision of the SQLite file the index was built from
+        self.source_revision = meta.get('source_revision')
+        self.wordclass_codes = {wc: i for i, wc in
+                                enumerate(self.wordclasses)}
+
+    def lookup(self, lemma):
+        """
+        Return the range of rows (start, end) for a lemma
+        """
+        key = lemma_key(lemma)
+        n = bisect.bisect_left(self.keys, key)
+        if n < len(self.keys) and self.keys[n] == key:
+            return int(self.key_rows[n]), int(self.key_rows[n + 1])
+        return 0, 0
+
+    def search(self, lemma, wordclass=None, current_only=False,
+               currentOnly=False, thes_linked=False, branch_ids=None,
+               refentry=None, refid=None):
+        """
+        Return the instances with the lemma that pass the filters, in
+        rank order, as tuples of (id, lemma, wordclass, refentry, refid,
+        thesclass_id, current, rating, node_size, branch_size,
+        superclass_id, is_derivative, is_affix, entry_size, lemma_key) -
+        i.e. the columns of the instance table.
+
+        branch_ids, if not None, restricts the results to instances
+        classified in any of the branches.
+        """
+        start, end = self.lookup(lemma)
+        rows = self.rows[start:end]
+        mask = numpy.ones(len(rows), dtype=bool)
+        if wordclass is not None:
+            mask &= rows['wordclass'] == self.wordclass_codes.get(wordclass,
+                                                                  -2)
+        if current_only or currentOnly:
+            mask &= rows['current']
+        if thes_linked:
+            mask &= rows['class_id'] != NONE
+        if refentry is not None:
+            mask &= rows['refentry'] == refentry
+        if refid is not None:
+            mask &= rows['refid'] == refid
+        if branch_ids is not None:
+            mask &= get_intervals().descends_from_any(rows['class_id'],
+                                                      branch_ids)
+        return [self._record(start + n, rows[n])
+                for n in numpy.nonzero(mask)[0].tolist()]
+
+    def _record(self, n, row):
+        return (
+            int(row['id']),
+            self.lemmas[n],
+            self.wordclasses[row['wordclass']] if row['wordclass'] != NONE
+            else None,
+            int(row['refentry']),
+            int(row['refid']),
+            int(row['class_id']) if row['class_id'] != NONE else None,
+            bool(row['current']),
+            float(row['rating']),
+            int(row['node_size']),
+            int(row['branch_size']),
+            int(row['superclass_id']) if row['superclass_id'] != NONE
+            else None,
+            bool(row['is_derivative']),
+            bool(row['is_affix']),
+            int(row['entry_size']) if row['entry_size'] != NONE else None,
+            lemma_key(self.lemmas[n]),
+        )
@@ -0,0 +1,149 @@
+"""
+ThesaurusQueryCache -- Memoising facade over the thesaurusdb query
+functions that the classifier calls over and over with the same
+arguments (e.g. looking up the same superordinate or synonym lemma for
+each sense in a letter).
+
+Import the module in place of thesaurusdb for these functions:
+
+    import thesaurus.querycache as qtdb
+    qtdb.ranked_search(lemma=lemma, wordclass='NN')
+
+Results are cached per function in a bounded LRU cache, keyed on the
+arguments (keyword arguments in sorted order; thesaurus objects reduced
+to their IDs). Cached results are returned as they are, and shared by
+every caller: don't modify them (the classifier annotates copies - see
+classifier._annotate()).
+
+equivalent_class() is answered from the precomputed equivalence table
+(see thesaurus/equivalencetable.py), if it's been built.
+
+Anything that changes the database (e.g. tdb.add_links()) must be
+followed by invalidate().
+"""
+
+import time
+
+import lex.oed.thesaurus.thesaurusdb as tdb
+from utils.lrucache import LRUCache
+from thesaurus import equivalencetable
+import classifierconfig
+
+CACHED_FUNCTIONS = ('ranked_search', 'highest_ranked', 'search',
+                    'distinct_senses', 'cross_reference_target',
+                    'equivalent_class')
+
+
+class ThesaurusQueryCache(object):
+
+    def __init__(self, maxsize=classifierconfig.THESAURUS_QUERY_CACHE_SIZE):
+        self.caches = {name: LRUCache(maxsize=maxsize, name='tdb.' + name)
+                       for name in CACHED_FUNCTIONS}
+        # Total time (in seconds) spent in the underlying query
+        #  functions, i.e. on cache misses
+        self.latency = {name: 0.0 for name in CACHED_FUNCTIONS}
+        self.invalidations = 0
+
+    def ranked_search(self, **kwargs):
+        return self._query('ranked_search', (), kwargs)
+
+    def highest_ranked(self, **kwargs):
+        return self._query('highest_ranked', (), kwargs)
+
+    def search(self, **kwargs):
+        return self._query('search', (), kwargs)
+
+    def distinct_senses(self, instances):
+        return self._query('distinct_senses', (instances,), {})
+
+    def cross_reference_target(self, **kwargs):
+        return self._query('cross_reference_target', (), kwargs)
+
+    def equivalent_class(self, thesclass, wordclass):
+        return self._query('equivalent_class', (thesclass, wordclass), {})
+
+    def _query(self, name, args, kwargs):
+        function = _function(name)
+        try:
+            key = (_normalise(args), _normalise(sorted(kwargs.items())))
+        except TypeError:
+            # Arguments that can't be turned into a key; don't cache
+            return function(*args, **kwargs)
+
+        cache = self.caches[name]
+        try:
+            value = cache.get(key)
+        except KeyError:
+            start = time.time()
+            value = function(*args, **kwargs)
+            self.latency[name] += time.time() - start
+            cache.set(key, value)
+        return value
+
+    def invalidate(self):
+        """
+        Discard all cached results (to be called whenever the database
+        has been changed)
+        """
+        for cache in self.caches.values():
+            cache.clear()
+        self.invalidations += 1
+
+    def resize(self, maxsize):
+        for cache in self.caches.values():
+            cache.maxsize = maxsize
+
+    def report(self):
+        """
+        Return a list of lines reporting hits, misses and query time for
+        each function that has been called
+        """
+        lines = []
+        for name in CACHED_FUNCTIONS:
+            cache = self.caches[name]
+            if not cache.hits and not cache.misses:
+                continue
+            if cache.misses:
+                per_query = self.latency[name] / cache.misses
+            else:
+                per_query = 0
+            lines.append('%s; %0.2fms per query, ~%0.1fs saved' % (
+                cache.report(), per_query * 1000, per_query * cache.hits))
+        if self.invalidations:
+            lines.append('invalidated %d times' % self.invalidations)
+        return lines
+
+
+def _function(name):
+    if name == 'equivalent_class':
+        return equivalencetable.equivalent_class
+    return getattr(tdb, name)
+
+
+def _normalise(value):
+    """
+    Return a hashable key for an argument value. Thesaurus classes,
+    instances, etc., are reduced to their IDs.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple([_normalise(v) for v in value])
+    if isinstance(value, (set, frozenset)):
+        return frozenset([_normalise(v) for v in value])
+    id = getattr(value, 'id', None)
+    if id is not None:
+        return ('#', id)
+    raise TypeError('Unhashable query argument: %r' % (value,))
+
+
+QUERY_CACHE = ThesaurusQueryCache()
+
+# Drop-in replacements for the thesaurusdb functions
+ranked_search = QUERY_CACHE.ranked_search
+highest_ranked = QUERY_CACHE.highest_ranked
+search = QUERY_CACHE.search
+distinct_senses = QUERY_CACHE.distinct_senses
+cross_reference_target = QUERY_CACHE.cross_reference_target
+equivalent_class = QUERY_CACHE.equivalent_class
+invalidate = QUERY_CACHE.invalidate
@@ -0,0 +1,732 @@
+"""
+SQLite backend -- Drop-in replacement for the parts of the thesaurusdb
+API that this project uses to read the thesaurus, working from a file
+written by thesaurus.sqliteexport rather than the live database server.
+
+    import thesaurus.sqlitebackend as sqlitebackend
+    sqlitebackend.install(filename, lemma_index_dir)
+    # tdb.search() etc. now read the file
+    ...
+    sqlitebackend.uninstall()
+
+install() swaps the functions listed in FUNCTIONS into the thesaurusdb
+module, so every existing tdb.xxx() call picks them up; anything else
+(in particular anything that writes to the database) still goes to the
+live database. Each process opens its own read-only connection to the
+file. If a lemma index (see thesaurus/lemmaindex.py) is supplied, ranked
+searches by lemma are answered from that instead.
+
+Values which depend on the live database's internals (instance ratings,
+node sizes, superclasses, etc.) are as computed by the live database at
+export time. Instances are ranked by rating, then by node size.
+common_ancestor(), equivalent_class() and cross_reference_target() are
+worked out from the exported taxonomy and instances.
+"""
+
+import os
+import sqlite3
+import itertools
+
+import lex.oed.thesaurus.thesaurusdb as tdb
+from utils.lazy import LazyObject
+from thesaurus import lemmaindex
+
+FUNCTIONS = ('get_thesclass', 'taxonomy', 'search', 'search_current',
+             'ranked_search', 'highest_ranked', 'distinct_senses',
+             'cross_reference_target', 'common_ancestor',
+             'equivalent_class', 'child_wordclass_branch',
+             'get_superordinate_record')
+CLASS_FIELDS = ('id', 'parent_id', 'level', 'wordclass', 'label',
+                'branch_size', 'node_size', 'sortcode', '_breadcrumb',
+                '_breadcrumb_short', 'enter', 'exit')
+INSTANCE_FIELDS = ('id', 'lemma', 'wordclass', 'refentry', 'refid',
+                   'thesclass_id', 'current', '_rating', '_node_size',
+                   '_branch_size', 'superclass_id', '_is_derivative',
+                   '_is_affix', 'entry_size', 'lemma_key')
+
+# Keyword arguments accepted by search(), and (in addition) by
+#  ranked_search() and highest_ranked(); anything else raises TypeError
+#  rather than being quietly ignored
+SEARCH_ARGUMENTS = frozenset(('lemma', 'wordclass', 'refentry', 'refid',
+                              'current_only', 'currentOnly', 'thes_linked',
+                              'branches', 'subjects'))
+RANKED_SEARCH_ARGUMENTS = SEARCH_ARGUMENTS | frozenset((
+    'promote', 'include_homographs', 'exact_sense', 'omit_null'))
+# Number of (refentry, refid) pairs looked up in each query by
+#  resolve_instances() (two parameters each, within SQLite's default
+#  limit of 999)
+RESOLVE_BATCH_SIZE = 400
+# Number of lemmas or class IDs looked up in each query by prefetch()
+PREFETCH_BATCH_SIZE = 900
+# Keyword arguments for which search() can be answered from the
+#  instances loaded by prefetch()
+PREFETCHED_ARGUMENTS = frozenset(('lemma', 'wordclass', 'current_only',
+                                  'currentOnly', 'thes_linked'))
+
+_filename = None
+_lemma_index_dir = None
+_lemma_index = None
+_connection = None
+_connection_pid = None
+_class_rows = {}
+_lemma_rows = {}
+_originals = {}
+
+
+def _subject_mapper():
+    from lex.oed.thesaurus.dbbackend.subjectmapper import SubjectMapper
+    return SubjectMapper()
+
+SUBJECT_MAPPER = LazyObject(_subject_mapper,
+                            name='sqlitebackend.SUBJECT_MAPPER')
+
+
+#================================================
+# Installation
+#================================================
+
+def install(filename, lemma_index_dir=None):
+    """
+    Route thesaurusdb's read functions to the SQLite file (and the lemma
+    index, if given)
+    """
+    global _filename, _lemma_index_dir
+    if not os.path.isfile(filename):
+        raise IOError('Thesaurus database file not found: %s' % filename)
+    _check_schema(filename)
+    if _filename != filename or _lemma_index_dir != lemma_index_dir:
+        _close()
+        _filename = filename
+        _lemma_index_dir = lemma_index_dir
+    for name in FUNCTIONS:
+        if name not in _originals:
+            _originals[name] = getattr(tdb, name, None)
+        setattr(tdb, name, globals()[name])
+    _invalidate_query_cache()
+
+
+def uninstall():
+    """
+    Restore thesaurusdb's own functions
+    """
+    global _filename, _lemma_index_dir
+    for name, function in _originals.items():
+        if function is None:
+            delattr(tdb, name)
+        else:
+            setattr(tdb, name, function)
+    _originals.clear()
+    _close()
+    _filename = None
+    _lemma_index_dir = None
+    _invalidate_query_cache()
+
+
+def _check_schema(filename):
+    from thesaurus.sqliteexport import SCHEMA_VERSION
+    connection = sqlite3.connect('file:%s?mode=ro' % filename, uri=True)
+    try:
+        row = connection.execute('SELECT value FROM meta '
+                                 'WHERE key=\'schema_version\'').fetchone()
+    finally:
+        connection.close()
+    if row is None or row[0] != str(SCHEMA_VERSION):
+        raise IOError('Thesaurus database file %s is out of date (schema '
+                      'version %s, expected %d): re-export it' %
+                      (filename, row[0] if row else None, SCHEMA_VERSION))
+
+
+def is_installed():
+    return bool(_originals)
+
+
+def reopen():
+    """
+    Drop the connection and lemma index (to be called after the file has
+    been changed); they're reopened when next needed
+    """
+    _close()
+    _invalidate_query_cache()
+
+
+def _invalidate_query_cache():
+    # Results cached from one backend aren't valid for the other
+    import thesaurus.querycache as qtdb
+    qtdb.invalidate()
+
+
+def _close():
+    global _connection, _connection_pid, _lemma_index
+    if _connection is not None and _connection_pid == os.getpid():
+        _connection.close()
+    _connection = None
+    _connection_pid = None
+    _lemma_index = None
+    _class_rows.clear()
+    _lemma_rows.clear()
+
+
+def _db():
+    """
+    Return this process's read-only connection (a connection inherited
+    from a parent process is never reused)
+    """
+    global _connection, _connection_pid
+    if _connection is None or _connection_pid != os.getpid():
+        _connection = sqlite3.connect('file:%s?mode=ro' % _filename,
+                                      uri=True)
+        _connection_pid = os.getpid()
+        _class_rows.clear()
+        _lemma_rows.clear()
+    return _connection
+
+
+def _index():
+    """
+    Return the lemma index (or None if there isn't one). An index built
+    from an earlier revision of the file (e.g. before links were added
+    to it) is refused.
+    """
+    global _lemma_index
+    if _lemma_index is None and _lemma_index_dir is not None:
+        from thesaurus.sqliteexport import read_revision
+        index = lemmaindex.LemmaIndex(_lemma_index_dir)
+        revision = read_revision(_db())
+        if index.source_revision != revision:
+            raise IOError('Lemma index %s was built from a different '
+                          'revision of %s: rebuild it' %
+                          (_lemma_index_dir, _filename))
+        _lemma_index = index
+    return _lemma_index
+
+
+#================================================
+# Taxonomy
+#================================================
+
+def get_thesclass(id):
+    """
+    Return a new ThesClass object for the ID, or None
+    """
+    if id is None:
+        return None
+    id = int(id)
+    try:
+        row = _class_rows[id]
+    except KeyError:
+        row = _db().execute('SELECT * FROM thesclass WHERE id=?',
+                            (id,)).fetchone()
+        _class_rows[id] = row
+    if row is None:
+        return None
+    return ThesClass(row)
+
+
+def taxonomy(level=None):
+    """
+    Return all thesaurus classes (down to the given level, if specified)
+    """
+    if level is None:
+        rows = _db().execute('SELECT * FROM thesclass ORDER BY id')
+    else:
+        rows = _db().execute('SELECT * FROM thesclass WHERE level<=? '
+                             'ORDER BY id', (level,))
+    return [ThesClass(row) for row in rows]
+
+
+def child_wordclass_branch(parent, wordclass):
+    """
+    Return the wordclass-level child of a class (if any) with the given
+    wordclass
+    """
+    if parent is None:
+        return None
+    row = _db().execute(
+        'SELECT id FROM thesclass WHERE parent_id=? AND wordclass=? '
+        'ORDER BY branch_size DESC LIMIT 1',
+        (_id(parent), wordclass)).fetchone()
+    return get_thesclass(row[0]) if row is not None else None
+
+
+def equivalent_class(thesclass, wordclass):
+    """
+    Return the branch parallel to thesclass in another wordclass, i.e.
+    the wordclass-level branch for that wordclass under the same
+    non-wordclass parent
+    """
+    if thesclass is None:
+        return None
+    thesclass = get_thesclass(_id(thesclass))
+    if thesclass is None:
+        return None
+    if thesclass.wordclass == wordclass:
+        return thesclass
+    wordclass_parent = thesclass.wordclass_parent()
+    if wordclass_parent is not None:
+        parent = wordclass_parent.parent
+    else:
+        parent = thesclass
+    return child_wordclass_branch(parent, wordclass)
+
+
+class ThesClass(object):
+
+    """
+    Thesaurus class, as read from the SQLite file
+    """
+
+    def __init__(self, row):
+        for field, value in zip(CLASS_FIELDS, row):
+            self.__dict__[field] = value
+
+    @property
+    def parent(self):
+        return get_thesclass(self.parent_id)
+
+    def ancestors(self):
+        """
+        Return the class's ancestors, from the top down (not including
+        the class itself)
+        """
+        ancestors = []
+        parent = self.parent
+        while parent is not None:
+            ancestors.insert(0, parent)
+            parent = parent.parent
+        return ancestors
+
+    def ancestor(self, level=1):
+        if level == self.level:
+            return self
+        for a in self.ancestors():
+            if a.level == level:
+                return a
+        return None
+
+    def ancestor_ids(self):
+        return set([a.id for a in self.ancestors()] + [self.id, ])
+
+    def is_descendant_of(self, other):
+        other = get_thesclass(_id(other))
+        if other is None:
+            return False
+        # Strict, like tdb's is_descendant_of()
+        return other.enter < self.enter < other.exit
+
+    def is_same_branch(self, other):
+        return self.is_descendant_of(other) or other.is_descendant_of(self)
+
+    def common_ancestor(self, other):
+        other_ids = other.ancestor_ids()
+        for a in reversed(self.ancestors() + [self, ]):
+            if a.id in other_ids:
+                return a
+        return None
+
+    def wordclass_parent(self):
+        """
+        Return the topmost class in the run of wordclass-level classes
+        leading down to this class
+        """
+        if self.wordclass is None:
+            return None
+        wordclass_parent = self
+        parent = self.parent
+        while parent is not None and parent.wordclass is not None:
+            wordclass_parent = parent
+            parent = parent.parent
+        return wordclass_parent
+
+    def is_specific_enough(self, level=4, size=10000):
+        return self.level >= level or self.branch_size <= size
+
+    def breadcrumb(self):
+        return self._breadcrumb
+
+    def breadcrumb_short(self):
+        return self._breadcrumb_short or self._breadcrumb
+
+    def __eq__(self, other):
+        return self.id == getattr(other, 'id', None)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return '<ThesClass %d (level %d)>' % (self.id, self.level)
+
+
+#================================================
+# Instances
+#================================================
+
+def search(**kwargs):
+    """
+    Return the instances matching the keyword arguments (lemma,
+    wordclass, refentry, refid, current_only, thes_linked, branches,
+    subjects)
+    """
+    _check_arguments('search', kwargs, SEARCH_ARGUMENTS)
+    if (kwargs.get('lemma') is not None and _lemma_rows and
+            set(kwargs) <= PREFETCHED_ARGUMENTS):
+        try:
+            rows = _lemma_rows[lemmaindex.lemma_key(kwargs['lemma'])]
+        except KeyError:
+            pass
+        else:
+            return [Instance(row) for row in rows
+                    if _matches_prefetched(row, kwargs)]
+    conditions = []
+    values = []
+    if kwargs.get('lemma') is not None:
+        # Case-insensitive, in the same way as the lemma index
+        conditions.append('i.lemma_key=?')
+        values.append(lemmaindex.lemma_key(kwargs['lemma']))
+    for field in ('wordclass', 'refentry', 'refid'):
+        if kwargs.get(field) is not None:
+            conditions.append('i.%s=?' % field)
+            values.append(kwargs[field])
+    if kwargs.get('current_only') or kwargs.get('currentOnly'):
+        conditions.append('i.current=1')
+    if kwargs.get('thes_linked'):
+        conditions.append('i.thesclass_id IS NOT NULL')
+
+    branch_ids = _branch_ids(kwargs)
+    if branch_ids is not None:
+        if not branch_ids:
+            return []
+        conditions.append(
+            'EXISTS (SELECT 1 FROM thesclass b WHERE b.id IN (%s) AND '
+            'b.enter<=c.enter AND c.enter<b.exit)' %
+            ', '.join(['?'] * len(branch_ids)))
+        values.extend(branch_ids)
+
+    query = ('SELECT i.* FROM instance i LEFT JOIN thesclass c '
+             'ON c.id=i.thesclass_id')
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY i.id'
+    return [Instance(row) for row in _db().execute(query, values)]
+
+
+def _branch_ids(kwargs):
+    """
+    Return the IDs of the branches that results are restricted to by the
+    branches and subjects arguments (or None if there's no restriction)
+    """
+    if not kwargs.get('branches') and not kwargs.get('subjects'):
+        return None
+    branches = list(kwargs.get('branches') or [])
+    for subject in kwargs.get('subjects') or []:
+        branches.extend([c for c in SUBJECT_MAPPER.equivalent_classes(subject)
+                         if c is not None])
+    return [_id(b) for b in branches]
+
+
+def resolve_instances(keys):
+    """
+    Return a dict mapping (refentry, refid) pairs to the first instance
+    of each (i.e. the same as search(refentry=..., refid=...)[0]), for a
+    whole batch of pairs at once. Pairs with no instances are left out.
+    """
+    keys = list(set([(int(refentry), int(refid)) for refentry, refid in keys]))
+    resolved = {}
+    for start in range(0, len(keys), RESOLVE_BATCH_SIZE):
+        batch = keys[start:start + RESOLVE_BATCH_SIZE]
+        query = ('WITH k (refentry, refid) AS (VALUES %s) '
+                 'SELECT i.* FROM instance i JOIN k '
+                 'ON i.refentry=k.refentry AND i.refid=k.refid '
+                 'ORDER BY i.id' % ', '.join(['(?, ?)'] * len(batch)))
+        values = [value for key in batch for value in key]
+        for row in _db().execute(query, values):
+            instance = Instance(row)
+            key = (instance.refentry, instance.refid)
+            if key not in resolved:
+                resolved[key] = instance
+    return resolved
+
+
+def prefetch(lemmas):
+    """
+    Load all the instances with any of the lemmas, and the classes they
+    (and their superclasses) are in, plus all those classes' ancestors,
+    in a few bulk queries. Until the next call, search() answers
+    searches by these lemmas from memory (where it can: see
+    PREFETCHED_ARGUMENTS), and get_thesclass() answers for the classes.
+
+    Returns the number of instances loaded.
+    """
+    keys = sorted(set([lemmaindex.lemma_key(lemma) for lemma in lemmas
+                       if lemma]))
+    _lemma_rows.clear()
+    db = _db()
+    rows_by_key = {key: [] for key in keys}
+    class_ids = set()
+    for start in range(0, len(keys), PREFETCH_BATCH_SIZE):
+        batch = keys[start:start + PREFETCH_BATCH_SIZE]
+        query = ('SELECT * FROM instance WHERE lemma_key IN (%s) '
+                 'ORDER BY id' % ', '.join(['?'] * len(batch)))
+        for row in db.execute(query, batch):
+            record = dict(zip(INSTANCE_FIELDS, row))
+            rows_by_key[record['lemma_key']].append(row)
+            class_ids.add(record['thesclass_id'])
+            class_ids.add(record['superclass_id'])
+
+    # Fetch the classes, then their parents, and so on up the tree
+    class_ids = set([id for id in class_ids if id is not None])
+    while class_ids:
+        wanted = sorted([id for id in class_ids if id not in _class_rows])
+        class_ids = set()
+        for start in range(0, len(wanted), PREFETCH_BATCH_SIZE):
+            batch = wanted[start:start + PREFETCH_BATCH_SIZE]
+            query = ('SELECT * FROM thesclass WHERE id IN (%s)' %
+                     ', '.join(['?'] * len(batch)))
+            found = set()
+            for row in db.execute(query, batch):
+                _class_rows[row[0]] = row
+                found.add(row[0])
+                parent_id = row[CLASS_FIELDS.index('parent_id')]
+                if parent_id is not None:
+                    class_ids.add(parent_id)
+            for id in set(batch) - found:
+                _class_rows[id] = None
+    _lemma_rows.update(rows_by_key)
+    return sum([len(rows) for rows in rows_by_key.values()])
+
+
+def _matches_prefetched(row, kwargs):
+    """
+    Apply the same filters to a prefetched instance row as search()'s
+    query does
+    """
+    record = dict(zip(INSTANCE_FIELDS, row))
+    if (kwargs.get('wordclass') is not None and
+            record['wordclass'] != kwargs['wordclass']):
+        return False
+    if ((kwargs.get('current_only') or kwargs.get('currentOnly')) and
+            record['current'] != 1):
+        return False
+    if kwargs.get('thes_linked') and record['thesclass_id'] is None:
+        return False
+    return True
+
+
+def _check_arguments(function_name, kwargs, accepted):
+    unsupported = sorted(set(kwargs) - accepted)
+    if unsupported:
+        raise TypeError('%s() got unsupported argument(s): %s' %
+                        (function_name, ', '.join(unsupported)))
+
+
+def search_current(**kwargs):
+    kwargs['current_only'] = True
+    return search(**kwargs)
+
+
+def ranked_search(**kwargs):
+    """
+    As search(), but ranked by rating (then node size). Instances with
+    refid == promote (if given) are moved to the top; if
+    include_homographs is False, only instances from the same entry as
+    the top-ranked instance are kept; if omit_null is True, unclassified
+    instances are dropped. refid is always matched exactly, so
+    exact_sense=True only makes a difference when there's no refid (in
+    which case there's no exact sense, and nothing is returned).
+    """
+    _check_arguments('ranked_search', kwargs, RANKED_SEARCH_ARGUMENTS)
+    kwargs = dict(kwargs)
+    promote = kwargs.pop('promote', None)
+    include_homographs = kwargs.pop('include_homographs', True)
+    omit_null = kwargs.pop('omit_null', False)
+    if kwargs.pop('exact_sense', False) and kwargs.get('refid') is None:
+        return []
+
+    index = _index()
+    if (index is not None and kwargs.get('lemma') is not None and
+            set(kwargs) - set(['branches', 'subjects']) <=
+            lemmaindex.ARGUMENTS):
+        # Already in rank order
+        branch_ids = _branch_ids(kwargs)
+        kwargs.pop('branches', None)
+        kwargs.pop('subjects', None)
+        instances = [Instance(row) for row in
+                     index.search(branch_ids=branch_ids, **kwargs)]
+    else:
+        instances = search(**kwargs)
+        instances.sort(key=lambda i: lemmaindex.rank_key(i.rating(),
+                                                         i.node_size()),
+                       reverse=True)
+
+    if omit_null:
+        instances = [i for i in instances if i.thesclass_id is not None]
+    if promote is not None:
+        instances.sort(key=lambda i: i.refid != promote)
+    if not include_homographs and instances:
+        instances = [i for i in instances
+                     if i.refentry == instances[0].refentry]
+    return instances
+
+
+def highest_ranked(**kwargs):
+    instances = ranked_search(**kwargs)
+    if instances:
+        return instances[0]
+    return None
+
+
+def distinct_senses(instances):
+    return len(set([(i.refentry, i.refid) for i in instances]))
+
+
+def cross_reference_target(lemma=None, refentry=None, refid=None,
+                           wordclass=None):
+    """
+    Return the ranked instances for the target of a cross-reference
+    (narrowed to the target sense if it can be found, or else to the
+    target entry), and the number of distinct senses they represent
+    """
+    target_senses = []
+    if refentry is not None and refid is not None:
+        target_senses = ranked_search(refentry=refentry, refid=refid,
+                                      wordclass=wordclass)
+    if not target_senses and refentry is not None:
+        target_senses = ranked_search(lemma=lemma, refentry=refentry,
+                                      wordclass=wordclass)
+    if not target_senses and lemma is not None:
+        target_senses = ranked_search(lemma=lemma, wordclass=wordclass)
+    return target_senses, distinct_senses(target_senses)
+
+
+def common_ancestor(lemmas, **kwargs):
+    """
+    Find the most specific class which has a classified sense of each of
+    the lemmas in its branch.
+
+    Returns the class and the combination of instances (one for each
+    lemma) which share it, or (None, None).
+    """
+    candidates = []
+    for lemma in lemmas:
+        instances = [i for i in ranked_search(lemma=lemma, **kwargs)
+                     if i.thesclass_id is not None]
+        if not instances:
+            return None, None
+        candidates.append(instances)
+
+    best = None
+    best_instances = None
+    for combination in itertools.product(*candidates):
+        ancestor = combination[0].thesclass
+        for i in combination[1:]:
+            ancestor = ancestor.common_ancestor(i.thesclass)
+            if ancestor is None:
+                break
+        if ancestor is not None and (best is None or
+                (ancestor.level, -ancestor.branch_size) >
+                (best.level, -best.branch_size)):
+            best = ancestor
+            best_instances = combination
+    return best, best_instances
+
+
+class Instance(object):
+
+    """
+    Sense instance, as read from the SQLite file
+    """
+
+    def __init__(self, row):
+        for field, value in zip(INSTANCE_FIELDS, row):
+            self.__dict__[field] = value
+
+    @property
+    def thesclass(self):
+        try:
+            return self.__dict__['_thesclass']
+        except KeyError:
+            self.__dict__['_thesclass'] = get_thesclass(self.thesclass_id)
+            return self.__dict__['_thesclass']
+
+    def rating(self):
+        return self._rating
+
+    def node_size(self):
+        return self._node_size
+
+    def branch_size(self):
+        return self._branch_size
+
+    def superclass(self):
+        return get_thesclass(self.superclass_id)
+
+    def wordclass_parent(self):
+        if self.thesclass is None:
+            return None
+        return self.thesclass.wordclass_parent()
+
+    def breadcrumb(self):
+        if self.thesclass is None:
+            return None
+        return self.thesclass.breadcrumb()
+
+    def is_descendant_of(self, other):
+        if self.thesclass is None:
+            return False
+        return self.thesclass.is_descendant_of(other)
+
+    def is_same_branch(self, other):
+        if self.thesclass is None:
+            return False
+        return self.thesclass.is_same_branch(other)
+
+    def is_derivative(self):
+        return bool(self._is_derivative)
+
+    def is_affix(self):
+        return bool(self._is_affix)
+
+    def __repr__(self):
+        return '<Instance %s %s (%s#%s)>' % (self.lemma, self.wordclass,
+                                             self.refentry, self.refid)
+
+
+#================================================
+# Superordinates
+#================================================
+
+def get_superordinate_record(superordinate):
+    from thesaurus.sqliteexport import normalise_superordinate
+    superordinate = normalise_superordinate(superordinate)
+    row = _db().execute('SELECT total FROM superordinate '
+                        'WHERE superordinate=?', (superordinate,)).fetchone()
+    if row is None:
+        return None
+    branches = [SuperordinateBranch(thesclass_id, probability) for
+                thesclass_id, probability in _db().execute(
+                    'SELECT thesclass_id, probability '
+                    'FROM superordinate_branch WHERE superordinate=? '
+                    'ORDER BY rank', (superordinate,))]
+    return SuperordinateRecord(superordinate, row[0], branches)
+
+
+class SuperordinateRecord(object):
+
+    def __init__(self, superordinate, total, branches):
+        self.superordinate = superordinate
+        self.total = total
+        self.branches = branches
+
+
+class SuperordinateBranch(object):
+
+    def __init__(self, thesclass_id, probability):
+        self.thesclass_id = thesclass_id
+        self.probability = probability
+        self.thesclass = get_thesclass(thesclass_id)
+
+
+def _id(thesclass):
+    return getattr(thesclass, 'id', thesclass)
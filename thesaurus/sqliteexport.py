@@ -0,0 +1,273 @@
+"""
+Export the thesaurus database to a single read-only SQLite file, for use
+with thesaurus.sqlitebackend.
+
+The file holds:
+ - thesclass: the taxonomy, with pre-order intervals (see
+   thesaurus.treeintervals) for descendant tests;
+ - instance: the sense instances, with the classification ('link') of
+   each, and the values of the instance methods which the classifier
+   uses (rating(), node_size(), entry_size, etc.) as computed by the
+   live database, and the case-folded lemma (lemmaindex.lemma_key())
+   that lemma searches match on;
+ - superordinate, superordinate_branch: the superordinate records, from
+   the refined superordinate index (the same files that
+   store_superordinates() loads into the live database).
+
+Values are taken from the live database as they stand, so the file has
+to be re-exported after anything that changes the database.
+"""
+
+import os
+import csv
+import time
+import string
+import sqlite3
+from collections import defaultdict
+
+import lex.oed.thesaurus.thesaurusdb as tdb
+from thesaurus.taxonomysnapshot import TaxonomySnapshot
+from thesaurus.treeintervals import TreeIntervals
+from thesaurus.lemmaindex import lemma_key
+
+SCHEMA_VERSION = 3
+# Number of instance rows inserted at a time
+INSERT_BATCH_SIZE = 50000
+SCHEMA = """
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE thesclass (
+        id INTEGER PRIMARY KEY,
+        parent_id INTEGER,
+        level INTEGER,
+        wordclass TEXT,
+        label TEXT,
+        branch_size INTEGER,
+        node_size INTEGER,
+        sortcode INTEGER,
+        breadcrumb TEXT,
+        breadcrumb_short TEXT,
+        enter INTEGER,
+        exit INTEGER
+    );
+    CREATE TABLE instance (
+        id INTEGER PRIMARY KEY,
+        lemma TEXT,
+        wordclass TEXT,
+        refentry INTEGER,
+        refid INTEGER,
+        thesclass_id INTEGER,
+        current INTEGER,
+        rating REAL,
+        node_size INTEGER,
+        branch_size INTEGER,
+        superclass_id INTEGER,
+        is_derivative INTEGER,
+        is_affix INTEGER,
+        entry_size INTEGER,
+        lemma_key TEXT
+    );
+    CREATE TABLE superordinate (
+        superordinate TEXT PRIMARY KEY,
+        total INTEGER
+    );
+    CREATE TABLE superordinate_branch (
+        superordinate TEXT,
+        rank INTEGER,
+        thesclass_id INTEGER,
+        probability REAL,
+        PRIMARY KEY (superordinate, rank)
+    );
+"""
+INDEXES = """
+    CREATE INDEX thesclass_parent ON thesclass (parent_id, wordclass);
+    CREATE INDEX instance_lemma ON instance (lemma_key, wordclass);
+    CREATE INDEX instance_ref ON instance (refentry, refid);
+    CREATE INDEX instance_thesclass ON instance (thesclass_id);
+    CREATE INDEX instance_wordclass ON instance (wordclass, current);
+"""
+
+
+def export_thesaurus_db(filename, superordinates_dir):
+    """
+    Export the live thesaurus database (plus the refined superordinate
+    index in superordinates_dir) to a new SQLite file. The file is
+    replaced atomically, so processes reading the previous version are
+    not disturbed.
+    """
+    temp_file = '%s.%d.tmp' % (filename, os.getpid())
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    connection = sqlite3.connect(temp_file)
+    try:
+        connection.executescript(SCHEMA)
+        print('\tExporting taxonomy...')
+        _export_taxonomy(connection)
+        print('\tExporting instances...')
+        _export_instances(connection)
+        print('\tExporting superordinates...')
+        _export_superordinates(connection, superordinates_dir)
+        connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('schema_version', str(SCHEMA_VERSION)),
+            ('exported', time.strftime('%Y-%m-%d %H:%M:%S')),
+            ('revision', _new_revision()),
+        ])
+        connection.executescript(INDEXES)
+        connection.commit()
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    os.replace(temp_file, filename)
+
+
+def add_links(filename, links):
+    """
+    Classify instances in an exported file (the equivalent of
+    tdb.add_links(), for a file being used as a stand-in for the live
+    database). links is a sequence of (instance, thesaurus class ID)
+    pairs; they're all written in a single transaction. Returns the
+    number of instances updated.
+
+    Only the links themselves are changed: values which the live
+    database derives from them (ratings, node sizes, etc.) are not
+    recomputed. The file's revision is changed, so a lemma index built
+    from it before the update is refused by sqlitebackend until it's
+    rebuilt (see lemmaindex.build_lemma_index()).
+    """
+    connection = sqlite3.connect(filename)
+    try:
+        with connection:
+            cursor = connection.executemany(
+                'UPDATE instance SET thesclass_id=? WHERE id=?',
+                [(int(class_id), instance.id) for instance, class_id
+                 in links])
+            count = cursor.rowcount
+            connection.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                               ('revision', _new_revision()))
+    finally:
+        connection.close()
+    return count
+
+
+def read_revision(connection):
+    """
+    Return the revision of an exported file (given a connection to it):
+    changed whenever the file is exported or updated (see add_links())
+    """
+    row = connection.execute('SELECT value FROM meta '
+                             'WHERE key=\'revision\'').fetchone()
+    return row[0] if row is not None else None
+
+
+def _new_revision():
+    return '%r-%d' % (time.time(), os.getpid())
+
+
+def _export_taxonomy(connection):
+    classes = list(tdb.taxonomy())
+    snapshot = TaxonomySnapshot()
+    snapshot.load(classes)
+    intervals = TreeIntervals(snapshot)
+    rows = []
+    for c in classes:
+        breadcrumb_short = getattr(c, 'breadcrumb_short', None)
+        rows.append((
+            c.id,
+            c.parent_id,
+            c.level,
+            c.wordclass,
+            c.label,
+            c.branch_size,
+            int(snapshot.node_size[c.id]),
+            getattr(c, 'sortcode', None),
+            c.breadcrumb(),
+            breadcrumb_short() if breadcrumb_short is not None else None,
+            int(intervals.enter[c.id]),
+            int(intervals.exit[c.id]),
+        ))
+    connection.executemany('INSERT INTO thesclass VALUES (%s)' %
+                           ', '.join(['?'] * 12), rows)
+
+
+def _export_instances(connection):
+    """
+    Every instance is exported, whatever its wordclass (including none),
+    so that searches without a wordclass find as many instances as they
+    do in the live database
+    """
+    current = set([_instance_key(i) for i in tdb.search(current_only=True)])
+    counts = defaultdict(int)
+    rows = []
+    for i in tdb.search():
+        thesclass = i.thesclass
+        superclass = i.superclass()
+        rows.append((
+            getattr(i, 'id', None),
+            i.lemma,
+            i.wordclass,
+            i.refentry,
+            i.refid,
+            thesclass.id if thesclass is not None else None,
+            _instance_key(i) in current,
+            i.rating(),
+            i.node_size(),
+            i.branch_size(),
+            superclass.id if superclass is not None else None,
+            i.is_derivative(),
+            i.is_affix(),
+            i.entry_size,
+            lemma_key(i.lemma),
+        ))
+        counts[i.wordclass] += 1
+        if len(rows) >= INSERT_BATCH_SIZE:
+            _insert_instances(connection, rows)
+            rows = []
+    _insert_instances(connection, rows)
+    for wordclass, count in sorted(counts.items(),
+                                   key=lambda item: str(item[0])):
+        print('\t\t%s: %d instances' % (wordclass, count))
+
+
+def _insert_instances(connection, rows):
+    connection.executemany('INSERT INTO instance VALUES (%s)' %
+                           ', '.join(['?'] * 15), rows)
+
+
+def _instance_key(instance):
+    return (instance.lemma, instance.wordclass, instance.refentry,
+            instance.refid)
+
+
+def _export_superordinates(connection, superordinates_dir):
+    """
+    Rows of the refined index are: superordinate, total, then pairs of
+    thesaurus class ID and probability
+    """
+    for letter in string.ascii_lowercase:
+        in_file = os.path.join(superordinates_dir, letter + '.csv')
+        if not os.path.isfile(in_file):
+            continue
+        with open(in_file, 'r') as filehandle:
+            for row in csv.reader(filehandle):
+                superordinate = normalise_superordinate(row[0])
+                cursor = connection.execute(
+                    'INSERT OR IGNORE INTO superordinate VALUES (?, ?)',
+                    (superordinate, int(row[1])))
+                if not cursor.rowcount:
+                    continue
+                values = row[2:]
+                connection.executemany(
+                    'INSERT INTO superordinate_branch VALUES (?, ?, ?, ?)',
+                    [(superordinate, rank, int(id), float(probability))
+                     for rank, (id, probability) in
+                     enumerate(zip(values[::2], values[1::2]))])
+
+
+def normalise_superordinate(superordinate):
+    """
+    Normalise a superordinate in the same way as the callers of
+    get_superordinate_record()
+    """
+    return superordinate.lower().replace('-', '').replace(' ', '')
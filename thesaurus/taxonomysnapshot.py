@@ -0,0 +1,84 @@
+"""
+TaxonomySnapshot -- In-memory copy of the structure of the thesaurus
+taxonomy, held in NumPy arrays indexed by thesaurus class ID: which IDs
+exist, the parent of each class, and its node size. It's what the tree
+intervals (see thesaurus/treeintervals.py) and the SQLite export are
+built from.
+
+The snapshot is loaded once per process from tdb.taxonomy(); use
+get_snapshot() rather than instantiating it directly.
+
+snapshot.digest identifies the structure of the taxonomy the snapshot
+was loaded from (see taxonomy_digest()), so that tables precomputed from
+the taxonomy can tell whether they're still valid.
+"""
+
+import hashlib
+
+import numpy
+
+import lex.oed.thesaurus.thesaurusdb as tdb
+
+NONE = -1
+_snapshot = None
+
+
+def get_snapshot():
+    """
+    Return the taxonomy snapshot for this process (loading it if
+    necessary)
+    """
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = TaxonomySnapshot()
+        _snapshot.load(tdb.taxonomy())
+    return _snapshot
+
+
+class TaxonomySnapshot(object):
+
+    def load(self, taxonomy):
+        """
+        Load from a sequence of thesaurus class objects (as returned by
+        tdb.taxonomy())
+        """
+        rows = taxonomy_rows(taxonomy)
+        self.digest = taxonomy_digest(rows)
+        size = max([r[0] for r in rows]) + 1
+        self.exists = numpy.zeros(size, dtype=bool)
+        self.parent = numpy.full(size, NONE, dtype=numpy.int32)
+        self.node_size = numpy.zeros(size, dtype=numpy.int32)
+        for id, parent_id, _, _, _, _, node_size in rows:
+            self.exists[id] = True
+            if parent_id is not None:
+                self.parent[id] = parent_id
+            self.node_size[id] = node_size or 0
+
+
+def taxonomy_rows(taxonomy):
+    """
+    Return (id, parent_id, level, wordclass, label, branch_size,
+    node_size) tuples for a sequence of thesaurus class objects
+    """
+    return [(c.id, c.parent_id, c.level, c.wordclass, c.label,
+             c.branch_size, _node_size(c)) for c in taxonomy]
+
+
+def taxonomy_digest(rows):
+    """
+    Return a SHA-1 digest of the structure of the taxonomy (the id,
+    parent_id, level and wordclass of the rows returned by
+    taxonomy_rows()). Labels and sizes are left out, since sizes change
+    whenever senses are classified, without the structure changing.
+    """
+    digest = hashlib.sha1()
+    for row in sorted(rows, key=lambda r: r[0]):
+        digest.update(repr(row[0:4]).encode('utf8'))
+    return digest.hexdigest()
+
+
+def _node_size(thesclass):
+    size = getattr(thesclass, 'node_size', 0)
+    if callable(size):
+        size = size()
+    return size
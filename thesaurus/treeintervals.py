@@ -0,0 +1,154 @@
+"""
+TreeIntervals -- Interval numbering of the thesaurus tree, so that
+testing whether one class is a descendant of another is just two integer
+comparisons.
+
+Each class gets an 'enter' number (its position in a pre-order walk of
+the tree) and an 'exit' number (the position reached once its whole
+branch has been walked). Class x is in the branch of class a (i.e. x is a,
+or one of its descendants) iff:
+
+    enter[a] <= enter[x] < exit[a]
+
+The tests are inclusive by default; pass strict=True to leave out the
+branch's own class, which is what tdb's is_descendant_of() does.
+
+Since the test is just arithmetic on two arrays, M candidate classes can
+be tested against N filter branches in a single vectorized operation
+(descendant_matrix()), rather than by M x N calls to is_descendant_of().
+
+The intervals are built from the taxonomy snapshot; use get_intervals()
+rather than instantiating TreeIntervals directly. Methods accept either
+class objects or class IDs; any class not in the snapshot is treated as
+being outside every branch.
+"""
+
+from collections import defaultdict
+
+import numpy
+
+from thesaurus.taxonomysnapshot import get_snapshot, NONE
+
+_intervals = None
+
+
+def get_intervals():
+    """
+    Return the tree intervals for this process (building them if
+    necessary)
+    """
+    global _intervals
+    if _intervals is None:
+        _intervals = TreeIntervals(get_snapshot())
+    return _intervals
+
+
+class TreeIntervals(object):
+
+    def __init__(self, snapshot):
+        size = len(snapshot.exists)
+        # IDs that aren't in the snapshot are all mapped to an extra
+        #  slot at the end, whose interval is empty
+        self.missing = size
+        self.enter = numpy.full(size + 1, NONE, dtype=numpy.int32)
+        self.exit = numpy.full(size + 1, NONE, dtype=numpy.int32)
+
+        children = defaultdict(list)
+        roots = []
+        ids = numpy.nonzero(snapshot.exists)[0].tolist()
+        parents = snapshot.parent[ids].tolist()
+        for id, parent_id in zip(ids, parents):
+            if 0 <= parent_id < size and snapshot.exists[parent_id]:
+                children[parent_id].append(id)
+            else:
+                roots.append(id)
+
+        # Pre-order walk (without recursion, since the tree is deep)
+        counter = 0
+        stack = [(id, False) for id in reversed(roots)]
+        while stack:
+            id, walked = stack.pop()
+            if walked:
+                self.exit[id] = counter
+            else:
+                self.enter[id] = counter
+                counter += 1
+                stack.append((id, True))
+                stack.extend([(child, False) for child in
+                              reversed(children[id])])
+
+        # Plain lists for testing one pair at a time (indexing a list is
+        #  much faster than indexing a NumPy array)
+        self._enter = self.enter.tolist()
+        self._exit = self.exit.tolist()
+
+    def _position(self, thesclass):
+        id = getattr(thesclass, 'id', thesclass)
+        if id is None or not 0 <= id < self.missing:
+            return self.missing
+        return id
+
+    def _positions(self, classes):
+        positions = numpy.array([getattr(c, 'id', c) if c is not None
+                                 else NONE for c in classes],
+                                dtype=numpy.int64)
+        positions[(positions < 0) | (positions >= self.missing)] = self.missing
+        return positions
+
+    def is_descendant(self, thesclass, ancestor, strict=False):
+        """
+        Return True if thesclass is one of the ancestor class's
+        descendants, or (unless strict) the ancestor class itself
+        """
+        x = self._position(thesclass)
+        a = self._position(ancestor)
+        if strict:
+            return self._enter[a] < self._enter[x] < self._exit[a]
+        return self._enter[a] <= self._enter[x] < self._exit[a]
+
+    def descendant_matrix(self, classes, branches, strict=False):
+        """
+        Return an M x N boolean array, where [i, j] is True if classes[i]
+        is one of the descendants of branches[j], or (unless strict)
+        branches[j] itself
+        """
+        x = self.enter[self._positions(classes)][:, numpy.newaxis]
+        b = self._positions(branches)
+        if strict:
+            lower = self.enter[b][numpy.newaxis, :] < x
+        else:
+            lower = self.enter[b][numpy.newaxis, :] <= x
+        return lower & (x < self.exit[b][numpy.newaxis, :])
+
+    def descends_from_any(self, classes, branches, strict=False):
+        """
+        Return a boolean array, where [i] is True if classes[i] is in any
+        of the branches
+        """
+        return self.descendant_matrix(classes, branches,
+                                      strict=strict).any(axis=1)
+
+    def filter_descendants(self, classes, branches, strict=False):
+        """
+        Return the classes which are in any of the branches (in their
+        original order)
+        """
+        classes = list(classes)
+        mask = self.descends_from_any(classes, branches, strict=strict)
+        return [c for c, keep in zip(classes, mask.tolist()) if keep]
+
+    def remove_redundant_classes(self, classes):
+        """
+        Remove any class which is in the branch of another class in the
+        list (or is a repeat of an earlier class). The result covers
+        exactly the same branches as the original list, so lets through
+        the same descendants when used as a filter. Order is preserved.
+        """
+        classes = list(classes)
+        ids = [getattr(c, 'id', c) for c in classes]
+        matrix = self.descendant_matrix(ids, ids)
+        same = numpy.array([[i == j for j in ids] for i in ids],
+                           dtype=bool).reshape(len(ids), len(ids))
+        earlier = numpy.tri(len(classes), k=-1, dtype=bool)
+        redundant = ((matrix & ~same) | (same & earlier)).any(axis=1)
+        return [c for c, r in zip(classes, redundant.tolist()) if not r]
@@ -0,0 +1,76 @@
+"""
+ImportProfiler -- Records how long each module takes to import, and how
+long each LazyObject takes to initialize, so that slow start-up can be
+tracked down.
+
+Used by pipeline.py when run with the --profile-imports option.
+"""
+
+import builtins
+import importlib.util
+import sys
+import time
+
+from . import lazy
+
+# Number of modules listed in the report
+MAX_REPORTED = 30
+
+
+class ImportProfiler(object):
+
+    def __init__(self):
+        self.original_import = None
+        self.timings = {}
+        # Stack of [module name, start time, time spent in nested imports]
+        self.stack = []
+
+    def start(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        full_name = name
+        if level:
+            try:
+                full_name = importlib.util.resolve_name(
+                    '.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                pass
+        # Only time the first import of a module; anything else is just
+        #  a look-up in sys.modules
+        if full_name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.stack.append([full_name, time.time(), 0])
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            name, start, nested = self.stack.pop()
+            elapsed = time.time() - start
+            if self.stack:
+                self.stack[-1][2] += elapsed
+            if name not in self.timings:
+                self.timings[name] = (elapsed, elapsed - nested)
+
+    def report(self):
+        """
+        Print the slowest imports (by cumulative time, including any
+        modules they import in turn), and the initialization time for
+        each LazyObject that has been used
+        """
+        print('-' * 30)
+        print('Imports (cumulative / self, seconds):')
+        timings = sorted(self.timings.items(), key=lambda t: t[1][0],
+                         reverse=True)
+        for name, (cumulative, own) in timings[0:MAX_REPORTED]:
+            print('\t%0.3f\t%0.3f\t%s' % (cumulative, own, name))
+        print('Lazy initialization (seconds):')
+        for name, elapsed in lazy.INIT_TIMES:
+            print('\t%0.3f\t%s' % (elapsed, name))
+        print('-' * 30)
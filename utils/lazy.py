@@ -0,0 +1,76 @@
+"""
+LazyObject -- Stand-in for an object which is expensive to create (e.g. a
+module-level resource which queries the database), so that it only gets
+created when it's first used rather than when the module is imported.
+"""
+
+import time
+
+# (name, seconds) for each LazyObject initialized so far, in order; used
+#  by utils.importprofiler
+INIT_TIMES = []
+
+
+class LazyObject(object):
+
+    """
+    Wraps a factory function; the function is called the first time that
+    any attribute of the LazyObject is accessed, and the object it returns
+    is used from then on.
+
+    Attribute access, item access, membership tests, iteration and len()
+    are passed on to the wrapped object. Anything else (in particular
+    identity tests) should use resolve() to get at the wrapped object.
+    """
+
+    __slots__ = ('_factory', '_name', '_wrapped')
+
+    def __init__(self, factory, name=None):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_name', name or repr(factory))
+
+    def resolve(self):
+        """
+        Return the wrapped object, creating it if necessary
+        """
+        try:
+            return object.__getattribute__(self, '_wrapped')
+        except AttributeError:
+            start = time.time()
+            wrapped = self._factory()
+            INIT_TIMES.append((self._name, time.time() - start))
+            object.__setattr__(self, '_wrapped', wrapped)
+            return wrapped
+
+    def is_resolved(self):
+        try:
+            object.__getattribute__(self, '_wrapped')
+        except AttributeError:
+            return False
+        else:
+            return True
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the LazyObject itself
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __contains__(self, key):
+        return key in self.resolve()
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def __repr__(self):
+        if self.is_resolved():
+            return repr(self.resolve())
+        else:
+            return '<LazyObject %s (not yet initialized)>' % self._name
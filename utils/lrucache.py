@@ -0,0 +1,59 @@
+"""
+LRUCache -- Bounded least-recently-used cache, with hit/miss statistics.
+"""
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=10000, name=None):
+        self.maxsize = maxsize
+        self.name = name or 'cache'
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key):
+        """
+        Return the value stored for key, and mark it as most recently used.
+        Raises KeyError if the key is not in the cache.
+        """
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.data.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups:
+            return self.hits / lookups
+        else:
+            return 0
+
+    def report(self):
+        return ('%s: %d hits, %d misses (%0.1f%% hit rate), '
+                '%d evictions, %d/%d entries' % (
+                self.name, self.hits, self.misses, self.hit_rate() * 100,
+                self.evictions, len(self.data), self.maxsize))
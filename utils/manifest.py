@@ -0,0 +1,250 @@
+"""
+StageManifest -- Records what each pipeline stage (and each shard of a
+stage, e.g. each letter) was last built from, so that work whose inputs
+haven't changed can be skipped.
+
+A fingerprint is a SHA-1 digest over:
+ - the code version (a digest of the project's Python source);
+ - the configuration values (see config_values());
+ - the contents of any input files;
+ - the tokens of any resources produced by upstream stages.
+
+An input file that is missing can't be fingerprinted, so a stage or
+shard that declares one is never treated as current (and a warning is
+printed): otherwise a wrong path would cause the work to be skipped
+forever.
+
+When a stage completes, each resource it outputs is given a token
+derived from the stage's fingerprint (and those of its shards). A
+downstream stage's fingerprint includes the tokens of its input
+resources, so it is invalidated whenever any of its upstream stages
+was rebuilt from different inputs, but not otherwise. Stages which are
+always run (e.g. those repopulating the database) issue a new token
+every time they complete, since their outputs can't be fingerprinted.
+
+Manifests are stored as JSON files: one per stage, plus one per resource
+token (so that concurrent stages never write to the same file).
+"""
+
+import os
+import json
+import time
+import hashlib
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_code_version = None
+
+
+class StageManifest(object):
+
+    def __init__(self, manifest_dir, stage):
+        self.manifest_dir = manifest_dir
+        self.stage = stage
+        self.files = {}
+        self.file = os.path.join(manifest_dir, stage + '.json')
+        self.current_fingerprint = None
+        self.missing = []
+        self.shard_fingerprints = {}
+        self.pending_states = {}
+        try:
+            with open(self.file, 'r') as filehandle:
+                self.data = json.load(filehandle)
+        except (IOError, OSError, ValueError):
+            self.data = {'fingerprint': None, 'files': {}, 'shards': {}}
+
+    #================================================
+    # Stage-level
+    #================================================
+
+    def begin(self, inputs, config, files=()):
+        """
+        Work out the fingerprint for the stage as a whole, from its input
+        resources, the configuration, and any external input files
+        (e.g. the OED source files)
+        """
+        self.files = file_states(files, self.data.get('files', {}))
+        self.missing = missing_files(self.files)
+        digests = {file: state[2] if state is not None else None
+                   for file, state in self.files.items()}
+        self.current_fingerprint = digest_values(
+            self.stage, code_version(), config, digests,
+            [(r, self.token(r)) for r in sorted(inputs)])
+        return self.current_fingerprint
+
+    def is_current(self):
+        """
+        Return True if the stage was last completed with the same
+        fingerprint (so doesn't need to be run again). Never True if
+        any of the stage's input files is missing.
+        """
+        return (self.current_fingerprint is not None and
+                not self.missing and
+                self.data.get('fingerprint') == self.current_fingerprint)
+
+    def complete(self, outputs, unique=False):
+        """
+        Record the stage as complete, and issue new tokens for its
+        output resources.
+
+        If unique is True, the tokens are different every time, so that
+        everything downstream is invalidated: for stages which are
+        always run because their outputs depend on something that can't
+        be fingerprinted (e.g. stages which repopulate the database).
+        """
+        shard_fingerprints = sorted(self.shard_fingerprints.items())
+        self.data['fingerprint'] = self.current_fingerprint
+        self.data['files'] = self.files
+        self.save()
+        nonce = None
+        if unique:
+            nonce = '%r-%d' % (time.time(), os.getpid())
+        token = digest_values(self.current_fingerprint, shard_fingerprints,
+                              nonce)
+        for resource in outputs:
+            self._write_json(self._token_file(resource),
+                             {'token': token, 'stage': self.stage})
+
+    def token(self, resource):
+        """
+        Return the current token for a resource (or None if no stage has
+        yet recorded it as an output)
+        """
+        try:
+            with open(self._token_file(resource), 'r') as filehandle:
+                return json.load(filehandle)['token']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    #================================================
+    # Shard-level
+    #================================================
+
+    def shard_is_current(self, shard, files, outputs=()):
+        """
+        Check whether the shard is up to date with respect to its input
+        files (and to the stage's own inputs - see begin()), and that
+        its output files exist. Never current if any of its input files
+        is missing.
+
+        Returns a (boolean, fingerprint) tuple; the fingerprint should be
+        passed to record_shard() once the shard has been rebuilt.
+        """
+        previous = self.data['shards'].get(shard, {})
+        states = file_states(files, previous.get('files', {}))
+        digests = {file: state[2] if state is not None else None
+                   for file, state in states.items()}
+        fingerprint = digest_values(shard, self.current_fingerprint, digests)
+        self.shard_fingerprints[shard] = fingerprint
+        current = (previous.get('fingerprint') == fingerprint and
+                   not missing_files(states) and
+                   all([os.path.exists(f) for f in outputs]))
+        if current:
+            # Refresh any mtimes that have changed without the content
+            #  changing, so that the files don't get hashed next time
+            previous['files'] = states
+        else:
+            self.pending_states[shard] = states
+        return current, fingerprint
+
+    def record_shard(self, shard, fingerprint):
+        """
+        Record the shard as rebuilt (and save the manifest straight away,
+        so that an interruption doesn't lose the shards already done)
+        """
+        states = self.pending_states.pop(shard, {})
+        self.data['shards'][shard] = {'fingerprint': fingerprint,
+                                      'files': states}
+        self.shard_fingerprints[shard] = fingerprint
+        self.save()
+
+    #================================================
+    # Storage
+    #================================================
+
+    def save(self):
+        self._write_json(self.file, self.data)
+
+    def _token_file(self, resource):
+        return os.path.join(self.manifest_dir, 'resources', resource + '.json')
+
+    def _write_json(self, file, data):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        temp_file = '%s.%d' % (file, os.getpid())
+        with open(temp_file, 'w') as filehandle:
+            json.dump(data, filehandle, indent=1, sort_keys=True)
+        os.replace(temp_file, file)
+
+
+def file_states(files, previous):
+    """
+    Return a dict mapping each file to [mtime, size, SHA-1 digest].
+    A file is only re-hashed if its mtime or size differs from the
+    previous state recorded for it. Missing files are recorded as None
+    (and reported).
+    """
+    states = {}
+    for file in sorted(files):
+        try:
+            stat = os.stat(file)
+        except OSError:
+            print('\tWarning: input file %s is missing' % file)
+            states[file] = None
+            continue
+        old = previous.get(file)
+        if old is not None and old[0:2] == [stat.st_mtime, stat.st_size]:
+            states[file] = old
+        else:
+            states[file] = [stat.st_mtime, stat.st_size, file_digest(file)]
+    return states
+
+
+def missing_files(states):
+    """
+    Return the files recorded as missing in a dict of file states
+    """
+    return [file for file, state in sorted(states.items()) if state is None]
+
+
+def file_digest(file):
+    digest = hashlib.sha1()
+    with open(file, 'rb') as filehandle:
+        for block in iter(lambda: filehandle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def digest_values(*values):
+    """
+    Return a SHA-1 digest of any JSON-serializable values
+    """
+    serialized = json.dumps(values, sort_keys=True, default=repr)
+    return hashlib.sha1(serialized.encode('utf8')).hexdigest()
+
+
+def code_version():
+    """
+    Return a digest of all the project's Python source files
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha1()
+        for dirpath, dirnames, filenames in os.walk(PROJECT_DIR):
+            dirnames[:] = sorted([d for d in dirnames if not d.startswith('.')
+                                  and d != '__pycache__'])
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    path = os.path.join(dirpath, filename)
+                    digest.update(os.path.relpath(path, PROJECT_DIR)
+                                  .encode('utf8'))
+                    digest.update(file_digest(path).encode('utf8'))
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def config_values(module, exclude=()):
+    """
+    Return a dict of the settings (upper-case names) in a config module,
+    minus any that shouldn't affect whether a stage needs rebuilding
+    """
+    return {name: repr(getattr(module, name)) for name in dir(module)
+            if name.isupper() and name not in exclude}
@@ -0,0 +1,154 @@
+"""
+metrics -- Timing, memory and throughput instrumentation for pipeline
+stages.
+
+pipeline.dispatch() wraps each stage it runs in METRICS.stage(). Within
+a stage, each letter (or other shard of the data) can be reported with
+METRICS.start_shard(), which prints a progress message and returns a
+Shard object for counting records in and out; call finish() on this
+when the shard is done.
+
+Each finished stage and shard is written as a JSON object to a run
+report (one per line), so that performance can be compared from one run
+to the next. If no run has been started (e.g. when a process is run
+outside the pipeline), progress messages are still printed but nothing
+is recorded.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+REPORT_FILE = 'pipeline_runs.jsonl'
+
+
+class RunMetrics(object):
+
+    def __init__(self):
+        self.report_file = None
+        self.run_id = None
+        self.current_stage = None
+
+    def start_run(self, report_dir):
+        """
+        Start recording: all subsequent stages and shards are appended
+        to the run report in report_dir
+        """
+        os.makedirs(report_dir, exist_ok=True)
+        self.report_file = os.path.join(report_dir, REPORT_FILE)
+        self.run_id = '%s-%d' % (time.strftime('%Y%m%dT%H%M%S'), os.getpid())
+        self.write({'type': 'run', 'host': socket.gethostname(),
+                    'argv': sys.argv, 'started': time.time()})
+
+    def stage(self, name):
+        return StageTimer(self, name)
+
+    def start_shard(self, name, message=None):
+        """
+        Print the progress message (if any), and return a Shard for
+        recording the shard's throughput
+        """
+        if message is not None:
+            print('\t%s' % message)
+        return Shard(self, name)
+
+    def write(self, record):
+        if self.report_file is None:
+            return
+        record['run_id'] = self.run_id
+        with open(self.report_file, 'a') as filehandle:
+            filehandle.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+class _Timer(object):
+
+    def __init__(self):
+        self.wall_start = time.time()
+        self.cpu_start = time.process_time()
+
+    def timings(self):
+        return {'wall': round(time.time() - self.wall_start, 3),
+                'cpu': round(time.process_time() - self.cpu_start, 3),
+                'peak_rss_kb': peak_rss()}
+
+
+class StageTimer(_Timer):
+
+    def __init__(self, metrics, name):
+        _Timer.__init__(self)
+        self.metrics = metrics
+        self.name = name
+        self.records_in = 0
+        self.records_out = 0
+
+    def __enter__(self):
+        self.metrics.current_stage = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = {'type': 'stage', 'stage': self.name,
+                  'records_in': self.records_in,
+                  'records_out': self.records_out,
+                  'status': 'failed' if exc_type is not None else 'ok'}
+        record.update(self.timings())
+        self.metrics.write(record)
+        self.metrics.current_stage = None
+        print('\t[%s: %0.1fs wall, %0.1fs cpu]' % (self.name, record['wall'],
+                                                   record['cpu']))
+        return False
+
+
+class Shard(_Timer):
+
+    def __init__(self, metrics, name):
+        _Timer.__init__(self)
+        self.metrics = metrics
+        self.name = name
+        self.records_in = 0
+        self.records_out = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+        return False
+
+    def finish(self, records_out=None):
+        if records_out is not None:
+            self.records_out = records_out
+        stage = self.metrics.current_stage
+        if stage is not None:
+            stage.records_in += self.records_in
+            stage.records_out += self.records_out
+        record = {'type': 'shard', 'shard': self.name,
+                  'stage': stage.name if stage is not None else None,
+                  'records_in': self.records_in,
+                  'records_out': self.records_out}
+        record.update(self.timings())
+        self.metrics.write(record)
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process so far, in KB
+    (or None if this can't be found)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes on Mac OS X
+        peak = peak // 1024
+    return peak
+
+
+METRICS = RunMetrics()
@@ -0,0 +1,156 @@
+"""
+StageScheduler -- Runs a sequence of pipeline stages, running stages
+concurrently (each in its own process) where they don't depend on each
+other.
+
+Each stage declares the resources (files, directories, database tables)
+that it reads and writes, as a StageSpec. A stage has to wait for an
+earlier stage in the sequence if:
+ - the earlier stage writes something that this stage reads or writes;
+ - or the earlier stage reads something that this stage writes.
+Otherwise the two can run at the same time. A stage with no StageSpec
+waits for everything before it, and everything after it waits for it.
+
+The output of each stage is written to its own log file. If a stage
+fails, the end of its log is printed, and any stages depending on it
+are skipped.
+"""
+
+import os
+import sys
+import time
+import traceback
+import multiprocessing
+from collections import namedtuple
+
+from .metrics import METRICS
+
+# mode is used by pipeline.run_stage() to decide when a stage can be
+#  skipped: 'incremental' (skipped if its fingerprint is unchanged - see
+#  utils/manifest.py), 'sharded' (always run, but skips any shards that
+#  are up to date) or 'always'
+StageSpec = namedtuple('StageSpec', ['inputs', 'outputs', 'mode'],
+                       defaults=('incremental',))
+
+# Seconds between checks on running stages
+POLL_INTERVAL = 0.5
+# Number of lines from the end of a failed stage's log that get printed
+LOG_TAIL = 20
+
+
+class StageScheduler(object):
+
+    def __init__(self, stages, specs, run_function, max_concurrent=2,
+                 log_dir=None):
+        self.stages = list(stages)
+        self.specs = specs
+        self.run_function = run_function
+        self.max_concurrent = max_concurrent
+        self.log_dir = log_dir
+        self.status = {}
+
+    def dependencies(self):
+        """
+        Return a dict mapping each stage to the set of earlier stages
+        that it has to wait for
+        """
+        depends = {}
+        for j, stage in enumerate(self.stages):
+            depends[stage] = set()
+            spec = self.specs.get(stage)
+            for earlier in self.stages[0:j]:
+                earlier_spec = self.specs.get(earlier)
+                if spec is None or earlier_spec is None:
+                    depends[stage].add(earlier)
+                elif (set(earlier_spec.outputs) &
+                        (set(spec.inputs) | set(spec.outputs)) or
+                        set(earlier_spec.inputs) & set(spec.outputs)):
+                    depends[stage].add(earlier)
+        return depends
+
+    def run(self):
+        """
+        Run all the stages, and return a list of any that failed or were
+        skipped (empty if everything succeeded)
+        """
+        if self.log_dir is not None:
+            os.makedirs(self.log_dir, exist_ok=True)
+        depends = self.dependencies()
+        pending = list(self.stages)
+        running = {}
+        while pending or running:
+            for stage in list(pending):
+                if any([self.status.get(d) in ('failed', 'skipped')
+                        for d in depends[stage]]):
+                    print('Skipping "%s" (depends on a failed stage)' % stage)
+                    self.status[stage] = 'skipped'
+                    pending.remove(stage)
+                elif (len(running) < self.max_concurrent and
+                        all([self.status.get(d) == 'ok'
+                             for d in depends[stage]])):
+                    running[stage] = self._start(stage)
+                    pending.remove(stage)
+
+            time.sleep(POLL_INTERVAL)
+            for stage, (process, log_file) in list(running.items()):
+                if not process.is_alive():
+                    process.join()
+                    self._finish(stage, process, log_file)
+                    del running[stage]
+
+        return [stage for stage in self.stages if self.status[stage] != 'ok']
+
+    def _start(self, stage):
+        log_file = self._log_file(stage)
+        print('Starting "%s" (log: %s)' % (stage, log_file))
+        process = multiprocessing.Process(
+            target=_run_logged,
+            args=(self.run_function, stage, log_file,
+                  METRICS.report_file, METRICS.run_id),
+            name=stage,
+        )
+        process.start()
+        return process, log_file
+
+    def _finish(self, stage, process, log_file):
+        if process.exitcode == 0:
+            self.status[stage] = 'ok'
+            print('Finished "%s"' % stage)
+        else:
+            self.status[stage] = 'failed'
+            print('*** "%s" FAILED (exit code %s); end of log:' %
+                  (stage, process.exitcode))
+            for line in _tail(log_file, LOG_TAIL):
+                print('\t%s' % line.rstrip())
+
+    def _log_file(self, stage):
+        if self.log_dir is not None:
+            return os.path.join(self.log_dir, stage + '.log')
+        else:
+            return os.devnull
+
+
+def _run_logged(run_function, stage, log_file, report_file, run_id):
+    """
+    Run a single stage in a child process, with its output going to
+    the stage's log file
+    """
+    with open(log_file, 'w', buffering=1) as filehandle:
+        sys.stdout = filehandle
+        sys.stderr = filehandle
+        METRICS.report_file = report_file
+        METRICS.run_id = run_id
+        try:
+            run_function(stage)
+        except BaseException:
+            traceback.print_exc()
+            filehandle.flush()
+            os._exit(1)
+
+
+def _tail(log_file, num_lines):
+    try:
+        with open(log_file, 'r') as filehandle:
+            return filehandle.readlines()[-num_lines:]
+    except (IOError, OSError):
+        return []